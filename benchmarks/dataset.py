@@ -0,0 +1,297 @@
+import random
+import bisect
+import asyncio
+import logging
+import argparse
+
+from typing import Iterator, Optional
+from sqlalchemy import text
+from src.models.numbering_v1 import Base, Lerg6Model, LocalModel, Numberpoolblock, SPIDNamesModel, SimpleCarrierNamesModel, NNMPModel
+from src.models.numbering_v1 import create_dynamic_model
+from src.databases.database_session import _NUMBERING_ASYNC_ENGINE
+
+logger = logging.getLogger(__name__)
+
+# Sizes at scale factor 1.0 (roughly a full NANP LERG6 and a production NPAC SV download) -----------
+FULL_NPAS = 330
+NXX_PER_NPA = 500
+PORTED_PER_NPA = 100000
+CARRIERS = 1500
+POOLED_NXX_FRACTION = 0.35
+COPY_CHUNK = 50000
+
+CATEGORIES = (("ILEC", 0.25), ("CLEC", 0.35), ("WIRELESS", 0.30), ("IPES", 0.10))
+STATES = ("AL", "AZ", "CA", "CO", "FL", "GA", "IL", "IN", "MA", "MI", "MN", "MO", "NC", "NJ", "NY",
+          "OH", "OR", "PA", "TN", "TX", "VA", "WA", "WI")
+REFERENCE_TABLES = ("lerg6", "local", "numberpoolblock", "spidnames", "simple_carrier_names", "nnmp")
+
+TN2LRN_COLUMNS = [c.name for c in create_dynamic_model("tn2lrn000").__table__.columns]
+NPB_COLUMNS = [c.name for c in Numberpoolblock.__table__.columns]
+LERG6_COLUMNS = [c.name for c in Lerg6Model.__table__.columns]
+
+#-----------------------------------------------------------------------------------------------------
+# Deterministic generation
+#-----------------------------------------------------------------------------------------------------
+class Carrier:
+    def __init__(self, index: int, rnd: random.Random):
+        self.ocn = f"{index:04d}"
+        self.spid = f"{(index * 7919) % 10000:04d}"
+        self.category = _weighted(rnd, CATEGORIES)
+        self.name = f"{_syllables(rnd)} {self.category.title()} {index}".upper()[:50]
+        self.co_spec_name = self.name if rnd.random() > 0.05 else "USE VARIES BY COMPANY"
+        self.nnmp = rnd.randint(0, 100) if self.category != "ILEC" else 0
+
+class NumberingDataset:
+    """
+    Deterministic synthetic numbering data.
+
+    Every table is derived from `seed` (and, for per-NPA data, from the NPA), so the same
+    seed and scale always produce the same rows regardless of the order they are generated
+    in. Carrier popularity, per-NPA porting rates and TN popularity are skewed: a few
+    carriers own most blocks and receive most ports, and porting rates vary by NPA.
+    """
+    def __init__(self, seed: int = 1, scale: float = 0.01):
+        self.seed = seed
+        self.scale = scale
+        rnd = random.Random(f"{seed}:carriers")
+        self.carriers = [Carrier(i, rnd) for i in range(1, max(20, int(CARRIERS * min(scale * 10, 1))) + 1)]
+        self._carrier_cum = _zipf_cum_weights(len(self.carriers), 1.1)
+        self.npas = self._pick_npas(max(1, round(FULL_NPAS * min(scale * 10, 1))))
+        self.nxx_per_npa = max(10, round(NXX_PER_NPA * min(scale * 10, 1)))
+        self.ported_per_npa = max(100, round(PORTED_PER_NPA * scale))
+        self._blocks: dict[str, list[tuple]] = {}
+        self._owned: dict[str, dict[str, list[str]]] = {}
+
+    def _pick_npas(self, count: int) -> list[str]:
+        rnd = random.Random(f"{self.seed}:npas")
+        candidates = [str(n) for n in range(201, 990) if str(n)[1] != "9" and str(n)[1:] != "11"]
+        return sorted(rnd.sample(candidates, min(count, len(candidates))))
+
+    def carrier(self, rnd: random.Random) -> Carrier:
+        return rnd.choices(self.carriers, cum_weights=self._carrier_cum)[0]
+
+    # LERG6 blocks of one NPA: (nxx, carrier, rate center) -------------------------------------------
+    def blocks(self, npa: str) -> list[tuple]:
+        if npa not in self._blocks:
+            rnd = random.Random(f"{self.seed}:blocks:{npa}")
+            nxxs = [n for n in range(200, 1000) if n % 100 != 11]
+            rate_centers = [f"RC{npa}{i:02d}" for i in range(max(1, self.nxx_per_npa // 8))]
+            self._blocks[npa] = sorted(
+                (f"{nxx:03d}", self.carrier(rnd), rnd.choice(rate_centers))
+                for nxx in rnd.sample(nxxs, min(self.nxx_per_npa, len(nxxs)))
+            )
+        return self._blocks[npa]
+
+    def npa_region(self, npa: str) -> tuple[str, str]:
+        rnd = random.Random(f"{self.seed}:region:{npa}")
+        return rnd.choice(STATES), f"{rnd.randint(100, 999)}"
+
+    def lerg6_rows(self) -> Iterator[tuple]:
+        for npa in self.npas:
+            state, lata = self.npa_region(npa)
+            for nxx, carrier, rc in self.blocks(npa):
+                row = {
+                    "npanxxx": npa + nxx, "lata": lata, "npanxx": npa + nxx, "blockid": "A", "ocn": carrier.ocn,
+                    "line_fr": "0000", "line_to": "9999", "lata3": lata, "switch": f"SW{npa}{nxx}XX",
+                    "state": state, "rc": rc, "ocnname": carrier.name, "category": carrier.category,
+                    "co_spec_name": carrier.co_spec_name, "lataname": f"LATA {lata}", "locality": rc
+                }
+                yield tuple(row[c] for c in LERG6_COLUMNS)
+
+    def local_rows(self) -> Iterator[tuple]:
+        # Every rate center is local to itself and to two neighbours in the same NPA
+        for npa in self.npas:
+            state, lata = self.npa_region(npa)
+            rcs = sorted({rc for _, _, rc in self.blocks(npa)})
+            for i, rc in enumerate(rcs):
+                for other in sorted({rcs[i], rcs[(i + 1) % len(rcs)], rcs[i - 1]}):
+                    yield (rc, state, lata, other, state, lata)
+
+    def numberpoolblock_rows(self) -> Iterator[tuple]:
+        for npa in self.npas:
+            rnd = random.Random(f"{self.seed}:pool:{npa}")
+            blocks = self.blocks(npa)
+            for nxx, owner, _ in blocks:
+                if rnd.random() >= POOLED_NXX_FRACTION:
+                    continue
+                for x in sorted(rnd.sample(range(10), rnd.randint(1, 10))):
+                    carrier = self.carrier(rnd)
+                    lrn = npa + self._lrn_nxx(rnd, npa, carrier) + "0000"
+                    row = _npac_row(carrier, lrn, rnd)
+                    row.update({"objectclass": "numberPoolBlock", "namebinding": "", "npanxxx": f"{npa}{nxx}{x}",
+                                "numberpoolblockid": int(f"{npa}{nxx}{x}"), "blocksvtype": row.pop("svtype")})
+                    yield tuple(row.get(c, "") for c in NPB_COLUMNS)
+
+    def tn2lrn_rows(self, npa: str) -> Iterator[tuple]:
+        """
+        Ported TNs of one NPA. The porting rate of an NPA is log-normally distributed around
+        the scale's mean, and recipients follow the skewed carrier popularity.
+        """
+        rnd = random.Random(f"{self.seed}:sv:{npa}")
+        seen = set()
+        for tn in self.ported_tns(npa):
+            if tn in seen:
+                continue
+            seen.add(tn)
+            carrier = self.carrier(rnd)
+            lrn = npa + self._lrn_nxx(rnd, npa, carrier) + "0000"
+            row = _npac_row(carrier, lrn, rnd)
+            row.update({"tn": tn, "billingid": carrier.ocn, "lnptype": "lspp",
+                        "enduserlocationvalue": "", "enduserlocationtype": ""})
+            yield tuple(row.get(c, "") for c in TN2LRN_COLUMNS)
+
+    def ported_tns(self, npa: str) -> Iterator[str]:
+        # Drawn from their own stream so the trace can reproduce them without building the rows
+        rnd = random.Random(f"{self.seed}:tn:{npa}")
+        blocks = self.blocks(npa)
+        count = int(self.ported_per_npa * min(rnd.lognormvariate(0, 0.6), 5))
+        for _ in range(count):
+            yield f"{npa}{blocks[rnd.randrange(len(blocks))][0]}{rnd.randint(0, 9999):04d}"
+
+    def _lrn_nxx(self, rnd: random.Random, npa: str, carrier: Carrier) -> str:
+        # LRNs point at an NXX the recipient owns in the NPA, or any NXX if it owns none
+        if npa not in self._owned:
+            owned: dict[str, list[str]] = {}
+            for nxx, owner, _ in self.blocks(npa):
+                owned.setdefault(owner.ocn, []).append(nxx)
+            self._owned[npa] = owned
+        nxxs = self._owned[npa].get(carrier.ocn)
+        return rnd.choice(nxxs) if nxxs else rnd.choice(self.blocks(npa))[0]
+
+    def reference_rows(self) -> dict[str, Iterator[tuple]]:
+        names = {c.co_spec_name: c for c in self.carriers}
+        return {
+            "lerg6": self.lerg6_rows(),
+            "local": self.local_rows(),
+            "numberpoolblock": self.numberpoolblock_rows(),
+            "spidnames": ((c.spid, c.name) for c in {c.spid: c for c in self.carriers}.values()),
+            "simple_carrier_names": ((name, c.name.split(" ")[0].title()) for name, c in names.items()),
+            "nnmp": ((name, c.nnmp) for name, c in names.items()),
+        }
+
+    #-------------------------------------------------------------------------------------------------
+    def trace(self, size: int, zipf_s: float = 1.0, universe: int = 1000000, ported_share: float = 0.5) -> Iterator[str]:
+        """
+        TN workload trace with Zipfian popularity: a fixed universe of TNs (a `ported_share`
+        of them ported, the rest random lines in LERG6 blocks) is ranked and each request
+        picks rank k with probability proportional to 1/k^s.
+        """
+        rnd = random.Random(f"{self.seed}:trace")
+        tns = []
+        per_npa = max(1, int(universe * ported_share / len(self.npas)))
+        for npa in self.npas:
+            for i, tn in enumerate(self.ported_tns(npa)):
+                if i >= per_npa:
+                    break
+                tns.append(tn)
+        while len(tns) < universe:
+            npa = rnd.choice(self.npas)
+            tns.append(f"{npa}{rnd.choice(self.blocks(npa))[0]}{rnd.randint(0, 9999):04d}")
+        rnd.shuffle(tns)
+        cum = _zipf_cum_weights(len(tns), zipf_s)
+        total = cum[-1]
+        for _ in range(size):
+            yield tns[bisect.bisect_left(cum, rnd.random() * total)]
+
+#-----------------------------------------------------------------------------------------------------
+# Bulk loading
+#-----------------------------------------------------------------------------------------------------
+async def load_dataset(dataset: NumberingDataset, replace: bool = False):
+    """
+    Creates the numbering tables (if missing) and COPYs the dataset into them.
+    Refuses to touch non-empty tables unless `replace` is set, in which case they are truncated.
+    """
+    tn2lrn_tables = {npa: create_dynamic_model("tn2lrn" + npa).__table__ for npa in dataset.npas}
+    reference_models = (Lerg6Model, LocalModel, Numberpoolblock, SPIDNamesModel, SimpleCarrierNamesModel, NNMPModel)
+
+    async with _NUMBERING_ASYNC_ENGINE.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all,
+                            tables=[m.__table__ for m in reference_models] + list(tn2lrn_tables.values()),
+                            checkfirst=True)
+        tables = list(REFERENCE_TABLES) + [t.name for t in tn2lrn_tables.values()]
+        non_empty = [t for t in tables if await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {t})"))]
+        if non_empty and not replace:
+            raise RuntimeError(f"Tables already contain data: {', '.join(non_empty[:10])}; use --replace to truncate them")
+        if non_empty:
+            await conn.execute(text(f"TRUNCATE {', '.join(non_empty)}"))
+
+    async with _NUMBERING_ASYNC_ENGINE.connect() as conn:
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        for table, rows in dataset.reference_rows().items():
+            count = await _copy(driver, table, rows)
+            logger.info(f"Loaded {count} rows into {table}")
+        total = 0
+        for npa, table in tn2lrn_tables.items():
+            total += await _copy(driver, table.name, dataset.tn2lrn_rows(npa))
+        logger.info(f"Loaded {total} ported TNs into {len(tn2lrn_tables)} tn2lrnNPA tables")
+        for table in tables:
+            await driver.execute(f"ANALYZE {table}")
+
+async def _copy(driver, table: str, rows: Iterator[tuple]) -> int:
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= COPY_CHUNK:
+            await driver.copy_records_to_table(table, records=chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        await driver.copy_records_to_table(table, records=chunk)
+        count += len(chunk)
+    return count
+
+#-----------------------------------------------------------------------------------------------------
+def _weighted(rnd: random.Random, choices: tuple) -> str:
+    return rnd.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+def _syllables(rnd: random.Random) -> str:
+    return "".join(rnd.choice(("BA", "CO", "DI", "FE", "GA", "LO", "MI", "NU", "RA", "TEL", "VO", "ZE")) for _ in range(rnd.randint(2, 4)))
+
+def _zipf_cum_weights(n: int, s: float) -> list[float]:
+    cum, total = [], 0.0
+    for k in range(1, n + 1):
+        total += 1.0 / k ** s
+        cum.append(total)
+    return cum
+
+def _npac_row(carrier: Carrier, lrn: str, rnd: random.Random) -> dict:
+    stamp = f"20{rnd.randint(15, 25)}{rnd.randint(1, 12):02d}{rnd.randint(1, 28):02d}{rnd.randint(0, 23):02d}{rnd.randint(0, 59):02d}00"
+    return {
+        "mibcreatetime": stamp, "mibupdatetime": stamp, "lrn": lrn, "spid": carrier.spid,
+        "activationtimestamp": stamp + "000", "class_dpc": "", "class_ssn": "", "lidb_dpc": "", "lidb_ssn": "",
+        "cnam_dpc": "", "cnam_ssn": "", "isvm_dpc": "", "isvm_ssn": "", "wsmsc_dpc": "", "wsmsc_ssn": "",
+        "downloadreason": "new", "svtype": "wireless" if carrier.category == "WIRELESS" else "wireline",
+        "altspid": "", "alteult": "", "alteulv": "", "altbid": "", "voiceuri": "", "mmsuri": "", "smsuri": ""
+    }
+
+#-----------------------------------------------------------------------------------------------------
+async def run(args):
+    dataset = NumberingDataset(seed=args.seed, scale=args.scale)
+    logger.info(f"Dataset seed {args.seed} scale {args.scale}: {len(dataset.npas)} NPAs, "
+                f"{dataset.nxx_per_npa} NXX per NPA, ~{dataset.ported_per_npa} ported TNs per NPA")
+    try:
+        if not args.trace_only:
+            await load_dataset(dataset, replace=args.replace)
+    finally:
+        await _NUMBERING_ASYNC_ENGINE.dispose()
+    if args.trace:
+        with open(args.trace, "w") as f:
+            for tn in dataset.trace(args.trace_size, args.zipf_s, args.trace_universe):
+                f.write(tn + "\n")
+        logger.info(f"Wrote {args.trace_size} TNs to {args.trace}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Generate and bulk-load a synthetic numbering dataset")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed and scale give the same data")
+    parser.add_argument("--scale", type=float, default=0.01, help="Scale factor, 1.0 is production size (~33M ported TNs)")
+    parser.add_argument("--replace", action="store_true", help="Truncate non-empty tables before loading")
+    parser.add_argument("--trace", help="Also write a Zipfian TN workload trace to this file")
+    parser.add_argument("--trace-size", type=int, default=1000000, help="Number of TNs in the trace")
+    parser.add_argument("--trace-universe", type=int, default=1000000, help="Distinct TNs the trace draws from")
+    parser.add_argument("--zipf-s", type=float, default=1.0, help="Zipf exponent of TN popularity")
+    parser.add_argument("--trace-only", action="store_true", help="Only write the trace, do not touch the database")
+    args = parser.parse_args()
+    asyncio.run(run(args))
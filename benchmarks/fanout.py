@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+import subprocess
+
+from datetime import datetime, timezone
+
+from benchmarks.load import DEFAULT_MIX, git_revision, compare
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#-----------------------------------------------------------------------------------------------------
+def run_point(args, fanout: bool, extra: list[str]) -> dict:
+    """
+    Runs benchmarks.load in-process in a fresh interpreter (LOOKUP_FANOUT is read at import)
+    and returns its JSON results.
+    """
+    env = dict(os.environ, LOOKUP_FANOUT="true" if fanout else "false")
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        cmd = [sys.executable, "-m", "benchmarks.load", "--rps", str(args.rps), "--duration", str(args.duration),
+               "--mix", args.mix, "--seed", str(args.seed), "--login", args.login, "--password", args.password,
+               "--output", output.name] + extra
+        if args.trace:
+            cmd += ["--trace", args.trace]
+        subprocess.run(cmd, cwd=PROJECT_DIR, env=env, check=True)
+        with open(output.name) as f:
+            return json.load(f)
+
+def run(args):
+    # the dataset and bench user are seeded once, by the first (sequential) run
+    seed = (["--seed-data", "--scale", str(args.scale), "--replace"] if args.seed_data else []) + \
+           (["--seed-user"] if args.seed_user else [])
+
+    logger.info("Running with LOOKUP_FANOUT=false")
+    sequential = run_point(args, False, seed)
+    logger.info("Running with LOOKUP_FANOUT=true")
+    fanout = run_point(args, True, [])
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "mix": args.mix,
+            "rps": args.rps,
+            "duration_s": args.duration
+        },
+        "sequential": sequential,
+        "fanout": fanout
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logger.info(f"Fan-out results written to {args.output}")
+    else:
+        print(output)
+
+    print("LOOKUP_FANOUT=false -> LOOKUP_FANOUT=true:")
+    for line in compare(fanout, sequential):
+        print(line)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Latency of the /v1 numbering endpoints with and without lookup fan-out")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Traffic mix, e.g. FullDataCoSpec=50,LRNjurisdiction=50")
+    parser.add_argument("--rps", type=float, default=200, help="Fixed request rate")
+    parser.add_argument("--duration", type=float, default=30, help="Load phase length in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the workload and the seeded data")
+    parser.add_argument("--seed-data", action="store_true", help="Generate and COPY a synthetic numbering dataset first")
+    parser.add_argument("--scale", type=float, default=0.001, help="Scale factor of the dataset generated by --seed-data")
+    parser.add_argument("--seed-user", action="store_true", help="Create the bench user, product and rates first")
+    parser.add_argument("--trace", help="Replay TNs from a trace file (benchmarks.dataset --trace)")
+    parser.add_argument("--login", default="bench", help="Login used for the run")
+    parser.add_argument("--password", default="bench", help="Password used for the run")
+    parser.add_argument("--output", help="Write the JSON results of both runs to this file")
+    args = parser.parse_args()
+    run(args)
@@ -0,0 +1,351 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "http://testserver"
+DEFAULT_MIX = "LRN=40,FullDataCoSpec=30,LRNjurisdiction=20,NNMP=10"
+ENDPOINT_PATHS = {
+    "LRN": "/v1/LRN/",
+    "FullDataCoSpec": "/v1/FullDataCoSpec/",
+    "LRNjurisdiction": "/v1/LRNjurisdiction/",
+    "NNMP": "/v1/NNMP/",
+}
+
+#-----------------------------------------------------------------------------------------------------
+# Instrumentation (in-process runs only)
+#-----------------------------------------------------------------------------------------------------
+class Counters:
+    """
+    Counts SQL statements sent by the numbering engine and commands sent by the shared
+    Redis client. Counts are global, so per-request figures come from the sequential
+    profiling pass where only one request is in flight.
+    """
+    def __init__(self):
+        self.statements = 0
+        self.redis_commands = 0
+
+    def attach(self, engine, redis_client):
+        from sqlalchemy import event
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self.statements += 1
+        event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+        if redis_client is not None:
+            execute_command = redis_client.execute_command
+
+            async def counted_execute_command(*args, **kwargs):
+                self.redis_commands += 1
+                return await execute_command(*args, **kwargs)
+            redis_client.execute_command = counted_execute_command
+
+    def snapshot(self) -> tuple[int, int]:
+        return self.statements, self.redis_commands
+
+#-----------------------------------------------------------------------------------------------------
+# Workload
+#-----------------------------------------------------------------------------------------------------
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINT_PATHS:
+            raise ValueError(f"Unknown endpoint in mix: {name}. Expected one of {', '.join(ENDPOINT_PATHS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+def request_params(endpoint: str, tn: str, cn: str, response_type: str) -> dict:
+    params = {"tn": tn, "type": response_type}
+    if endpoint == "LRNjurisdiction":
+        params["cn"] = cn
+    return params
+
+async def load_tns(count: int, seed: int) -> list[str]:
+    """
+    Builds the TN pool from the database: ported TNs from the tn2lrnNPA tables mixed
+    with random lines inside LERG6 blocks, so lookups exercise both the SV and the
+    number pool/LERG6 fallback paths.
+    """
+    from sqlalchemy import text
+    from src.databases.database_session import _NUMBERING_ASYNC_SESSIONMAKER
+
+    rnd = random.Random(seed)
+    async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+        tables = (await session.execute(text(
+            "SELECT table_name FROM information_schema.tables WHERE table_name ~ '^tn2lrn[0-9]{3}$' ORDER BY table_name"
+        ))).scalars().all()
+        ported = []
+        for table in tables:
+            ported += (await session.execute(text(f"SELECT tn FROM {table} ORDER BY tn LIMIT :n"), {"n": count})).scalars().all()
+        blocks = (await session.execute(text("SELECT npanxxx FROM lerg6 ORDER BY npanxxx LIMIT :n"), {"n": count})).scalars().all()
+
+    if not ported and not blocks:
+        raise RuntimeError("No numbering data found; run with --seed-data or load a dataset first")
+    rnd.shuffle(ported)
+    tns = ported[:count // 2]
+    while len(tns) < count and blocks:
+        tns.append(f"{rnd.choice(blocks)[:6]}{rnd.randint(0, 9999):04d}")
+    rnd.shuffle(tns)
+    return tns
+
+def read_trace(path: str) -> list[str]:
+    # One TN per line, as written by benchmarks.dataset --trace
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+#-----------------------------------------------------------------------------------------------------
+# Runners
+#-----------------------------------------------------------------------------------------------------
+async def login(client, login_name: str, password: str) -> dict:
+    resp = await client.post("/auth/login", json={"login": login_name, "password": password})
+    if resp.status_code != 200:
+        raise RuntimeError(f"Login failed for {login_name}: {resp.status_code} {resp.text}")
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+async def profile(client, headers: dict, endpoints: list[str], tns: list[str], requests: int,
+                  counters: Optional[Counters], response_type: str) -> dict:
+    """
+    Sends `requests` sequential requests per endpoint and returns the average number of
+    SQL statements and Redis commands per request.
+    """
+    ret = {}
+    for endpoint in endpoints:
+        if counters is None:
+            ret[endpoint] = {"statements_per_request": None, "redis_commands_per_request": None}
+            continue
+        statements, redis_commands = counters.snapshot()
+        for i in range(requests):
+            params = request_params(endpoint, tns[i % len(tns)], tns[(i + 1) % len(tns)], response_type)
+            await client.get(ENDPOINT_PATHS[endpoint], params=params, headers=headers)
+        statements_after, redis_after = counters.snapshot()
+        ret[endpoint] = {
+            "statements_per_request": round((statements_after - statements) / requests, 2),
+            "redis_commands_per_request": round((redis_after - redis_commands) / requests, 2)
+        }
+    return ret
+
+async def run_load(client, headers: dict, mix: dict[str, float], tns: list[str], rps: float, duration: float,
+                   max_inflight: int, seed: int, response_type: str) -> tuple[dict, float]:
+    """
+    Open-loop load: request i is scheduled at start + i / rps regardless of how long
+    earlier requests take, and its latency is measured from the scheduled time so queueing
+    delay is not hidden (no coordinated omission). Requests that would exceed
+    `max_inflight` are counted as dropped.
+    """
+    rnd = random.Random(seed)
+    names = list(mix.keys())
+    weights = list(mix.values())
+    samples: dict[str, list[float]] = {name: [] for name in names}
+    errors: dict[str, int] = {name: 0 for name in names}
+    dropped: dict[str, int] = {name: 0 for name in names}
+    inflight = set()
+
+    async def one(endpoint: str, params: dict, scheduled: float):
+        try:
+            resp = await client.get(ENDPOINT_PATHS[endpoint], params=params, headers=headers)
+            if resp.status_code != 200:
+                errors[endpoint] += 1
+        except Exception:
+            errors[endpoint] += 1
+        samples[endpoint].append(time.perf_counter() - scheduled)
+
+    total = int(rps * duration)
+    start = time.perf_counter()
+    for i in range(total):
+        scheduled = start + i / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint = rnd.choices(names, weights)[0]
+        if len(inflight) >= max_inflight:
+            dropped[endpoint] += 1
+            continue
+        params = request_params(endpoint, rnd.choice(tns), rnd.choice(tns), response_type)
+        task = asyncio.create_task(one(endpoint, params, scheduled))
+        inflight.add(task)
+        task.add_done_callback(inflight.discard)
+    if inflight:
+        await asyncio.gather(*inflight)
+    elapsed = time.perf_counter() - start
+
+    return {name: {"samples": samples[name], "errors": errors[name], "dropped": dropped[name]} for name in names}, elapsed
+
+#-----------------------------------------------------------------------------------------------------
+# Reporting
+#-----------------------------------------------------------------------------------------------------
+def percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    f = int(k)
+    c = min(f + 1, len(ordered) - 1)
+    return ordered[f] + (ordered[c] - ordered[f]) * (k - f)
+
+def summarize(samples: list[float], errors: int, dropped: int, elapsed: float) -> dict:
+    ms = [s * 1000 for s in samples]
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "dropped": dropped,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": _round(percentile(ms, 50)),
+            "p95": _round(percentile(ms, 95)),
+            "p99": _round(percentile(ms, 99)),
+            "mean": _round(sum(ms) / len(ms)) if ms else None,
+            "max": _round(max(ms)) if ms else None
+        }
+    }
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """
+    Returns one line per endpoint and metric with the relative change against a baseline run.
+    """
+    lines = []
+    for endpoint, result in current["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(endpoint)
+        if base is None:
+            continue
+        for metric in ("p50", "p95", "p99"):
+            lines.append(_delta(f"{endpoint} {metric} ms", result["latency_ms"][metric], base["latency_ms"][metric]))
+        for metric in ("throughput_rps", "statements_per_request", "redis_commands_per_request"):
+            lines.append(_delta(f"{endpoint} {metric}", result.get(metric), base.get(metric)))
+    return [line for line in lines if line]
+
+def _delta(label: str, value, base) -> Optional[str]:
+    if value is None or base is None:
+        return None
+    change = f"{(value - base) / base * 100:+.1f}%" if base else "n/a"
+    return f"{label:<45} {base:>10} -> {value:<10} {change}"
+
+#-----------------------------------------------------------------------------------------------------
+async def run(args):
+    import httpx
+
+    mix = parse_mix(args.mix)
+    counters = None
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.max_inflight))
+        lifespan = None
+    else:
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="routeapi-bench-"))
+        from main import app, lifespan as app_lifespan
+        import src.databases.redis_cache
+        from src.databases.database_session import _NUMBERING_ASYNC_ENGINE
+        from benchmarks.seed import seed_bench_user
+        from benchmarks.dataset import NumberingDataset, load_dataset
+
+        lifespan = app_lifespan(app)
+        await lifespan.__aenter__()
+        if args.seed_data:
+            await load_dataset(NumberingDataset(seed=args.seed, scale=args.scale), replace=args.replace)
+        if args.seed_user:
+            from src.databases.database_session import _NUMBERING_ASYNC_SESSIONMAKER
+            async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+                await seed_bench_user(session)
+        counters = Counters()
+        counters.attach(_NUMBERING_ASYNC_ENGINE, src.databases.redis_cache.redis_client)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=BASE_URL, timeout=args.timeout)
+
+    try:
+        tns = read_trace(args.trace) if args.trace else await load_tns(args.tns, args.seed)
+        headers = await login(client, args.login, args.password)
+
+        # Warm up connections and caches, then measure per-request work and latency
+        await profile(client, headers, list(mix), tns, args.warmup, None, args.type)
+        per_request = await profile(client, headers, list(mix), tns, args.profile_requests, counters, args.type)
+        raw, elapsed = await run_load(client, headers, mix, tns, args.rps, args.duration, args.max_inflight, args.seed, args.type)
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    endpoints = {}
+    all_samples, all_errors, all_dropped = [], 0, 0
+    for endpoint, data in raw.items():
+        endpoints[endpoint] = summarize(data["samples"], data["errors"], data["dropped"], elapsed)
+        endpoints[endpoint].update(per_request[endpoint])
+        all_samples += data["samples"]
+        all_errors += data["errors"]
+        all_dropped += data["dropped"]
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "target": args.url or "in-process",
+            "mix": mix,
+            "rps": args.rps,
+            "duration_s": args.duration,
+            "elapsed_s": round(elapsed, 3),
+            "response_type": args.type,
+            "seed": args.seed
+        },
+        "total": summarize(all_samples, all_errors, all_dropped, elapsed),
+        "endpoints": endpoints
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logger.info(f"Benchmark results written to {args.output}")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} (revision {baseline.get('meta', {}).get('revision')}):")
+        for line in compare(result, baseline):
+            print(line)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Open-loop latency benchmark for the /v1 numbering endpoints")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app (no statement/Redis counts)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Traffic mix, e.g. LRN=40,FullDataCoSpec=30,LRNjurisdiction=20,NNMP=10")
+    parser.add_argument("--rps", type=float, default=200, help="Fixed request rate")
+    parser.add_argument("--duration", type=float, default=30, help="Load phase length in seconds")
+    parser.add_argument("--max-inflight", type=int, default=500, help="Requests above this many in flight are dropped")
+    parser.add_argument("--type", default="json", choices=["json", "raw", "xml"], help="Response type requested")
+    parser.add_argument("--tns", type=int, default=5000, help="Size of the TN pool")
+    parser.add_argument("--warmup", type=int, default=50, help="Sequential warm-up requests per endpoint")
+    parser.add_argument("--profile-requests", type=int, default=100, help="Sequential requests per endpoint used for statement/Redis counts")
+    parser.add_argument("--timeout", type=float, default=30, help="Client timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the workload and the seeded data")
+    parser.add_argument("--seed-data", action="store_true", help="Generate and COPY a synthetic numbering dataset before the run (in-process only)")
+    parser.add_argument("--scale", type=float, default=0.001, help="Scale factor of the dataset generated by --seed-data")
+    parser.add_argument("--replace", action="store_true", help="Let --seed-data truncate numbering tables that already hold data")
+    parser.add_argument("--trace", help="Replay TNs from a trace file (benchmarks.dataset --trace) instead of sampling the database")
+    parser.add_argument("--seed-user", action="store_true", help="Create the bench user, product and rates (in-process only)")
+    parser.add_argument("--login", default="bench", help="Login used for the run")
+    parser.add_argument("--password", default="bench", help="Password used for the run")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    args = parser.parse_args()
+    asyncio.run(run(args))
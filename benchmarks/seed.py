@@ -0,0 +1,82 @@
+import logging
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from src.models.users import UserProfilesModel, UserSettingsModel, RatesModel, ProductsModel, EndpointsModel
+from src.auth.passwords import hash_password
+
+logger = logging.getLogger(__name__)
+
+BENCH_LOGIN = "bench"
+BENCH_PASSWORD = "bench"
+BENCH_PRODUCT = "bench"
+
+# Endpoint names as registered in the endpoints table (handler function names) ------------------------
+BENCH_ENDPOINTS = {
+    "LRN": "get_lrn",
+    "FullDataCoSpec": "get_full_dataCoSpec",
+    "LRNjurisdiction": "get_lrn_jurisdiction",
+    "NNMP": "get_nnmp",
+}
+
+# Async function to create (or refresh) the benchmark user with access to every benchmarked endpoint ---
+async def seed_bench_user(session) -> int:
+    """
+    Creates the `bench` user, product, rates and settings used by the load harness.
+    Rates are zero so a benchmark run never shows up in the revenue reports.
+
+    Returns:
+        int: The benchmark user id.
+    """
+    product_id = await session.scalar(select(ProductsModel.id).where(ProductsModel.productname == BENCH_PRODUCT))
+    if product_id is None:
+        product_id = await session.scalar(
+            insert(ProductsModel).values(productname=BENCH_PRODUCT, description="Load test product").returning(ProductsModel.id)
+        )
+
+    for endpoint in BENCH_ENDPOINTS.values():
+        endpoint_id = await session.scalar(select(EndpointsModel.id).where(EndpointsModel.endpoint == endpoint))
+        if endpoint_id is None:
+            endpoint_id = await session.scalar(
+                insert(EndpointsModel).values(endpoint=endpoint, description=endpoint).returning(EndpointsModel.id)
+            )
+        rate_id = await session.scalar(
+            select(RatesModel.id).where(RatesModel.productid == product_id, RatesModel.endpointid == endpoint_id)
+        )
+        if rate_id is None:
+            await session.execute(
+                insert(RatesModel).values(productid=product_id, endpointid=endpoint_id, rate=0.0,
+                                          dateeff=text("now() - interval '1 day'"))
+            )
+
+    user = await session.scalar(select(UserProfilesModel).where(UserProfilesModel.login == BENCH_LOGIN))
+    password_hash = await hash_password(BENCH_PASSWORD)
+    if user is None:
+        user_id = await session.scalar(
+            insert(UserProfilesModel).values(
+                username="test_bench",
+                name="Benchmark",
+                login=BENCH_LOGIN,
+                password=password_hash,
+                email="bench@localhost",
+                isactive=True,
+                issuperuser=False
+            ).returning(UserProfilesModel.id)
+        )
+    else:
+        user_id = user.id
+        user.password = password_hash
+        user.isactive = True
+
+    stmt = insert(UserSettingsModel).values(
+        userid=user_id,
+        productid=product_id,
+        note="benchmark",
+        ratio=1.0,
+        productpriority=0,
+        dateeff=text("now() - interval '1 day'")
+    )
+    stmt = stmt.on_conflict_do_update(index_elements=["userid"], set_={"productid": product_id})
+    await session.execute(stmt)
+    await session.commit()
+    return user_id
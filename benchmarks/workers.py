@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+from datetime import datetime, timezone
+
+from benchmarks.load import DEFAULT_MIX, git_revision
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#-----------------------------------------------------------------------------------------------------
+# Server under test
+#-----------------------------------------------------------------------------------------------------
+def start_server(workers: int, port: int, env_overrides: dict) -> subprocess.Popen:
+    env = dict(os.environ, FASTAPIWORKERS=str(workers), EXPOSE_PORT=str(port), **env_overrides)
+    env.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="routeapi-bench-"))
+    return subprocess.Popen([sys.executable, "main.py"], cwd=PROJECT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_healthy(url: str, workers: int, timeout: float) -> float:
+    """
+    Polls /health until `workers` consecutive answers are 200 (every worker is warm);
+    returns the seconds it took.
+    """
+    started = time.perf_counter()
+    healthy = 0
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=2) as response:
+                healthy = healthy + 1 if response.status == 200 else 0
+        except Exception:
+            healthy = 0
+        if healthy >= workers:
+            return time.perf_counter() - started
+        time.sleep(0.1 if healthy else 0.5)
+    raise TimeoutError(f"Server with {workers} workers not healthy after {timeout}s")
+
+def stop_server(server: subprocess.Popen):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+#-----------------------------------------------------------------------------------------------------
+def run_point(args, workers: int, rps: float) -> dict:
+    url = f"http://127.0.0.1:{args.port}"
+    server = start_server(workers, args.port, {"DB_CONNECTION_BUDGET": str(args.budget)} if args.budget else {})
+    try:
+        boot = wait_healthy(url, workers, args.boot_timeout)
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            cmd = [sys.executable, "-m", "benchmarks.load", "--url", url, "--rps", str(rps),
+                   "--duration", str(args.duration), "--mix", args.mix, "--login", args.login,
+                   "--password", args.password, "--output", output.name]
+            subprocess.run(cmd, cwd=PROJECT_DIR, check=True)
+            with open(output.name) as f:
+                result = json.load(f)
+    finally:
+        stop_server(server)
+
+    total = result["total"]
+    total.update({"workers": workers, "rps": rps, "boot_s": round(boot, 3)})
+    return total
+
+def run(args):
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    rates = [float(r) for r in args.rps.split(",")]
+
+    points = []
+    for workers in worker_counts:
+        for rps in rates:
+            logger.info(f"Running {workers} workers at {rps} rps")
+            points.append(run_point(args, workers, rps))
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "cpu_count": os.cpu_count(),
+            "db_connection_budget": args.budget,
+            "mix": args.mix,
+            "duration_s": args.duration
+        },
+        "points": points
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logger.info(f"Worker sweep results written to {args.output}")
+    else:
+        print(output)
+
+    print(f"{'workers':>8} {'rps':>8} {'achieved':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'dropped':>8} {'boot s':>7}")
+    for p in points:
+        latency = p["latency_ms"]
+        print(f"{p['workers']:>8} {p['rps']:>8} {p['throughput_rps']!s:>9} {latency['p50']!s:>8} {latency['p95']!s:>8} "
+              f"{latency['p99']!s:>8} {p['errors']:>7} {p['dropped']:>8} {p['boot_s']:>7}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Throughput/latency of the gunicorn server across worker counts")
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count()},{os.cpu_count() * 2}", help="Worker counts to run, e.g. 1,2,4,8")
+    parser.add_argument("--rps", default="200,500", help="Request rates to run at each worker count")
+    parser.add_argument("--duration", type=float, default=30, help="Load phase length in seconds")
+    parser.add_argument("--budget", type=int, help="DB_CONNECTION_BUDGET of the server (default: its own)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Traffic mix")
+    parser.add_argument("--port", type=int, default=18180, help="Port of the server under test")
+    parser.add_argument("--boot-timeout", type=float, default=120, help="Seconds to wait for every worker to be healthy")
+    parser.add_argument("--login", default="bench", help="Login used for the run")
+    parser.add_argument("--password", default="bench", help="Password used for the run")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+    run(args)
@@ -3,33 +3,57 @@
 #
 # VK 2024-2025
 
-import multiprocessing
+import asyncio
 import logging
 import os
 import shutil
 
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from src.api import main_router, built_v1 as built
+from src.api import main_router, built_v1 as built, APP_NAME
 
-from src.utils.observability import PrometheusMiddleware, metrics
+from src.utils.observability import PrometheusMiddleware, metrics, setting_otlp, debug_queries
+from src.utils.queryprofiler import QueryProfilerMiddleware
 from gunicorn.app.base import BaseApplication
-from prometheus_client import multiprocess
+from uvicorn.workers import UvicornWorker
 from contextlib import asynccontextmanager
 from src.databases.redis_cache import redis_startup
 from fastapi import HTTPException
 from authx.exceptions import AuthXException
 from src.utils.logger import billing_logger
+from src.utils.warmup import WARMUP, warmup
+from src.configs.settings import get_settings, logging_config
+from src.configs import serving
+from src.databases.database_session import POOL_SIZE, MAX_OVERFLOW
+from src.utils.deadline import DeadlineExceeded, RESULT_STATUS_HEADER
 
-def number_of_workers():
-    return multiprocessing.cpu_count()*2 
-
-APP_NAME = os.environ.get("APP_NAME", "ALL")
 EXPOSE_PORT = os.environ.get("EXPOSE_PORT", 8180)
-WORKERS = os.environ.get("FASTAPIWORKERS", number_of_workers())
+OTLP_GRPC_ENDPOINT = os.environ.get("OTLP_GRPC_ENDPOINT", "")
+WORKERS = serving.number_of_workers()
+
+# Uvicorn worker on uvloop/httptools when they are installed
+class RouteAPIWorker(UvicornWorker):
+    CONFIG_KWARGS = {"loop": serving.uvicorn_loop(), "http": serving.uvicorn_http()}
+
+# Function to clear the Prometheus multiprocess files of the previous run (once, in the master;
+# recycled workers must not wipe the metrics of the running ones)
+def clear_prometheus_dir():
+    pmd = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    if os.path.isdir(pmd):
+        for filename in os.listdir(pmd):
+            file_path = os.path.join(pmd, filename)
+            try:
+                if os.path.isfile(file_path) or os.path.islink(file_path):
+                    os.unlink(file_path)
+                elif os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+            except Exception as e:
+                print(f"Failed to delete {file_path}: {e}")
 
 def child_exit(server, worker):
+    from prometheus_client import multiprocess
     multiprocess.mark_process_dead(worker.pid)
 
 class StandaloneApplication(BaseApplication):
@@ -50,20 +74,13 @@ class StandaloneApplication(BaseApplication):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
  
+    logging_config(log_level=get_settings().log_level)
     redis_startup() 
     billing_logger.rotate_handler_periodically()
 
-    pmd = os.environ["PROMETHEUS_MULTIPROC_DIR"]
-    if os.path.isdir(pmd):
-        for filename in os.listdir(pmd):
-            file_path = os.path.join(pmd, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f"Failed to delete {file_path}: {e}")
+    # Warm pool connections, statements, models and caches; /health is 503 until done
+    if WARMUP:
+        asyncio.create_task(warmup())
     yield
 
 app = FastAPI(
@@ -89,6 +106,14 @@ app.include_router(main_router)
 app.add_middleware(PrometheusMiddleware, app_name=APP_NAME)
 app.add_route("/metrics", metrics)
 
+# Setting SQL statement profiler (per-request statement counts, /debug/queries)
+app.add_middleware(QueryProfilerMiddleware)
+app.add_route("/debug/queries", debug_queries, include_in_schema=False)
+
+# Setting OpenTelemetry exporter (stage timings become spans)
+if OTLP_GRPC_ENDPOINT:
+    setting_otlp(app, APP_NAME, OTLP_GRPC_ENDPOINT)
+
 # Configure logging
 logger = logging.getLogger("app")
 
@@ -99,14 +124,38 @@ async def authx_exception_handler(request: Request, exc: AuthXException):
         detail=f"AuthXException Error: {str(exc)}"
     )
 
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exception_handler(request: Request, exc: DeadlineExceeded):
+    deadline = getattr(request.state, "deadline", None)
+    # a lookup that already marked the deadline has counted it in DEADLINE_EXCEEDED
+    if deadline is not None and deadline.status == "complete":
+        deadline.mark("timeout")
+    return JSONResponse(
+        status_code=504,
+        content={"detail": "Deadline exceeded"},
+        headers={RESULT_STATUS_HEADER: "timeout"}
+    )
+
 if __name__ == "__main__":
-    logger.info(f"Starting RouteAPI {built} on port {EXPOSE_PORT} with {WORKERS} workers")
+    logging_config(log_level=get_settings().log_level)
+    clear_prometheus_dir()
+    logger.info(f"Starting RouteAPI {built} on port {EXPOSE_PORT} with {WORKERS} workers "
+                f"({RouteAPIWorker.CONFIG_KWARGS['loop']}/{RouteAPIWorker.CONFIG_KWARGS['http']}), "
+                f"DB pool {POOL_SIZE}+{MAX_OVERFLOW} per worker")
     options = {
         "bind": "%s:%s" % ("0.0.0.0", EXPOSE_PORT),
         "workers":  WORKERS,
-        "worker_class": "uvicorn.workers.UvicornWorker",
+        "worker_class": RouteAPIWorker,
         "forwarded_allow_ips": "*", 
-        "proxy_headers": True
+        "proxy_headers": True,
+        # Recycle workers after MAX_REQUESTS (+ jitter, so they do not all restart at once);
+        # a stopping worker gets GRACEFUL_TIMEOUT to finish its in-flight requests
+        "max_requests": serving.MAX_REQUESTS,
+        "max_requests_jitter": serving.MAX_REQUESTS_JITTER,
+        "graceful_timeout": serving.GRACEFUL_TIMEOUT,
+        "timeout": serving.WORKER_TIMEOUT,
+        "keepalive": serving.KEEPALIVE,
+        "child_exit": child_exit,
     }
     StandaloneApplication(app, options).run()
 
@@ -1,12 +1,29 @@
+import os
+import importlib
+
 from fastapi import APIRouter, Query, Response
-from src.api.numbering_v1 import router as numbering_router_v1
-from src.api.auth import router as auth_router
-from src.api.stats import router as stat_router
-from src.api.ui import router as ui_router
 from src.version import built_v1
+from src.utils import warmup
 from src.schemas.numbering_v1 import TypeParamsSchema
 from typing import Annotated
 
+APP_NAME = os.environ.get("APP_NAME", "ALL")
+
+# Routers by module: (module, prefix, tag)
+ROUTERS = {
+    "numbering": ("src.api.numbering_v1", "/v1", "Numbering"),
+    "jobs": ("src.api.jobs", "/v1/jobs", "Jobs"),
+    "auth": ("src.api.auth", "/auth", "Auth"),
+    "stats": ("src.api.stats", "/stats", "Stats"),
+    "ui": ("src.api.ui", "/ui", "UI"),
+}
+
+# Routers mounted per node role; any other APP_NAME mounts all of them
+APP_ROUTERS = {
+    "API": ("numbering", "jobs", "auth"),
+    "ADMIN": ("auth", "stats", "ui"),
+}
+
 main_router = APIRouter()
 
 # Route API version 
@@ -21,12 +38,23 @@ async def root(param: Annotated[TypeParamsSchema, Query()]):
     elif param.type == 'xml':
         return Response(content=f"<built_v1>{built_v1}</built_v1>", media_type="application/xml")
 
-# Health check endpoint
+# Health check endpoint (unhealthy until the worker is warmed up)
 @main_router.get("/health")
-async def health_check():
+async def health_check(response: Response):
+    if not warmup.is_warm():
+        response.status_code = 503
+        return {"status": "warming", "stage": warmup.state["stage"]}
     return {"status": "healthy"}    
 
-main_router.include_router(numbering_router_v1, prefix="/v1", tags=["Numbering"])
-main_router.include_router(auth_router, prefix="/auth", tags=["Auth"])
-main_router.include_router(stat_router, prefix="/stats", tags=["Stats"])
-main_router.include_router(ui_router, prefix="/ui", tags=["UI"])
+# Function to get the routers of a node role ------------------------------------------------------
+def routers_for(app_name: str) -> tuple[str, ...]:
+    return APP_ROUTERS.get(app_name.upper(), tuple(ROUTERS))
+
+# Function to mount the routers of a node role (only their modules are imported) ------------------
+def include_routers(router: APIRouter, app_name: str):
+    for name in routers_for(app_name):
+        module, prefix, tag = ROUTERS[name]
+        router.include_router(importlib.import_module(module).router, prefix=prefix, tags=[tag])
+
+include_routers(main_router, APP_NAME)
+
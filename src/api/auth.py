@@ -1,9 +1,11 @@
+import time
 import logging
 
 from fastapi import APIRouter, HTTPException, Response, Depends, Request, status
 from src.schemas.auth.users import UserLoginSchema, UserPasswordChangeSchema
 from src.auth.jwt import security, config
 from src.auth.credentials import check_credentials, update_user_password
+from src.logic.users import get_user_product
 from sqlalchemy.ext.asyncio import AsyncSession
 from authx.schema import RequestToken
 from fastapi.security.utils import get_authorization_scheme_param
@@ -14,6 +16,20 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Function to build the signed product claims of an access token -------------------------------------------------
+async def product_claims(userid: int, session: AsyncSession) -> dict:
+    """
+    Signs the user's active product and ratio into the access token so that
+    endpoint access is resolved without a database round trip per request.
+    pexp is when the user's settings next change; after it the claims are not used.
+    Users without an active product get no claims and take the database path.
+    """
+    product = await get_user_product(userid, session)
+    if product is None:
+        return {}
+    productid, ratio, valid_secs = product
+    return {"pid": productid, "ratio": ratio, "pexp": time.time() + valid_secs}
+
 # Endpoint for user login ------------------------------------------------------------------------------------------ 
 @router.post("/login", summary="User login")
 async def login(creds: UserLoginSchema, request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
@@ -29,7 +45,8 @@ async def login(creds: UserLoginSchema, request: Request, response: Response, se
 
     # Create access token and set it in the response cookie
         userid=str(user.id)          
-        access_token  = security.create_access_token(uid=userid, data={"uname": user.username}, fresh=True)
+        claims = await product_claims(user.id, session)
+        access_token  = security.create_access_token(uid=userid, data={"uname": user.username, **claims}, fresh=True)
         refresh_token = security.create_refresh_token(uid=userid, data={"uname": user.username})
 
         security.set_access_cookies(response=response,  token=access_token)
@@ -68,7 +85,7 @@ async def change_password(creds: UserPasswordChangeSchema, request: Request, res
 
 # Endpoint for refreshing access token ---------------------------------------------------------------------------
 @router.post("/refresh", summary="Refresh access token")
-async def refresh_token(request: Request, response: Response):
+async def refresh_token(request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
 
     """
     Endpoint to refresh the access token
@@ -101,7 +118,8 @@ async def refresh_token(request: Request, response: Response):
         userid = refresh_payload.sub
         uname = refresh_payload.uname
 
-        access_token  = security.create_access_token(uid=userid, data={"uname": uname}, fresh=False)
+        claims = await product_claims(int(userid), session)
+        access_token  = security.create_access_token(uid=userid, data={"uname": uname, **claims}, fresh=False)
         refresh_token = security.create_refresh_token(uid=userid, data={"uname": uname} )
 
         response.set_cookie(config.JWT_ACCESS_COOKIE_NAME, access_token)
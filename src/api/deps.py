@@ -1,77 +1,202 @@
 from fastapi import Depends, HTTPException, status, Request
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.auth.jwt import security
-from src.logic.users import check_user_access, check_superuser_access
+from src.auth.principal import resolve_principal, claims_are_current, get_cached_rate, set_cached_rate
+from src.logic.users import check_user_access, check_superuser_access, get_product_rate
 from src.schemas.auth.users import UserEndpointSchema, UserInfoSchema
 from authx.schema import TokenPayload
 from src.utils.logger import getIPAddress
+from src.utils.ratelimit import check_rate_limit
+from src.utils.admission import admission, Overloaded, ADMISSION_RETRY_AFTER, ADMISSION_CACHE_ONLY
+from src.utils.deadline import DEADLINE_HEADER, request_budget_ms, start_deadline, stop_deadline, watch_disconnect, current_deadline
 from src.databases.database_session import get_async_session
 import src.databases.redis_cache
 
+import asyncio
 import logging
+import math
+
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 logger = logging.getLogger(__name__)
 
+TZ_HEADER = "X-Timezone"
+
+# Function to get the authenticated principal of a request or raise ---------------------------------------------
+def _require_principal(request: Request) -> TokenPayload:
+    payload = resolve_principal(request)
+    if payload is None:
+        raise request.state.auth_error
+
+    if (payload.sub is None or
+        payload.sub == "" or
+        payload.sub == "0"):
+        raise HTTPException(
+          status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User is not authenticated"
+        )
+    return payload
+
+# Function to resolve endpoint access from the signed token claims (no DB unless the rate is not cached) -----------
+async def _access_from_claims(payload: TokenPayload, uid: int, endpoint: str, session) -> Optional[UserEndpointSchema]:
+    productid = int(payload.pid)
+    rate = get_cached_rate(productid, endpoint)
+    if rate is None:
+        rate = await get_product_rate(productid=productid, endpoint=endpoint, session=session)
+        if rate is None:
+            return None
+        set_cached_rate(productid, endpoint, rate)
+
+    endpointid, amount, ratelimit, burst = rate
+    return UserEndpointSchema(
+        uid=uid,
+        username=payload.uname,
+        endpointid=endpointid,
+        endpoint=endpoint,
+        ip_address="",
+        productid=productid,
+        ratio=payload.ratio,
+        rate=amount,
+        ratelimit=ratelimit,
+        burst=burst
+    )
+
 # Function to require user endpoint access -------------------------------------------------------------------------
 def require_endpoint_access():
-    async def inner_require_endpoint_access(payload: TokenPayload = Depends(security.access_token_required),
-                                            session: AsyncSession = Depends(get_async_session),
-                                            request: Request = None) -> UserEndpointSchema:
-        
-        endpoint = request.scope["endpoint"].__name__
-        ip_address = getIPAddress(request)
-               
-        if (payload.sub is None or
-            payload.sub == "" or
-            payload.sub == "0"):
-            raise HTTPException(
-              status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User is not authenticated"
-            )
-        uid = int(payload.sub) 
+    async def inner_require_endpoint_access(request: Request,
+                                            session: AsyncSession = Depends(get_async_session)) -> UserEndpointSchema:
+        return await endpoint_access(request, request.scope["endpoint"].__name__, session)
+    
+    return inner_require_endpoint_access 
+
+# Async function to check and charge `calls` calls of the user to an endpoint -----------------------------------------
+async def endpoint_access(request: Request, endpoint: str, session: AsyncSession, calls: int = 1) -> UserEndpointSchema:
+    """
+    Resolves the user's product rate of `endpoint`, applies the rate limit and counts
+    `calls` billed calls (one per TN of a bulk request) in Redis. With calls=0 it only
+    checks access, for jobs that bill their TNs as the workers resolve them.
+    """
+    ip_address = getIPAddress(request)
+
+    payload = _require_principal(request)
+    uid = int(payload.sub) 
 
+    user = None
+    if claims_are_current(payload, uid):
+        user = await _access_from_claims(payload, uid, endpoint, session)
+    if user is None:
         user = await check_user_access(
             userid=uid, 
             endpoint=endpoint,
             session=session
         )
    
-        if user is None:
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access to this endpoint is forbidden"
+        )
+    user.ip_address = ip_address 
+    request.state.userinfo = user
+
+    # Local token bucket per (uid, endpoint); rejected calls are not billed
+    retry_after = check_rate_limit(user, calls)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+    amount = user.rate * user.ratio
+    
+    amt = float(amount or 0)
+    # Increment the endpoint call count and amount in Redis
+    if calls:
+        await src.databases.redis_cache.add_endpoint_calls(src.databases.redis_cache.redis_client,
+                                                           uid, user.endpointid, calls, amt * calls)
+    
+    return user
+
+# Async function to take back calls counted by endpoint_access that got no answer (deadline) ----------------------
+async def credit_calls(user: UserEndpointSchema, calls: int):
+    amt = float(user.rate * user.ratio or 0)
+    await src.databases.redis_cache.add_endpoint_calls(src.databases.redis_cache.redis_client,
+                                                       user.uid, user.endpointid, -calls, -amt * calls)
+
+# Function to set the deadline of a /v1 request -----------------------------------------------------------------------
+def request_deadline():
+    """
+    Starts the request deadline (X-Deadline-Ms header, else the endpoint default) that
+    bounds every DB statement of the request, and expires it early if the client disconnects.
+    The outcome is kept on request.state.deadline for the X-Result-Status header.
+    """
+    async def inner_request_deadline(request: Request):
+        endpoint = request.scope["endpoint"].__name__
+        deadline, token = start_deadline(endpoint, request_budget_ms(endpoint, request.headers.get(DEADLINE_HEADER)))
+        request.state.deadline = deadline
+        watcher = asyncio.create_task(watch_disconnect(request, deadline))
+        try:
+            yield deadline
+        finally:
+            watcher.cancel()
+            stop_deadline(token)
+
+    return inner_request_deadline
+
+# Function to admit a DB-bound request through the admission controller ----------------------------------------------
+def require_admission(cache_only: bool = False):
+    """
+    Holds an admission slot for the whole request (including authentication).
+    When the worker is overloaded the request gets 503 with Retry-After; endpoints that
+    can answer from cache (cache_only=True) run instead with request.state.cache_only set.
+    """
+    async def inner_require_admission(request: Request):
+        # a request never queues longer than its deadline allows
+        deadline = current_deadline()
+        try:
+            await admission.acquire(timeout=deadline.remaining() if deadline is not None else None)
+        except Overloaded as e:
+            if cache_only:
+                ADMISSION_CACHE_ONLY.labels(endpoint=request.scope["endpoint"].__name__).inc()
+                request.state.cache_only = True
+                yield
+                return
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access to this endpoint is forbidden"
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Service overloaded ({e.reason}), retry later",
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)}
             )
-        user.ip_address = ip_address 
-        amount = user.rate * user.ratio
-        
-        redis_key = f"epcalls:{uid}"
-        redis_amount_key = f"epamounts:{uid}"
-        amt = float(amount or 0)
-        # Increment the endpoint call count in Redis
-        await src.databases.redis_cache.redis_client.hincrby(redis_key, user.endpointid, 1)
-        # Increment the amount in Redis
-        await src.databases.redis_cache.redis_client.hincrbyfloat(redis_amount_key, user.endpointid, amt)
-        
-        return user
-    
-    return inner_require_endpoint_access 
+
+        request.state.cache_only = False
+        try:
+            yield
+        finally:
+            admission.release()
+
+    return inner_require_admission
+
+# Function to require an authenticated user, returns the user id ----------------------------------------------------
+def require_user():
+    async def inner_require_user(request: Request) -> int:
+        return int(_require_principal(request).sub)
+
+    return inner_require_user
 
 #  Function to require user info access -------------------------------------------------------------------------
 def require_info_access():
-    async def inner_require_info_access(payload: TokenPayload = Depends(security.access_token_required),
-                                        session: AsyncSession = Depends(get_async_session),
-                                        request: Request = None) -> UserInfoSchema:
+    async def inner_require_info_access(request: Request,
+                                        session: AsyncSession = Depends(get_async_session)) -> UserInfoSchema:
         
        
         ip_address = getIPAddress(request)
-               
-        if (payload.sub is None or
-            payload.sub == "" or
-            payload.sub == "0"):
+
+        payload = _require_principal(request)
+        if request.state.auth_method == "api_key":
             raise HTTPException(
-              status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User is not authenticated"
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="API keys are limited to /v1 endpoints"
             )
         uid = int(payload.sub)
         username = payload.uname 
@@ -85,4 +210,21 @@ def require_info_access():
             ip_address=ip_address
         )
         
-    return inner_require_info_access 
\ No newline at end of file
+    return inner_require_info_access
+
+# Function to read the optional report timezone override -------------------------------------------------------------------------
+def report_timezone():
+    async def inner_report_timezone(request: Request) -> Optional[str]:
+        tz = request.headers.get(TZ_HEADER)
+        if not tz:
+            return None
+        try:
+            ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown timezone: {tz}"
+            )
+        return tz
+
+    return inner_report_timezone
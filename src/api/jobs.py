@@ -0,0 +1,107 @@
+import uuid
+
+from fastapi import APIRouter, Depends, Query, Request, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.api import deps
+from src.api.numbering_v1 import BULK_ENDPOINTS
+from src.databases.database_session import get_async_session
+from src.logic import jobs
+from src.schemas.jobs import Job_ParamsSchema, JobSchema
+import src.databases.redis_cache
+
+router = APIRouter()
+
+# Endpoint to submit a lookup job over an uploaded TN file ---------------------------------------
+@router.post("/", summary="Submit a lookup job", status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    request: Request,
+    params: Annotated[Job_ParamsSchema, Query()],
+    session: AsyncSession = Depends(get_async_session)
+) -> JobSchema:
+    """
+    Submits a job running the `product` lookup over every TN of the request body: a CSV or
+    text file (optionally gzipped) with one TN per line, or tn,cn rows for LRNjurisdiction.
+    The job workers resolve it in chunks; poll /v1/jobs/{id} and download /v1/jobs/{id}/result.
+    Each TN is billed as one call of the product as its chunk is resolved.
+    """
+    userinfo = await deps.endpoint_access(request, BULK_ENDPOINTS[params.product], session, calls=0)
+
+    job_id = uuid.uuid4().hex
+    try:
+        size = await jobs.save_input(job_id, request.stream())
+    except ValueError as e:
+        jobs.remove_files(job_id)
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except BaseException:
+        jobs.remove_files(job_id)
+        raise
+    if size == 0:
+        jobs.remove_files(job_id)
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No telephone numbers given")
+
+    job = await jobs.create_job(session, job_id, userinfo, params.product)
+    await jobs.enqueue(src.databases.redis_cache.redis_client, jobs.split_task(job_id))
+    return JobSchema.model_validate(job)
+
+# Endpoint to list the user's jobs -----------------------------------------------------------------
+@router.get("/", summary="List lookup jobs")
+async def get_jobs(
+    uid: int = Depends(deps.require_user()),
+    session: AsyncSession = Depends(get_async_session)
+) -> list[JobSchema]:
+    return [JobSchema.model_validate(job) for job in await jobs.get_jobs(session, uid)]
+
+# Endpoint to get the status and progress of a job ----------------------------------------------------
+@router.get("/{job_id}", summary="Get a lookup job")
+async def get_job(
+    job_id: str,
+    uid: int = Depends(deps.require_user()),
+    session: AsyncSession = Depends(get_async_session)
+) -> JobSchema:
+    return JobSchema.model_validate(await get_user_job(session, job_id, uid))
+
+# Endpoint to download the result of a finished job -----------------------------------------------------
+@router.get("/{job_id}/result", summary="Download the result of a lookup job")
+async def get_job_result(
+    job_id: str,
+    uid: int = Depends(deps.require_user()),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Streams the result as gzipped CSV: a header row, then one row per valid input TN
+    in input order, with the input TN (and cn) followed by the product's fields.
+    """
+    job = await get_user_job(session, job_id, uid)
+    if job.status != "done":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+    return StreamingResponse(
+        jobs.read_result(job),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{job.product}-{job.id}.csv.gz"'}
+    )
+
+# Endpoint to cancel a job and delete its files ----------------------------------------------------------
+@router.delete("/{job_id}", summary="Cancel or delete a lookup job")
+async def delete_job(
+    job_id: str,
+    uid: int = Depends(deps.require_user()),
+    session: AsyncSession = Depends(get_async_session)
+) -> JobSchema:
+    job = await get_user_job(session, job_id, uid)
+    if job.status in jobs.UNFINISHED:
+        job = await jobs.cancel_job(session, job_id) or await jobs.get_job(session, job_id)
+    jobs.remove_files(job_id)
+    if job.status == "done":
+        job = await jobs.delete_job(session, job_id)
+    return JobSchema.model_validate(job)
+
+#-----------------------------------------------------------------------------------------------------
+# Helper functions
+#-----------------------------------------------------------------------------------------------------
+async def get_user_job(session, job_id: str, uid: int):
+    job = await jobs.get_job(session, job_id, userid=uid)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
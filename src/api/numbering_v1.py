@@ -1,38 +1,81 @@
 
-import requests
-from fastapi import APIRouter, Depends, Query, Response
+import os
+import json
+import asyncio
+from fastapi import APIRouter, Depends, Query, Request, Response, HTTPException, status
 from src.utils.logger import billing_logger
 from src.api import deps
 
-from typing import Annotated
+from typing import Annotated, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.databases.database_session import get_async_session
+from src.databases.database_session import get_async_session, fan_out
 
 from src.logic.numbering_v1    import get_Lerg6_by_NPANXX, get_NPANXX, get_Local
 from src.logic.numbering_v1    import get_LRN_Info, get_SPID_Name, get_Simple_Name, get_NNMP
+from src.logic.numbering_v1    import NormalizedTN, normalize_tn, normalize_tns, setPrefix
+from src.logic.numbering_v1    import get_LRN_Info_by_TN, get_FullData_by_Block, get_FullData_by_NPANXX
 from src.schemas.numbering_v1  import PhoneCodes_TypeParamsSchema, PhoneNumber_TypeParamsSchema, PhoneNumbers_TypeParamsSchema
 from src.schemas.numbering_v1  import FullDataSchema, FullDataCoSpecSchema, NNMPInfoSchema, LRNwithJurisdictionSchema
+from src.schemas.numbering_v1  import Bulk_TypeParamsSchema, is_valid_tn
+from src.logic.bulk            import BulkLookup, parse_bulk_line
 from src.schemas.auth.users    import UserEndpointSchema
 from src.databases.redis_cache import get_cache, set_cache
-
-TN_PREFIXES= ('1', '+1')
+from src.utils.responses import ResponseFormat, render_value, value_format, render_rows
+from src.utils.timing import span
+from src.utils.admission import ADMISSION_RETRY_AFTER
+from src.utils.deadline import DeadlineExceeded, current_deadline
 
 router = APIRouter()
 
+# Full data of TNs that are not ported comes from the precomputed fulldata_block table
+FULLDATA_BLOCKS = os.getenv("FULLDATA_BLOCKS", "true").lower() in ("1", "true", "yes")
+
+# TNs per /v1/bulk request
+BULK_MAX_TNS = int(os.getenv("BULK_MAX_TNS", 1000))
+
+# Single-TN endpoint of each bulk product: its access, rate, rate limit and billing apply per TN
+BULK_ENDPOINTS = {
+    "LRN": "get_lrn",
+    "OCN": "get_ocn",
+    "OCNName": "get_ocn_name",
+    "SPID": "get_spid",
+    "category": "get_category",
+    "NNMP": "get_nnmp",
+    "FullData": "get_full_data",
+    "FullDataCoSpec": "get_full_dataCoSpec",
+    "LRNjurisdiction": "get_lrn_jurisdiction",
+}
+
+# Request deadline and admission control of the DB-bound endpoints (CNAM can still answer from cache when overloaded)
+ADMITTED = [Depends(deps.request_deadline()), Depends(deps.require_admission())]
+ADMITTED_CACHE_ONLY = [Depends(deps.request_deadline()), Depends(deps.require_admission(cache_only=True))]
+
+# Response formats: raw fields and XML elements, in output order ---------------------------------
+LRN_JURISDICTION_FORMAT = ResponseFormat("LRNJurisdiction", ("lrn", "ocn", "lata", "jurisdiction", "state", "rc", "lec", "lecType"))
+FULL_DATA_COSPEC_FORMAT = ResponseFormat("fullDataCoSpec", ("tn", "lrn", "spid", "ocn", "ocn_name", "category", "co_spec_name",
+                                                             "spid_name", "co_spec_name_or_ocn_name"))
+FULL_DATA_FORMAT = ResponseFormat("FullData", ("tn", "lrn", "spid", "ocn", "ocn_name", "category", "spid_name"))
+NNMP_FORMAT = ResponseFormat("NNMPInfo", ("nnmp", "ocn", "ocn_name", "category"))
+LRN_FORMAT = value_format("LRN")
+OCN_FORMAT = value_format("OCN", json_key="ocn")
+OCN_NAME_FORMAT = value_format("OCNName", json_key="ocn_name")
+SPID_FORMAT = value_format("SPIDName", json_key="spid_name")
+CATEGORY_FORMAT = value_format("Category", json_key="category")
+
 # Endpoint to get call jurisdiction information ---------------------------------------------------
-@router.get("/jurisdiction/", summary="Get call jurisdiction information")
+@router.get("/jurisdiction/", summary="Get call jurisdiction information", dependencies=ADMITTED)
 async def get_jurisdiction(
     params: Annotated[PhoneCodes_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
     userinfo: UserEndpointSchema = Depends(deps.require_endpoint_access())
 ):
-    jurisdiction = await getJurisdiction(params.dialing_code, params.dial_code, session)
+    jurisdiction = await getJurisdiction(get_NPANXX(params.dialing_code), get_NPANXX(params.dial_code), session)
     billing_logger.log_event(userinfo, retvar=jurisdiction, dn=params.dialing_code, tn=params.dial_code)
     
     return return_by_type(params.type, "jurisdiction", jurisdiction)
     
 # Endpoint to get LRN and call jurisdiction information -------------------------------------------
-@router.get("/LRNjurisdiction/", summary="Get call jurisdiction and LRN information")
+@router.get("/LRNjurisdiction/", summary="Get call jurisdiction and LRN information", dependencies=ADMITTED)
 async def get_lrn_jurisdiction( 
     params: Annotated[PhoneNumbers_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
@@ -45,26 +88,19 @@ async def get_lrn_jurisdiction(
     If the LRN is not found, it will return an empty LRN.
     """
 
-    lrnjur = await procLRNjur(params, session)
-    jurisdiction = await getJurisdiction(params.cn, params.tn, session)
+    ntn = normalize_tn(params.tn)
+    lrnjur, jurisdiction = await fan_out(
+        session,
+        lambda s: procLRNjur(ntn, s),
+        lambda s: getJurisdiction(normalize_tn(params.cn).npanxx, ntn.npanxx, s),
+    )
     lrnjur.jurisdiction = jurisdiction
     billing_logger.log_event(userinfo, retvar=lrnjur, dn=params.cn, tn=params.tn)
 
-    if params.type == 'raw':
-        return f"{lrnjur.lrn}|{lrnjur.ocn}|{lrnjur.lata}|{lrnjur.jurisdiction}|{lrnjur.state}|{lrnjur.rc}|{lrnjur.lec}|{lrnjur.lecType}"
-    elif params.type == 'json':
-        return lrnjur
-    elif params.type == 'xml':
-        response = Response(
-            content=f"<LRNJurisdiction><lrn>{lrnjur.lrn}</lrn><ocn>{lrnjur.ocn}</ocn><lata>{lrnjur.lata}</lata><jurisdiction>{lrnjur.jurisdiction}</jurisdiction>" + 
-                    f"<state>{lrnjur.state}</state><rc>{lrnjur.rc}</rc><lec>{lrnjur.lec}</lec><lecType>{lrnjur.lecType}</lecType></LRNJurisdiction>",
-            media_type="application/xml"
-        )
-        return response
-    return lrnjur
+    return LRN_JURISDICTION_FORMAT.render(params.type, lrnjur)
 
 # Endpoint to get LRN by TN ----------------------------------------------------------------------
-@router.get("/LRN/", summary="Get LRN by TN") 
+@router.get("/LRN/", summary="Get LRN by TN", dependencies=ADMITTED) 
 async def get_lrn(params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
                   session: AsyncSession = Depends(get_async_session),
                   userinfo: UserEndpointSchema = Depends(deps.require_endpoint_access())
@@ -74,11 +110,17 @@ async def get_lrn(params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     The `tn` should be in E.164 format, or 10-digit number.
     If the LRN is not found, it will return an empty LRN.    
     """
-    prefix = getPrefix(params.tn)
-    lrn_record = await get_LRN_Info(params.tn, session)
+    ntn = normalize_tn(params.tn)
+    try:
+        lrn_record = await get_LRN_Info(ntn, session)
+    except DeadlineExceeded:
+        # Out of time: empty LRN flagged with X-Result-Status: timeout, the counted call is taken back
+        current_deadline().mark("timeout")
+        await deps.credit_calls(userinfo, 1)
+        return return_by_type(params.type, "LRN", "")
 
     if lrn_record is not None:
-        lrn_record.lrn = setPrefix(lrn_record.lrn, prefix)
+        lrn_record.lrn = setPrefix(lrn_record.lrn, ntn.prefix)
         billing_logger.log_event(userinfo, retvar=lrn_record.lrn, tn=params.tn)
         return return_by_type(params.type, "LRN", lrn_record.lrn)
      
@@ -86,7 +128,7 @@ async def get_lrn(params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     return return_by_type(params.type, "LRN", "")
 
 # Endpoint to get Full Data with CoSpec by TN ------------------------------------------------------
-@router.get("/FullDataCoSpec/", summary="Get All available portability data with CoSpec")
+@router.get("/FullDataCoSpec/", summary="Get All available portability data with CoSpec", dependencies=ADMITTED)
 async def get_full_dataCoSpec(
     params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
@@ -96,33 +138,15 @@ async def get_full_dataCoSpec(
     Endpoint to retrieve major data for a given telephone number (TN).
     The `tn` should be in E.164 format, or 10-digit number.
     """
-    fullDataCoSpec = await procFullDataCoSpec(params, session)
-
-    if fullDataCoSpec.co_spec_name == "USE VARIES BY COMPANY":
-        fullDataCoSpec.co_spec_name_or_ocn_name = fullDataCoSpec.ocn_name
-    else:
-        if len(fullDataCoSpec.co_spec_name) > 3:
-            fullDataCoSpec.co_spec_name_or_ocn_name = fullDataCoSpec.co_spec_name
-        else:
-            fullDataCoSpec.co_spec_name_or_ocn_name = fullDataCoSpec.ocn_name
+    fullDataCoSpec = await procFullDataCoSpec(normalize_tn(params.tn), session)
+    setCoSpecNameOrOcnName(fullDataCoSpec)
 
     billing_logger.log_event(userinfo, retvar=fullDataCoSpec, tn=params.tn)
 
-    if params.type == 'raw':
-        return f"{fullDataCoSpec.tn}|{fullDataCoSpec.lrn}|{fullDataCoSpec.spid}|{fullDataCoSpec.ocn}|{fullDataCoSpec.ocn_name}|{fullDataCoSpec.category}|{fullDataCoSpec.co_spec_name}|{fullDataCoSpec.spid_name}|{fullDataCoSpec.co_spec_name_or_ocn_name}"
-    elif params.type == 'json':
-        return fullDataCoSpec
-    elif params.type == 'xml':
-        response = Response(
-            content=f"<fullDataCoSpec><tn>{fullDataCoSpec.tn}</tn><lrn>{fullDataCoSpec.lrn}</lrn><spid>{fullDataCoSpec.spid}</spid><ocn>{fullDataCoSpec.ocn}</ocn><ocn_name>{fullDataCoSpec.ocn_name}</ocn_name>" + 
-                    f"<category>{fullDataCoSpec.category}</category><co_spec_name>{fullDataCoSpec.co_spec_name}</co_spec_name><spid_name>{fullDataCoSpec.spid_name}</spid_name>" +
-                    f"<co_spec_name_or_ocn_name>{fullDataCoSpec.co_spec_name_or_ocn_name}</co_spec_name_or_ocn_name></fullDataCoSpec>",
-            media_type="application/xml"
-        )
-        return response
+    return FULL_DATA_COSPEC_FORMAT.render(params.type, fullDataCoSpec)
         
 # Endpoint to get Full Data without CoSpec by TN ------------------------------------------------------
-@router.get("/FullData/", summary="Get portability Data")
+@router.get("/FullData/", summary="Get portability Data", dependencies=ADMITTED)
 async def get_full_data(   
     params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
@@ -133,27 +157,15 @@ async def get_full_data(
     The `tn` should be in E.164 format, or 10-digit number.
     """
 
-    fullDataCoSpec = await procFullDataCoSpec(params, session)
-
-    fields = {k: v for k, v in fullDataCoSpec.model_dump().items() if k in FullDataSchema.model_fields}
-    fullData = FullDataSchema(**fields)
+    fullDataCoSpec = await procFullDataCoSpec(normalize_tn(params.tn), session)
+    fullData = fullDataOf(fullDataCoSpec)
 
     billing_logger.log_event(userinfo, retvar=fullData,  tn=params.tn)
 
-    if params.type == 'raw':
-        return f"{fullData.tn}|{fullData.lrn}|{fullData.spid}|{fullData.ocn}|{fullData.ocn_name}|{fullData.category}|{fullData.spid_name}"
-    elif params.type == 'json':
-        return fullData
-    elif params.type == 'xml':
-        response = Response(
-            content=f"<FullData><tn>{fullData.tn}</tn><lrn>{fullData.lrn}</lrn><spid>{fullData.spid}</spid><ocn>{fullData.ocn}</ocn><ocn_name>{fullData.ocn_name}</ocn_name>" + 
-                    f"<category>{fullData.category}</category><spid_name>{fullData.spid_name}</spid_name></FullData>",
-            media_type="application/xml"
-        )
-        return response
+    return FULL_DATA_FORMAT.render(params.type, fullData)
 
 # Endpoint to get NNMP information by TN ----------------------------------------------------------    
-@router.get("/NNMP/", summary="Get NetNumber Messaging Probability by TN")
+@router.get("/NNMP/", summary="Get NetNumber Messaging Probability by TN", dependencies=ADMITTED)
 async def get_nnmp(
     params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
@@ -164,33 +176,18 @@ async def get_nnmp(
     The `tn` should be in E.164 format, or 10-digit number.
     """
     nnmp = 0
-    fullDataCoSpec = await procFullDataCoSpec(params, session)
+    fullDataCoSpec = await procFullDataCoSpec(normalize_tn(params.tn), session)
     if fullDataCoSpec.category == "CLEC":
         nnmp = await get_NNMP(fullDataCoSpec.co_spec_name, session)
 
-    nnmpData = NNMPInfoSchema(
-        nnmp = nnmp,
-        ocn = fullDataCoSpec.ocn,
-        ocn_name = fullDataCoSpec.ocn_name,
-        category = fullDataCoSpec.category
-    )
+    nnmpData = nnmpInfoOf(fullDataCoSpec, nnmp)
 
     billing_logger.log_event(userinfo, retvar=nnmpData, tn=params.tn)
 
-    if params.type == 'raw':
-        return f"{nnmpData.nnmp}|{nnmpData.ocn}|{nnmpData.ocn_name}|{nnmpData.category}"
-    elif params.type == 'json':
-        return nnmpData
-    elif params.type == 'xml':
-        response = Response(
-            content=f"<NNMPInfo><nnmp>{nnmpData.nnmp}</nnmp><ocn>{nnmpData.ocn}</ocn><ocn_name>{nnmpData.ocn_name}</ocn_name>" + 
-                    f"<category>{nnmpData.category}</category></NNMPInfo>",
-            media_type="application/xml"
-        )
-        return response
+    return NNMP_FORMAT.render(params.type, nnmpData)
     
 # Endpoint to get Operating Company Number (OCN) by TN -------------------------------------------   
-@router.get("/OCN/", summary="Get Operating Company Number by TN")    
+@router.get("/OCN/", summary="Get Operating Company Number by TN", dependencies=ADMITTED)    
 async def get_ocn(
     params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
@@ -200,23 +197,14 @@ async def get_ocn(
     Endpoint to retrieve Operating Company Number (OCN) for a given telephone number (TN).
     The `tn` should be in E.164 format, or 10-digit number.
     """
-    fullDataCoSpec = await procFullDataCoSpec(params, session)
+    fullDataCoSpec = await procFullDataCoSpec(normalize_tn(params.tn), session)
 
     billing_logger.log_event(userinfo, retvar=fullDataCoSpec.ocn, tn=params.tn)
 
-    if params.type == 'raw':
-        return fullDataCoSpec.ocn
-    elif params.type == 'json':
-        return {"ocn": fullDataCoSpec.ocn}
-    elif params.type == 'xml':
-        response = Response(
-            content=f"<OCN>{fullDataCoSpec.ocn}</OCN>",
-            media_type="application/xml"
-        )
-        return response
+    return OCN_FORMAT.render(params.type, fullDataCoSpec.ocn)
     
 # Endpoint to get Operating Company Name (OCN Name) by TN --------------------------------------------
-@router.get("/OCNName/", summary="Get Operating Company Name by TN")
+@router.get("/OCNName/", summary="Get Operating Company Name by TN", dependencies=ADMITTED)
 async def get_ocn_name(
     params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session), 
@@ -226,23 +214,14 @@ async def get_ocn_name(
     Endpoint to retrieve Operating Company Name (OCN Name) for a given telephone number (TN).
     The `tn` should be in E.164 format, or 10-digit number.
     """
-    fullDataCoSpec = await procFullDataCoSpec(params, session)
+    fullDataCoSpec = await procFullDataCoSpec(normalize_tn(params.tn), session)
 
     billing_logger.log_event(userinfo, retvar=fullDataCoSpec.ocn_name,  tn=params.tn)
 
-    if params.type == 'raw':
-        return fullDataCoSpec.ocn_name
-    elif params.type == 'json':
-        return {"ocn_name": fullDataCoSpec.ocn_name}
-    elif params.type == 'xml':
-        response = Response(
-            content=f"<OCNName>{fullDataCoSpec.ocn_name}</OCNName>",
-            media_type="application/xml"
-        )
-        return response
+    return OCN_NAME_FORMAT.render(params.type, fullDataCoSpec.ocn_name)
     
 # Endpoint to get SPID Name by TN --------------------------------------------------------------------    
-@router.get("/SPID/", summary="Get SPID by TN")
+@router.get("/SPID/", summary="Get SPID by TN", dependencies=ADMITTED)
 async def get_spid(
     params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
@@ -252,25 +231,16 @@ async def get_spid(
     Endpoint to retrieve SPID for a given telephone number (TN).
     The `tn` should be in E.164 format, or 10-digit number.
     """
-    fullDataCoSpec = await procFullDataCoSpec(params, session)
+    fullDataCoSpec = await procFullDataCoSpec(normalize_tn(params.tn), session)
 
     spid = fullDataCoSpec.spid
 
     billing_logger.log_event(userinfo, retvar=spid, tn=params.tn)
 
-    if params.type == 'raw':
-        return spid
-    elif params.type == 'json':
-        return {"spid_name": spid}
-    elif params.type == 'xml':
-        response = Response(
-            content=f"<SPIDName>{spid}</SPIDName>",
-            media_type="application/xml"
-        )
-        return response
+    return SPID_FORMAT.render(params.type, spid)
 
 # Endpoint to get Category by TN --------------------------------------------------------------------    
-@router.get("/category/", summary="Get Category by TN")
+@router.get("/category/", summary="Get Category by TN", dependencies=ADMITTED)
 async def get_category(
     params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
@@ -280,24 +250,16 @@ async def get_category(
     Endpoint to retrieve Category for a given telephone number (TN).
     The `tn` should be in E.164 format, or 10-digit number.
     """
-    fullDataCoSpec = await procFullDataCoSpec(params, session)
+    fullDataCoSpec = await procFullDataCoSpec(normalize_tn(params.tn), session)
 
     billing_logger.log_event(userinfo, retvar=fullDataCoSpec.category,  tn=params.tn)
 
-    if params.type == 'raw':
-        return fullDataCoSpec.category
-    elif params.type == 'json':
-        return {"category": fullDataCoSpec.category}
-    elif params.type == 'xml':
-        response = Response(
-            content=f"<Category>{fullDataCoSpec.category}</Category>",
-            media_type="application/xml"
-        )
-        return response
+    return CATEGORY_FORMAT.render(params.type, fullDataCoSpec.category)
 
 # Endpoint to get CNAM by TN --------------------------------------------------------------------
-@router.get("/CNAM/", summary="Get CNAM by TN")
+@router.get("/CNAM/", summary="Get CNAM by TN", dependencies=ADMITTED_CACHE_ONLY)
 async def get_cnam(
+    request: Request,
     params: Annotated[PhoneNumber_TypeParamsSchema, Query()],
     session: AsyncSession = Depends(get_async_session),
     userinfo: UserEndpointSchema = Depends(deps.require_endpoint_access())
@@ -314,8 +276,17 @@ async def get_cnam(
     if cached_cnam:
         cnam = cached_cnam
         lookup_type = "cache"
+    elif request.state.cache_only:
+        # Overloaded: no vendor call on a cache miss
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service overloaded, CNAM not cached",
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)}
+        )
     else:
-        cnam = getCNAMFull(params.tn)
+        # Blocking vendor client, run off the event loop
+        with span("cnam.vendor"):
+            cnam = await asyncio.to_thread(getCNAMFull, params.tn)
         await set_cache(cache_key, cnam, expire=604800)  # Cache for 7 days
         lookup_type = "vendor"
 
@@ -323,29 +294,63 @@ async def get_cnam(
 
     return return_by_type(params.type, "CNAM", cnam)
 
+# Endpoint to run one lookup over many TNs ------------------------------------------------------
+@router.post("/bulk/", summary="Run a lookup over many TNs", dependencies=ADMITTED)
+async def get_bulk(
+    request: Request,
+    params: Annotated[Bulk_TypeParamsSchema, Query()],
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Endpoint to run the `product` lookup (LRN, OCN, OCNName, SPID, category, NNMP, FullData,
+    FullDataCoSpec or LRNjurisdiction) over up to BULK_MAX_TNS telephone numbers.
+    The body is a JSON array of TNs (or {"tns": [...]}), or text/CSV with one TN per line;
+    LRNjurisdiction takes tn,cn pairs ([tn, cn] or {"tn": ..., "cn": ...} in JSON).
+    Each row is byte-identical to the /v1/<product> response for that TN: a JSON array of them,
+    one per line for raw, or wrapped in <Bulk> for xml. Every TN is billed as one call of the product,
+    logged as a single batch billing record.
+    """
+    with_cn = params.product == "LRNjurisdiction"
+    items = parseBulkInput(request.headers.get("content-type", ""), await request.body(), with_cn)
+    if not items:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No telephone numbers given")
+    if len(items) > BULK_MAX_TNS:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"At most {BULK_MAX_TNS} telephone numbers per request")
+    invalid = [i for i, (tn, cn) in enumerate(items) if not is_valid_tn(tn) or (with_cn and not is_valid_tn(cn))]
+    if invalid:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail={"msg": "Invalid telephone numbers", "rows": invalid[:100]})
+
+    userinfo = await deps.endpoint_access(request, BULK_ENDPOINTS[params.product], session, calls=len(items))
+
+    tns = [tn for tn, _ in items]
+    cns = normalize_tns(cn for _, cn in items) if with_cn else None
+    rows, retvars = await procBulk(params.product, params.type, normalize_tns(tns), cns, session)
+
+    # One aggregated billing record for the TNs answered; the calls counted for the
+    # TNs left unanswered by the deadline are taken back
+    billed = [i for i, retvar in enumerate(retvars) if retvar is not None]
+    if billed:
+        await billing_logger.log_batch(userinfo, [tns[i] for i in billed], [retvars[i] for i in billed],
+                                       dns=[items[i][1] for i in billed] if with_cn else None)
+    if len(billed) < len(items):
+        await deps.credit_calls(userinfo, len(items) - len(billed))
+
+    return render_rows(params.type, "Bulk", rows)
+
 #-----------------------------------------------------------------------------------------------------
 # Helper functions
 #-----------------------------------------------------------------------------------------------------
-def return_by_type(type, field, data):
+def return_by_type(type, field, data) -> Response:
     """
     Helper function to return data based on the requested type.
     """
-    if type == 'raw':
-        return str(data)
-    elif type == 'json':
-        return {field: data}
-    elif type == 'xml':
-        return f"<{field}>{data}</{field}>"
-    else:
-        raise ValueError("Invalid type parameter. Must be 'raw', 'json', or 'xml'.")
+    return render_value(type, field, data)
 #-----------------------------------------------------------------------------------------------------    
-async def procFullDataCoSpec(params, session) -> FullDataCoSpecSchema:
-
-    npanxxx = get_NPANXX(params.tn)
-    onpanxxx = npanxxx
-
-    fullData = FullDataCoSpecSchema(
-        tn=params.tn,
+def newFullDataCoSpec(tn: str) -> FullDataCoSpecSchema:
+    return FullDataCoSpecSchema(
+        tn=tn,
         lrn="",
         spid="",
         ocn="",
@@ -358,40 +363,139 @@ async def procFullDataCoSpec(params, session) -> FullDataCoSpecSchema:
         ported_date="",
         osimplified_name=""
     )
-    prefix = getPrefix(params.tn)
-    lrn_record = await get_LRN_Info(params.tn, session)
+#-----------------------------------------------------------------------------------------------------    
+async def procFullDataCoSpec(ntn: NormalizedTN, session) -> FullDataCoSpecSchema:
+
+    fullData = newFullDataCoSpec(ntn.tn)
+    try:
+        await fillFullDataCoSpec(fullData, ntn, session)
+    except DeadlineExceeded:
+        # Out of time: return what was found so far, flagged as partial
+        current_deadline().mark("partial")
+
+    if fullData.osimplified_name == "":
+        fullData.osimplified_name = fullData.simplified_name
+
+    return fullData
+#-----------------------------------------------------------------------------------------------------    
+def setCoSpecNameOrOcnName(fullDataCoSpec: FullDataCoSpecSchema):
+    if fullDataCoSpec.co_spec_name == "USE VARIES BY COMPANY":
+        fullDataCoSpec.co_spec_name_or_ocn_name = fullDataCoSpec.ocn_name
+    else:
+        if len(fullDataCoSpec.co_spec_name) > 3:
+            fullDataCoSpec.co_spec_name_or_ocn_name = fullDataCoSpec.co_spec_name
+        else:
+            fullDataCoSpec.co_spec_name_or_ocn_name = fullDataCoSpec.ocn_name
+#-----------------------------------------------------------------------------------------------------    
+def fullDataOf(fullDataCoSpec: FullDataCoSpecSchema) -> FullDataSchema:
+    fields = {k: v for k, v in fullDataCoSpec.model_dump().items() if k in FullDataSchema.model_fields}
+    return FullDataSchema(**fields)
+#-----------------------------------------------------------------------------------------------------    
+def nnmpInfoOf(fullDataCoSpec: FullDataCoSpecSchema, nnmp: int) -> NNMPInfoSchema:
+    return NNMPInfoSchema(
+        nnmp = nnmp,
+        ocn = fullDataCoSpec.ocn,
+        ocn_name = fullDataCoSpec.ocn_name,
+        category = fullDataCoSpec.category
+    )
+#-----------------------------------------------------------------------------------------------------    
+async def fillFullDataCoSpec(fullData: FullDataCoSpecSchema, ntn: NormalizedTN, session):
+    if FULLDATA_BLOCKS and await fillFullDataCoSpecByBlock(fullData, ntn, session):
+        return
+    await fillFullDataCoSpecLive(fullData, ntn, session)
+#-----------------------------------------------------------------------------------------------------    
+async def fillFullDataCoSpecByBlock(fullData: FullDataCoSpecSchema, ntn: NormalizedTN, session) -> bool:
+    """
+    Lookup plan on the precomputed fulldata_block rows, each stage's lookups run concurrently:
+      1. tn2lrn row of the TN | pool block and NPANXX rows of the TN (all a non-ported TN needs)
+      2. ported only: NPANXX row of the LRN (if ported elsewhere) | SPID name
+    Returns False, with nothing filled in, when the TN's NPANXX has no rows (e.g. the table is not built).
+    """
+    tn2lrn, (block, nxx) = await fan_out(
+        session,
+        lambda s: get_LRN_Info_by_TN(ntn, s),
+        lambda s: get_FullData_by_Block(ntn, s),
+    )
+    if block is None and nxx is None:
+        return False
+
+    if tn2lrn is None:
+        row = block or nxx
+        if block is not None:
+            fullData.spid = block.spid
+            fullData.lrn = setPrefix(block.lrn, ntn.prefix)
+            fullData.ported_date = block.ported_date
+            fullData.spid_name = block.spid_name
+            fullData.osimplified_name = block.osimplified_name
+    else:
+        fullData.spid = tn2lrn.spid
+        fullData.lrn = setPrefix(tn2lrn.lrn, ntn.prefix)
+        fullData.ported_date = tn2lrn.activationtimestamp
+        npanxx = get_NPANXX(tn2lrn.lrn)
+        lookups = {}
+        if npanxx != ntn.npanxx:
+            lookups["row"] = lambda s: get_FullData_by_NPANXX(npanxx, s)
+        if fullData.spid:
+            lookups["spid_name"] = lambda s: get_SPID_Name(fullData.spid, s)
+        found = dict(zip(lookups, await fan_out(session, *lookups.values()))) if lookups else {}
+        row = found.get("row", nxx)
+        fullData.spid_name = found.get("spid_name", "")
+        if nxx is not None:
+            fullData.osimplified_name = nxx.simplified_name
+
+    if row is not None:
+        fullData.ocn = row.ocn
+        fullData.ocn_name = row.ocn_name
+        fullData.category = row.category
+        fullData.co_spec_name = row.co_spec_name
+        fullData.simplified_name = row.simplified_name
+    return True
+#-----------------------------------------------------------------------------------------------------    
+async def fillFullDataCoSpecLive(fullData: FullDataCoSpecSchema, ntn: NormalizedTN, session):
+    """
+    Lookup plan, each stage's lookups run concurrently (fan_out):
+      1. LRN of the TN | LERG6 of the TN's own NPANXX
+      2. LERG6 of the LRN's NPANXX (if ported elsewhere) | SPID name | simplified name of the original carrier
+      3. simplified name of the serving carrier
+    """
+    onpanxxx = ntn.npanxx
+
+    lrn_record, olerg6 = await fan_out(
+        session,
+        lambda s: get_LRN_Info(ntn, s),
+        lambda s: get_Lerg6_by_NPANXX(onpanxxx, s),
+    )
+
+    lerg6 = olerg6
+    lookups = {}
     if lrn_record is not None:
         npanxxx = get_NPANXX(lrn_record.lrn)
         fullData.spid = lrn_record.spid
-        fullData.lrn = setPrefix(lrn_record.lrn, prefix)
+        fullData.lrn = setPrefix(lrn_record.lrn, ntn.prefix)
         fullData.ported_date = lrn_record.activationtimestamp
-        olerg6 = await get_Lerg6_by_NPANXX(onpanxxx, session)
+        if npanxxx != onpanxxx:
+            lookups["lerg6"] = lambda s: get_Lerg6_by_NPANXX(npanxxx, s)
         if olerg6 is not None:
-            fullData.osimplified_name = await get_Simple_Name(olerg6.co_spec_name, session)
+            lookups["osimplified_name"] = lambda s: get_Simple_Name(olerg6.co_spec_name, s)
+    if fullData.spid:
+        lookups["spid_name"] = lambda s: get_SPID_Name(fullData.spid, s)
+
+    if lookups:
+        found = dict(zip(lookups, await fan_out(session, *lookups.values())))
+        lerg6 = found.pop("lerg6", lerg6)
+        for field, value in found.items():
+            setattr(fullData, field, value)
 
-    lerg6 = await get_Lerg6_by_NPANXX(npanxxx, session)
-    
     if lerg6 is not None:
         fullData.ocn = lerg6.ocn
         fullData.ocn_name = lerg6.ocnname
         fullData.category = lerg6.category
         fullData.co_spec_name = lerg6.co_spec_name
 
-    if fullData.spid:
-        fullData.spid_name = await get_SPID_Name(fullData.spid, session)
-
     fullData.simplified_name = await get_Simple_Name(fullData.co_spec_name, session)
-
-    if fullData.osimplified_name == "":
-        fullData.osimplified_name = fullData.simplified_name
-
-    return fullData
 #-----------------------------------------------------------------------------------------------------    
-async def procLRNjur(params, session) -> LRNwithJurisdictionSchema:
-
-    npanxxx = get_NPANXX(params.tn)
-
-    LRNJurData = LRNwithJurisdictionSchema(
+def newLRNjur() -> LRNwithJurisdictionSchema:
+    return LRNwithJurisdictionSchema(
         lrn="",
         ocn="",
         lata="",
@@ -401,13 +505,31 @@ async def procLRNjur(params, session) -> LRNwithJurisdictionSchema:
         lec="",
         lecType=""
     )
-    prefix = getPrefix(params.tn)
-    lrn_record = await get_LRN_Info(params.tn, session)
+#-----------------------------------------------------------------------------------------------------    
+async def procLRNjur(ntn: NormalizedTN, session) -> LRNwithJurisdictionSchema:
+
+    LRNJurData = newLRNjur()
+    try:
+        await fillLRNjur(LRNJurData, ntn, session)
+    except DeadlineExceeded:
+        # Out of time: return what was found so far, flagged as partial
+        current_deadline().mark("partial")
+
+    return LRNJurData
+#-----------------------------------------------------------------------------------------------------    
+async def fillLRNjur(LRNJurData: LRNwithJurisdictionSchema, ntn: NormalizedTN, session):
+
+    # LRN and the LERG6 row of the TN's own NPANXX at once; a second LERG6 lookup only if ported elsewhere
+    lrn_record, lerg6 = await fan_out(
+        session,
+        lambda s: get_LRN_Info(ntn, s),
+        lambda s: get_Lerg6_by_NPANXX(ntn.npanxx, s),
+    )
     if lrn_record is not None:
         npanxxx = get_NPANXX(lrn_record.lrn)
-        LRNJurData.lrn = setPrefix(lrn_record.lrn, prefix)
-
-    lerg6 = await get_Lerg6_by_NPANXX(npanxxx, session)
+        LRNJurData.lrn = setPrefix(lrn_record.lrn, ntn.prefix)
+        if npanxxx != ntn.npanxx:
+            lerg6 = await get_Lerg6_by_NPANXX(npanxxx, session)
 
     if lerg6 is not None:
         LRNJurData.ocn = lerg6.ocn
@@ -416,21 +538,31 @@ async def procLRNjur(params, session) -> LRNwithJurisdictionSchema:
         LRNJurData.rc = lerg6.rc
         LRNJurData.lec = lerg6.ocnname
         LRNJurData.lecType = lerg6.category
-
-    return LRNJurData
 #-----------------------------------------------------------------------------------------------------  
-async def getJurisdiction(dialing_code: str, dial_code: str, session: AsyncSession) -> str:
+async def getJurisdiction(from_npanxx: str, to_npanxx: str, session: AsyncSession) -> str:
     """
-    Get the jurisdiction for the given dialing code and dial code.
+    Get the jurisdiction between the calling (from) and called (to) NPANXX.
+    Out of time, it is "Unknown" and the result is flagged as partial.
     """
-    lerg6_from = await get_Lerg6_by_NPANXX(get_NPANXX(dialing_code), session)
-    
-    if lerg6_from is None:
-        return "Unknown"        
-    
-    lerg6_to   = await get_Lerg6_by_NPANXX(get_NPANXX(dial_code), session)
-    
-    if lerg6_to is None:
+    try:
+        return await findJurisdiction(from_npanxx, to_npanxx, session)
+    except DeadlineExceeded:
+        current_deadline().mark("partial")
+        return "Unknown"
+#-----------------------------------------------------------------------------------------------------  
+async def findJurisdiction(from_npanxx: str, to_npanxx: str, session: AsyncSession) -> str:
+
+    # both LERG6 rows are looked up at once
+    if from_npanxx == to_npanxx:
+        lerg6_from = lerg6_to = await get_Lerg6_by_NPANXX(from_npanxx, session)
+    else:
+        lerg6_from, lerg6_to = await fan_out(
+            session,
+            lambda s: get_Lerg6_by_NPANXX(from_npanxx, s),
+            lambda s: get_Lerg6_by_NPANXX(to_npanxx, s),
+        )
+
+    if lerg6_from is None or lerg6_to is None:
         return "Unknown"
     
     if (
@@ -448,28 +580,125 @@ async def getJurisdiction(dialing_code: str, dial_code: str, session: AsyncSessi
 
     return "Interstate"
 #-----------------------------------------------------------------------------------------------------  
-def getPrefix(tn: str) -> str:
+async def procBulk(product: str, type: str, ntns: list[NormalizedTN], cns, session) -> tuple[list[bytes], list]:
     """
-    Get the prefix for the TN based on the defined prefixes.
+    Resolves `product` for all TNs with the bulk engine and renders each row exactly as
+    the single-TN endpoint does. Returns the rows and the billing retvar of each TN (None: not
+    billed, the deadline left it unanswered; partly filled rows are billed like the single-TN ones).
     """
-    if tn.startswith(TN_PREFIXES):
-        for prefix in TN_PREFIXES:
-            if tn.startswith(prefix):
-                return prefix
-    return ""
-#----------------------------------------------------------------------------------------------------- 
-def setPrefix(tn: str, prefix: str) -> str:
+    engine = BulkLookup(ntns, session)
+
+    if product == "LRN":
+        try:
+            lrns = await engine.lrns()
+        except DeadlineExceeded:
+            # Out of time: empty LRNs flagged with X-Result-Status: timeout
+            current_deadline().mark("timeout")
+            return [LRN_FORMAT.body(type, "")] * len(ntns), [None] * len(ntns)
+        values = [setPrefix(lrn, ntn.prefix) if lrn is not None else "" for lrn, ntn in zip(lrns, ntns)]
+        return [LRN_FORMAT.body(type, value) for value in values], values
+
+    if product == "LRNjurisdiction":
+        rows = [newLRNjur() for _ in ntns]
+        try:
+            await engine.lrn_jurisdiction(rows, cns)
+        except DeadlineExceeded:
+            # the rows are filled once all lookups are done, so none was answered
+            current_deadline().mark("partial")
+            for row in rows:
+                row.jurisdiction = row.jurisdiction or "Unknown"
+            return [LRN_JURISDICTION_FORMAT.body(type, row) for row in rows], [None] * len(rows)
+        return [LRN_JURISDICTION_FORMAT.body(type, row) for row in rows], rows
+
+    rows = [newFullDataCoSpec(ntn.tn) for ntn in ntns]
+    live = list(range(len(ntns))) if not FULLDATA_BLOCKS else []
+    unanswered = set()
+    try:
+        if FULLDATA_BLOCKS:
+            live = await engine.full_data(rows)
+        # TNs without precomputed rows are resolved from the live tables, grouped as well
+        if live:
+            await engine.full_data_live(rows, live)
+    except DeadlineExceeded:
+        current_deadline().mark("partial")
+        unanswered = set(range(len(ntns))) - engine.filled
+    for row in rows:
+        if row.osimplified_name == "":
+            row.osimplified_name = row.simplified_name
+
+    def billed(retvars: list) -> list:
+        return [None if i in unanswered else retvar for i, retvar in enumerate(retvars)]
+
+    if product == "FullDataCoSpec":
+        for row in rows:
+            setCoSpecNameOrOcnName(row)
+        return [FULL_DATA_COSPEC_FORMAT.body(type, row) for row in rows], billed(rows)
+    if product == "FullData":
+        data = [fullDataOf(row) for row in rows]
+        return [FULL_DATA_FORMAT.body(type, row) for row in data], billed(data)
+    if product == "NNMP":
+        try:
+            nnmps = await engine.nnmps(rows)
+        except DeadlineExceeded:
+            # the NNMP of CLEC rows was not looked up
+            current_deadline().mark("partial")
+            nnmps = [0] * len(rows)
+            unanswered |= {i for i, row in enumerate(rows) if row.category == "CLEC"}
+        data = [nnmpInfoOf(row, nnmp) for row, nnmp in zip(rows, nnmps)]
+        return [NNMP_FORMAT.body(type, row) for row in data], billed(data)
+
+    fmt, field = {
+        "OCN": (OCN_FORMAT, "ocn"),
+        "OCNName": (OCN_NAME_FORMAT, "ocn_name"),
+        "SPID": (SPID_FORMAT, "spid"),
+        "category": (CATEGORY_FORMAT, "category"),
+    }[product]
+    values = [getattr(row, field) for row in rows]
+    return [fmt.body(type, value) for value in values], billed(values)
+#-----------------------------------------------------------------------------------------------------  
+def parseBulkInput(content_type: str, body: bytes, with_cn: bool) -> list[tuple[str, Optional[str]]]:
     """
-    Set the prefix for the TN if it is not already set.
+    Parses the TNs (and cns) of a bulk request: JSON, or text/CSV with one row per line
+    (cells separated by , ; | or tab, an optional header row is skipped).
     """
-    return prefix + tn
-#-----------------------------------------------------------------------------------------------------
+    items = []
+    try:
+        if "json" in content_type:
+            data = json.loads(body or b"[]")
+            if isinstance(data, dict):
+                data = data.get("tns", data.get("rows", []))
+            for item in data:
+                if isinstance(item, dict):
+                    items.append((str(item["tn"]), str(item["cn"]) if item.get("cn") is not None else None))
+                elif isinstance(item, (list, tuple)):
+                    items.append((str(item[0]), str(item[1]) if len(item) > 1 else None))
+                else:
+                    items.append((str(item), None))
+        else:
+            for n, line in enumerate(body.decode("utf-8-sig").splitlines()):
+                item = parse_bulk_line(line, first=n == 0)
+                if item is not None:
+                    items.append(item)
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Malformed bulk input: {e}")
+
+    if with_cn:
+        missing = [i for i, (_, cn) in enumerate(items) if cn is None]
+        if missing:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail={"msg": "LRNjurisdiction rows need a tn and a cn", "rows": missing[:100]})
+    else:
+        items = [(tn, None) for tn, _ in items]
+    return items
+#-----------------------------------------------------------------------------------------------------  
 def getCNAMFull (tn: str) -> str:
     """
     Get the full CNAM for the given TN.
     
     """
-    
+    # The vendor client is only loaded on the first CNAM miss
+    import requests
+
     try:
         url = f"http://cnam.infoserv.net:30035/{tn}"
         response = requests.get(url, timeout=3)
@@ -1,7 +1,7 @@
 import logging
 
 from fastapi import APIRouter, Depends, Query, Request, HTTPException, status
-from typing  import Annotated
+from typing  import Annotated, Optional
 from src.schemas.stats import DateRange
 from src.schemas.auth.users import UserInfoSchema
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -19,9 +19,11 @@ router = APIRouter()
 async def get_endpointstats(dates: Annotated[DateRange, Query(description="Date range for statistics")],
                     request: Request,
                     session: AsyncSession = Depends(get_async_session),
+                    tz: Optional[str] = Depends(deps.report_timezone()),
                     userinfo: UserInfoSchema = Depends(deps.require_info_access())):
     """
     Endpoint to get usage statistics for a given date range.
+    The range is read in the X-Timezone header's timezone when it is given.
     """
     userid = int(userinfo.uid) if userinfo.uid else None
     if userinfo.is_superuser:
@@ -32,7 +34,7 @@ async def get_endpointstats(dates: Annotated[DateRange, Query(description="Date
     if userid is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Valid User ID is required for statistics")
 
-    stats = await get_user_stats(userid, dates, session)
+    stats = await get_user_stats(userid, dates, session, tz=tz)
     access_logger(logger, userinfo.username, userinfo.ip_address, f"User requested statistics from {dates.start_date} to {dates.end_date}")
     if not stats:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No statistics found for the given date range")
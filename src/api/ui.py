@@ -3,13 +3,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.api import deps
 from src.databases.database_session import get_async_session
 from src.schemas.auth.users import UserInfoSchema
-from typing import Annotated
-from src.schemas.ui import RequestCustomerListSchema
+from typing import Annotated, Optional
+from src.schemas.ui import RequestCustomerListSchema, RequestHeavyHittersSchema
 from src.logic.users import get_users, create_user, update_user, get_user, delete_user
 from src.logic.products import get_product_list, get_product, create_product, update_productid, delete_productid
 from src.logic.endpoints import get_endpoint_list, get_endpoint, create_endpoint, update_endpointid, delete_endpointid
+from src.logic.apikeys import get_api_key_list, create_api_key, revoke_api_key
 from src.logic.statements import get_users_statinfo, get_statement, get_user_summaries, get_monthly_summaries,get_monthly_stats_pday,get_daily_stats_p5, get_latest_information
 from src.utils.logger import ui_logger
+from src.utils.heavyhitters import get_heavy_hitters
+
+import src.databases.redis_cache
 
 import json
 
@@ -278,6 +282,61 @@ async def delete_endpoint(
     ui_logger.log_event(userinfo, option="del_endpoint", data=deleted_endpoint)
     return deleted_endpoint
 
+# Endpoint to get API key list (hidden from public documentation) --------------------------------------------------------------------
+@router.get("/apikeys", summary="Get API key list", include_in_schema=False) 
+async def get_apikeys(params: Annotated[RequestCustomerListSchema, Query()],
+                      response: Response,
+                      session: AsyncSession = Depends(get_async_session),
+                      userinfo: UserInfoSchema = Depends(deps.require_info_access())):
+  
+    if not userinfo.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser access required")
+    
+    filter_dict = json.loads(params.filter) if params.filter else {}
+    sort_list = json.loads(params.sort) if params.sort else []
+    range_list = json.loads(params.range) if params.range else [0, 24]
+    range_from, range_to = range_list[0], range_list[1]
+
+    keyDict = await get_api_key_list(session,range_from=range_from, range_to=range_to, filter_dict=filter_dict, sort_list=sort_list)
+    total_count = keyDict["total"]
+
+    response.headers["Content-Range"] = f"apikeys {range_from}-{range_to}/{total_count}"
+    return keyDict["data"]
+
+# Endpoint to create a new API key; the key is only shown in this response (hidden from public documentation) -------------------------
+@router.post("/apikeys", summary="Create an API key", include_in_schema=False) 
+async def set_apikey(request: Request, 
+                     session: AsyncSession = Depends(get_async_session),
+                     userinfo: UserInfoSchema = Depends(deps.require_info_access())):
+  
+    if not userinfo.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser access required")
+    
+    # Parse JSON body
+    data = await request.json()
+    if not data.get("userid"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="userid is required")
+    
+    new_key = await create_api_key(session, data)
+    ui_logger.log_event(userinfo, option="new_apikey", data={k: v for k, v in new_key.items() if k != "api_key"}) 
+    return new_key
+
+# Endpoint to revoke an API key (hidden from public documentation) -----------------------------------------------------------------------
+@router.delete("/apikeys/{id}", summary="Revoke an API key", include_in_schema=False)
+async def delete_apikey(
+    id: int,
+    session: AsyncSession = Depends(get_async_session),
+    userinfo: UserInfoSchema = Depends(deps.require_info_access())
+):
+    if not userinfo.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser access required")
+        
+    revoked_key = await revoke_api_key(session, id)
+    if "error" in revoked_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=revoked_key["error"])
+    ui_logger.log_event(userinfo, option="del_apikey", data=revoked_key)
+    return revoked_key
+
 # Endpoint to get statement list (hidden from public documentation) --------------------------------------------------------------------
 @router.get("/statements", summary="Get statements", include_in_schema=False) 
 async def get_statements(params: Annotated[RequestCustomerListSchema, Query()],
@@ -357,6 +416,7 @@ async def get_monthly_stats(
 async def get_monthly_stats_per_day(params: Annotated[RequestCustomerListSchema, Query()],
                         response: Response,
                         session: AsyncSession = Depends(get_async_session),
+                        tz: Optional[str] = Depends(deps.report_timezone()),
                         userinfo: UserInfoSchema = Depends(deps.require_info_access())):
   
     if not userinfo.is_superuser:
@@ -367,7 +427,7 @@ async def get_monthly_stats_per_day(params: Annotated[RequestCustomerListSchema,
     range_list = json.loads(params.range) if params.range else [0, 50]
     range_from, range_to = range_list[0], range_list[1]
 
-    summaryDict = await get_monthly_stats_pday(session,range_from=range_from, range_to=range_to, filter_dict=filter_dict)
+    summaryDict = await get_monthly_stats_pday(session,range_from=range_from, range_to=range_to, filter_dict=filter_dict, tz=tz)
     total_count = summaryDict["total"]
 
     response.headers["Content-Range"] = f"monthlystatsperday {range_from}-{range_to}/{total_count}"
@@ -378,6 +438,7 @@ async def get_monthly_stats_per_day(params: Annotated[RequestCustomerListSchema,
 async def get_daily_stats_per_5min(params: Annotated[RequestCustomerListSchema, Query()],
                         response: Response,
                         session: AsyncSession = Depends(get_async_session),
+                        tz: Optional[str] = Depends(deps.report_timezone()),
                         userinfo: UserInfoSchema = Depends(deps.require_info_access())):
   
     if not userinfo.is_superuser:
@@ -388,7 +449,7 @@ async def get_daily_stats_per_5min(params: Annotated[RequestCustomerListSchema,
     range_list = json.loads(params.range) if params.range else [0, 300]
     range_from, range_to = range_list[0], range_list[1]
 
-    summaryDict = await get_daily_stats_p5(session,range_from=range_from, range_to=range_to, filter_dict=filter_dict)
+    summaryDict = await get_daily_stats_p5(session,range_from=range_from, range_to=range_to, filter_dict=filter_dict, tz=tz)
     total_count = summaryDict["total"]
 
     response.headers["Content-Range"] = f"dailystatsper5miny {range_from}-{range_to}/{total_count}"
@@ -398,15 +459,27 @@ async def get_daily_stats_per_5min(params: Annotated[RequestCustomerListSchema,
 @router.get("/latestinfo", summary="Get latest dip info", include_in_schema=False)
 async def get_latest_info(
                         session: AsyncSession = Depends(get_async_session),
+                        tz: Optional[str] = Depends(deps.report_timezone()),
                         userinfo: UserInfoSchema = Depends(deps.require_info_access())):
   
     if not userinfo.is_superuser:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser access required")
     
-    stats = await get_latest_information(session)
+    stats = await get_latest_information(session, tz=tz)
 
     return {
         "latest_dip": stats["latest_dip"],
         "daily_dips": stats["daily_dips"],
         "daily_amount": stats["daily_amount"]
-    }
\ No newline at end of file
+    }
+
+# Endpoint to get the heaviest TNs, NPANXXs or customers per endpoint (hidden from public documentation) ----------------------------------
+@router.get("/heavyhitters", summary="Get heavy hitters", include_in_schema=False)
+async def get_heavyhitters(params: Annotated[RequestHeavyHittersSchema, Query()],
+                           userinfo: UserInfoSchema = Depends(deps.require_info_access())):
+
+    if not userinfo.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser access required")
+
+    return await get_heavy_hitters(src.databases.redis_cache.redis_client, params.dimension,
+                                   endpoint=params.endpoint, windows=params.windows, limit=params.limit)
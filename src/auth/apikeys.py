@@ -0,0 +1,88 @@
+import time
+import asyncio
+import logging
+
+from typing import Optional
+from authx.schema import TokenPayload
+
+from src.databases.database_session import _NUMBERING_ASYNC_SESSIONMAKER
+from src.databases.invalidation import on_event, on_flush
+from src.logic.apikeys import get_active_api_keys, hash_api_key
+
+logger = logging.getLogger(__name__)
+
+API_KEY_HEADER = "X-API-Key"
+
+# sha256(key) -> principal carrying the same sub/uname/pid/ratio/pexp claims as an access token
+_keys: dict[str, TokenPayload] = {}
+_tasks: set = set()
+_expired: set[str] = set()     # users whose claims expired, reload pending
+
+# Function to build the principal of an API key -------------------------------------------------------------------
+def _principal(userid: int, username: str, productid: int, ratio: float, valid_secs, loaded: float) -> TokenPayload:
+    # iat is the load time, so a later UserChanged makes the claims stale like a token's;
+    # past pexp (the settings' validity window) the claims are re-read from the database
+    return TokenPayload(sub=str(userid), type="access", iat=loaded,
+                        uname=username, pid=productid, ratio=ratio, pexp=loaded + float(valid_secs))
+
+# Function to look up an API key in the worker's key map ---------------------------------------------------------
+def lookup_api_key(api_key: str) -> Optional[TokenPayload]:
+    principal = _keys.get(hash_api_key(api_key))
+    if principal is not None and principal.pexp <= time.time() and principal.sub not in _expired:
+        _expired.add(principal.sub)
+        _schedule_load(int(principal.sub))
+    return principal
+
+# Async function to (re)load the API keys of one user, or all of them ---------------------------------------------
+async def load_api_keys(userid: int = None):
+    """
+    Loads unrevoked keys of active users into the worker's map. Revocation and new keys
+    reach every worker through the ApiKeysChanged invalidation event.
+    """
+    try:
+        async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+            rows = await get_active_api_keys(session, userid)
+    except Exception as e:
+        logger.error(f"Failed to load API keys: {e}")
+        return
+
+    loaded = time.time()
+    keys = {row[0]: _principal(row[1], row[2], row[3], row[4], row[5], loaded) for row in rows}
+    if userid is None:
+        _keys.clear()
+        _expired.clear()
+    else:
+        _drop_user(userid)
+        _expired.discard(str(userid))
+    _keys.update(keys)
+    logger.info(f"Loaded {len(keys)} API keys" + ("" if userid is None else f" of user {userid}"))
+
+# Function to drop the keys of a user from the map ----------------------------------------------------------------
+def _drop_user(userid: int):
+    sub = str(userid)
+    for keyhash in [k for k, p in _keys.items() if p.sub == sub]:
+        del _keys[keyhash]
+
+# Function to schedule a reload from a (synchronous) invalidation handler ----------------------------------------
+def _schedule_load(userid: int = None):
+    try:
+        task = asyncio.get_running_loop().create_task(load_api_keys(userid))
+    except RuntimeError:
+        return
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+#-----------------------------------------------------------------------------------------------------
+# Invalidation handlers
+#-----------------------------------------------------------------------------------------------------
+def _api_keys_changed(event):
+    # Drop first so a revoked key stops working before the reload completes
+    _drop_user(event.uid)
+    _schedule_load(event.uid)
+
+def _user_changed(event):
+    _schedule_load(event.uid)
+
+on_event("api_keys_changed", _api_keys_changed)
+on_event("user_changed", _user_changed)
+on_flush(_schedule_load)
@@ -1,33 +1,39 @@
 from sqlalchemy import select, func, update
 from src.models.users import UserProfilesModel 
 from src.schemas.auth.users import UserLoginSchema
+from src.auth.passwords import hash_password, verify_password, needs_rehash
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Check user credentials in the database --------------------------------------------------------------
+# Check user credentials (hashing runs in the password thread pool, not on Postgres) -------------------
 async def check_credentials(creds: UserLoginSchema, session) -> UserProfilesModel:
-    user = await session.scalar(select(UserProfilesModel).where(UserProfilesModel.login == creds.login))
-    if user is not None:
-        password = await session.scalar(select(func.crypt(creds.password, user.password)))
+    user = await session.scalar(select(UserProfilesModel).where(UserProfilesModel.login == creds.login), stage="db.check_credentials")
+    if user is None:
+        return None
 
-        # Check if the user exists and the password is correct
-        user = await session.scalar(
-            select(UserProfilesModel).where(
-                UserProfilesModel.login == creds.login,
-                UserProfilesModel.password == password
-            )  
-        )
+    valid = await verify_password(creds.password, user.password)
+    if valid is None:
+        # Hash format we cannot verify here: let Postgres crypt() check it once, it is rehashed below
+        valid = await session.scalar(select(func.crypt(creds.password, user.password)), stage="db.check_credentials") == user.password
+    if not valid:
+        return None
+
+    # Transparently upgrade legacy crypt() hashes (and bcrypt hashes with other rounds)
+    if needs_rehash(user.password):
+        user.password = await hash_password(creds.password)
+        await session.commit()
+        logger.info(f"Rehashed password of user {user.id}")
     return user
 
 # Update user password --------------------------------------------------------------------------------
 async def update_user_password(login: str, new_password: str, session):
-    password_hash = await session.scalar(select(func.crypt(new_password, func.gen_salt('md5'))))
+    password_hash = await hash_password(new_password)
 
     state = await session.execute(
         update(UserProfilesModel)
         .where(UserProfilesModel.login == login)
-        .values(password=password_hash)
+        .values(password=password_hash), stage="db.update_user_password"
     )
     await session.commit()
     return state.rowcount > 0
\ No newline at end of file
@@ -0,0 +1,89 @@
+import os
+import asyncio
+import hashlib
+import hmac
+import bcrypt
+
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from src.configs.settings import get_settings
+
+BCRYPT_ROUNDS = get_settings().security.password_bcrypt_rounds
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+MD5_CRYPT_PREFIX = "$1$"
+_ITOA64 = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+# Hashing is CPU bound; a small pool keeps login bursts off the event loop and bounds their CPU use
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="passwords")
+
+# Function to compute an md5-crypt ($1$) hash, as produced by Postgres crypt(..., gen_salt('md5')) -----------
+def md5_crypt(password: bytes, salt: bytes) -> str:
+    salt = salt[:8]
+    ctx = hashlib.md5(password + MD5_CRYPT_PREFIX.encode() + salt)
+    alt = hashlib.md5(password + salt + password).digest()
+    for i in range(len(password), 0, -16):
+        ctx.update(alt[:min(16, i)])
+    i = len(password)
+    while i:
+        ctx.update(b"\x00" if i & 1 else password[:1])
+        i >>= 1
+    final = ctx.digest()
+
+    for i in range(1000):
+        ctx = hashlib.md5(password if i & 1 else final)
+        if i % 3:
+            ctx.update(salt)
+        if i % 7:
+            ctx.update(password)
+        ctx.update(final if i & 1 else password)
+        final = ctx.digest()
+
+    encoded = []
+    for a, b, c in ((0, 6, 12), (1, 7, 13), (2, 8, 14), (3, 9, 15), (4, 10, 5)):
+        value = final[a] << 16 | final[b] << 8 | final[c]
+        for _ in range(4):
+            encoded.append(_ITOA64[value & 0x3f])
+            value >>= 6
+    value = final[11]
+    for _ in range(2):
+        encoded.append(_ITOA64[value & 0x3f])
+        value >>= 6
+    return f"{MD5_CRYPT_PREFIX}{salt.decode()}${''.join(encoded)}"
+
+# Function to hash a password with bcrypt (blocking) ----------------------------------------------------------
+def hash_password_sync(password: str) -> str:
+    # bcrypt only uses the first 72 bytes of a password
+    return bcrypt.hashpw(password.encode()[:72], bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+# Function to verify a password against a bcrypt or legacy md5-crypt hash (blocking) -------------------------
+def verify_password_sync(password: str, password_hash: str) -> Optional[bool]:
+    """
+    Returns True/False, or None if the hash format is not one we can verify here.
+    """
+    if not password_hash:
+        return False
+    if password_hash.startswith(BCRYPT_PREFIXES):
+        return bcrypt.checkpw(password.encode()[:72], password_hash.encode())
+    if password_hash.startswith(MD5_CRYPT_PREFIX):
+        salt = password_hash[len(MD5_CRYPT_PREFIX):].split("$", 1)[0]
+        return hmac.compare_digest(md5_crypt(password.encode(), salt.encode()), password_hash)
+    return None
+
+# Function to tell whether a stored hash should be replaced by a current bcrypt hash -------------------------
+def needs_rehash(password_hash: str) -> bool:
+    if not password_hash.startswith(BCRYPT_PREFIXES):
+        return True
+    try:
+        return int(password_hash.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+# Async function to hash a password in the password thread pool --------------------------------------------
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password_sync, password)
+
+# Async function to verify a password in the password thread pool ------------------------------------------
+async def verify_password(password: str, password_hash: str) -> Optional[bool]:
+    return await asyncio.get_running_loop().run_in_executor(_executor, verify_password_sync, password, password_hash)
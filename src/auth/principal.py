@@ -0,0 +1,165 @@
+import os
+import time
+import hashlib
+import logging
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Request, HTTPException, status
+from fastapi.security.utils import get_authorization_scheme_param
+from authx.schema import RequestToken, TokenPayload
+from authx.exceptions import AuthXException, MissingTokenError, RevokedTokenError
+
+from src.auth.jwt import security, config
+from src.auth.apikeys import API_KEY_HEADER, lookup_api_key
+from src.databases.invalidation import on_event, on_flush
+
+logger = logging.getLogger(__name__)
+
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", 10000))
+RATE_CACHE_TTL = int(os.getenv("RATE_CACHE_TTL", 60))
+
+# sha256(token) -> (payload, expiry timestamp), least recently used first
+_token_cache: "OrderedDict[bytes, tuple[TokenPayload, float]]" = OrderedDict()
+
+# (productid, endpoint) -> ((endpointid, rate, ratelimit, burst), cache expiry timestamp)
+_rate_cache: dict[tuple[int, str], tuple[tuple, float]] = {}
+
+# Claims issued before these timestamps are stale and must be re-read from the database
+_user_changed_at: dict[int, float] = {}
+_claims_valid_after: float = 0.0
+
+# Function to convert a datetime or epoch claim to a timestamp --------------------------------------
+def _timestamp(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+# Function to extract the access token from the cookie or the Authorization header -----------------
+def extract_token(request: Request) -> Optional[str]:
+    token = request.cookies.get(config.JWT_ACCESS_COOKIE_NAME)
+    if token:
+        return token
+
+    auth_header = request.headers.get("Authorization")
+    if auth_header:
+        scheme, token = get_authorization_scheme_param(auth_header)
+        if token == '':
+            token, x = get_authorization_scheme_param(auth_header)
+    return token or None
+
+# Function to verify an access token, reusing earlier verifications of the same token --------------
+def verify_access_token(token: str) -> TokenPayload:
+    """
+    Verifies an access token. Verified payloads are kept in a bounded LRU keyed by the
+    token hash until the token's own `exp`, so repeat callers skip signature verification.
+
+    Raises:
+        AuthXException: the same errors `security.access_token_required` raises.
+    """
+    if security.is_token_in_blocklist(token):
+        raise RevokedTokenError("Token has been revoked")
+
+    key = hashlib.sha256(token.encode()).digest()
+    entry = _token_cache.get(key)
+    if entry is not None:
+        payload, expires = entry
+        if expires > time.time():
+            _token_cache.move_to_end(key)
+            return payload
+        del _token_cache[key]
+
+    payload = security.verify_token(
+        RequestToken(token=token, type="access", location="headers"),
+        verify_csrf=False
+    )
+
+    expires = _timestamp(payload.exp)
+    if expires is not None and JWT_CACHE_SIZE > 0:
+        _token_cache[key] = (payload, expires)
+        if len(_token_cache) > JWT_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return payload
+
+# Function to authenticate a request once and share the principal on request.state ----------------
+def resolve_principal(request: Request) -> Optional[TokenPayload]:
+    """
+    Returns the verified token payload of the request, or None if it is not authenticated.
+    An X-API-Key header takes precedence over the token and resolves with a dictionary lookup.
+    The result (and the authentication error, if any) is stored on request.state, which
+    the middleware, the dependencies and the endpoints share.
+    """
+    state = request.state
+    if hasattr(state, "principal"):
+        return state.principal
+
+    state.principal = None
+    state.auth_error = None
+    state.auth_method = "jwt"
+
+    api_key = request.headers.get(API_KEY_HEADER)
+    if api_key:
+        state.auth_method = "api_key"
+        state.principal = lookup_api_key(api_key)
+        if state.principal is None:
+            state.auth_error = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+        return state.principal
+
+    token = extract_token(request)
+    if token is None:
+        state.auth_error = MissingTokenError("Missing JWT in request")
+        return None
+    try:
+        state.principal = verify_access_token(token)
+    except AuthXException as e:
+        state.auth_error = e
+    return state.principal
+
+# Function to tell whether the product claims of a token can still be trusted ----------------------
+def claims_are_current(payload: TokenPayload, uid: int) -> bool:
+    if getattr(payload, "pid", None) is None:
+        return False
+    valid_until = getattr(payload, "pexp", None)
+    if valid_until is None or valid_until <= time.time():
+        return False   # the user's settings may have changed product since the claims were issued
+    issued = _timestamp(payload.iat) or 0.0
+    return issued > _claims_valid_after and issued > _user_changed_at.get(uid, 0.0)
+
+# Function to get a cached (endpointid, rate, ratelimit, burst) of a product -----------------------
+def get_cached_rate(productid: int, endpoint: str) -> Optional[tuple]:
+    entry = _rate_cache.get((productid, endpoint))
+    if entry is None or entry[1] <= time.time():
+        return None
+    return entry[0]
+
+# Function to cache the (endpointid, rate, ratelimit, burst) of a product --------------------------
+def set_cached_rate(productid: int, endpoint: str, rate: tuple):
+    _rate_cache[(productid, endpoint)] = (rate, time.time() + RATE_CACHE_TTL)
+
+#-----------------------------------------------------------------------------------------------------
+# Invalidation handlers
+#-----------------------------------------------------------------------------------------------------
+def _rates_changed(event):
+    if event.productid is None:
+        _rate_cache.clear()
+        return
+    for key in [k for k in _rate_cache if k[0] == event.productid]:
+        del _rate_cache[key]
+
+def _user_changed(event):
+    _user_changed_at[event.uid] = time.time()
+
+def _flush():
+    global _claims_valid_after
+    _token_cache.clear()
+    _rate_cache.clear()
+    _user_changed_at.clear()
+    _claims_valid_after = time.time()
+
+on_event("rates_changed", _rates_changed)
+on_event("user_changed", _user_changed)
+on_flush(_flush)
@@ -0,0 +1,75 @@
+import os
+import logging
+import multiprocessing
+
+from importlib.util import find_spec
+
+# Serving mode: "cores" runs one async worker per core, "legacy" the former 2 x cores
+SERVING_MODE = os.getenv("SERVING_MODE", "cores").lower()
+
+logger = logging.getLogger(__name__)
+
+# Postgres connections (pool_size + max_overflow) allowed for all workers of this host
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", 100))
+
+# Part of the budget taken by the lookup job workers of this host (0: they run on other hosts)
+JOBS_CONNECTION_BUDGET = int(os.getenv("JOBS_CONNECTION_BUDGET", 0))
+
+# Connections a worker needs at least: its request's session and one fan-out lookup
+MIN_WORKER_CONNECTIONS = 2
+
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", 20000))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", MAX_REQUESTS // 10))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", 60))
+KEEPALIVE = int(os.getenv("KEEPALIVE", 5))
+
+# Function to get the number of gunicorn workers ------------------------------------------------
+def number_of_workers() -> int:
+    """
+    FASTAPIWORKERS wins; otherwise one worker per core (async workers are not blocked by
+    I/O, so more workers than cores only add pools and context switches), or 2 x cores
+    with SERVING_MODE=legacy.
+    """
+    workers = os.getenv("FASTAPIWORKERS")
+    if workers:
+        workers = max(1, int(workers))
+    else:
+        cores = multiprocessing.cpu_count()
+        workers = cores * 2 if SERVING_MODE == "legacy" else cores
+    return cap_workers(workers, api_connection_budget())
+
+# Functions to get the connection budgets of the API workers and of the job workers of this host ----------
+def api_connection_budget() -> int:
+    return max(1, DB_CONNECTION_BUDGET - JOBS_CONNECTION_BUDGET)
+
+def jobs_connection_budget() -> int:
+    return JOBS_CONNECTION_BUDGET or DB_CONNECTION_BUDGET
+
+# Function to cap a number of worker processes so each gets its minimum share of a budget -------------------
+def cap_workers(workers: int, budget: int) -> int:
+    cap = max(1, budget // MIN_WORKER_CONNECTIONS)
+    if workers > cap:
+        logger.warning(f"{workers} workers exceed the budget of {budget} DB connections, running {cap}")
+        return cap
+    return workers
+
+# Function to split the DB connection budget into the pool of one worker -------------------------
+def pool_limits(workers: int, budget: int = None) -> tuple[int, int]:
+    """
+    Returns (pool_size, max_overflow) of one worker so that all workers together stay
+    within `budget` connections (default: the API workers' budget); a third is kept
+    open, the rest is overflow. DB_POOL_SIZE / DB_MAX_OVERFLOW override the split.
+    """
+    budget = api_connection_budget() if budget is None else budget
+    per_worker = max(1, budget // max(1, workers))
+    pool_size = max(1, per_worker // 3)
+    max_overflow = per_worker - pool_size
+    return (int(os.getenv("DB_POOL_SIZE", pool_size)), int(os.getenv("DB_MAX_OVERFLOW", max_overflow)))
+
+# Function to pick the event loop and HTTP parser of the uvicorn workers --------------------------
+def uvicorn_loop() -> str:
+    return os.getenv("UVICORN_LOOP") or ("uvloop" if find_spec("uvloop") else "asyncio")
+
+def uvicorn_http() -> str:
+    return os.getenv("UVICORN_HTTP") or ("httptools" if find_spec("httptools") else "h11")
@@ -90,5 +90,3 @@ def logging_config(log_level: str) -> None:
         },
     }
     logging.config.dictConfig(conf)
-
-logging_config(log_level=get_settings().log_level)
\ No newline at end of file
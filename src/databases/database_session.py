@@ -7,24 +7,68 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from src.configs.settings import get_settings
-from typing import AsyncGenerator
+from src.configs.serving import number_of_workers, pool_limits
+from src.utils.timing import TimedAsyncSession
+from src.utils.queryprofiler import install_query_profiler
+from typing import AsyncGenerator, Awaitable, Callable
+import asyncio
+import os
+
+# Session timezone of every pooled connection, applied once at connect time
+PG_TIMEZONE = os.getenv("PG_TIMEZONE", "UTC")
+
+# Independent lookups of a request run concurrently on idle pooled connections
+LOOKUP_FANOUT = os.getenv("LOOKUP_FANOUT", "true").lower() in ("1", "true", "yes")
+
+# Pool of this worker: its share of the host's DB_CONNECTION_BUDGET (job workers: see src.workers.jobs)
+POOL_SIZE, MAX_OVERFLOW = pool_limits(number_of_workers())
 
 def numbering_async_engine(uri: URL) -> AsyncEngine:
     return create_async_engine(
         uri,
         pool_pre_ping=True,
-        pool_size= 5,
-        max_overflow= 10,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
         pool_timeout=30.0,
-        pool_recycle=600
+        pool_recycle=600,
+        connect_args={"server_settings": {"timezone": PG_TIMEZONE}}
     )
 
 _NUMBERING_ASYNC_ENGINE = numbering_async_engine(get_settings().sqlalchemy_database_uri)
-_NUMBERING_ASYNC_SESSIONMAKER = async_sessionmaker(_NUMBERING_ASYNC_ENGINE, expire_on_commit=False)
+install_query_profiler(_NUMBERING_ASYNC_ENGINE)
+_NUMBERING_ASYNC_SESSIONMAKER = async_sessionmaker(_NUMBERING_ASYNC_ENGINE, class_=TimedAsyncSession, expire_on_commit=False)
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
         yield session
 
+# Async function to run independent lookups concurrently -------------------------------------------
+async def fan_out(session: AsyncSession, *lookups: Callable[[AsyncSession], Awaitable]) -> list:
+    """
+    Runs `lookups` (each a function of a session) at the same time and returns their
+    results in order. The first one uses the request's session, the others each get a
+    session of their own, one per idle pooled connection; when the pool has no idle
+    connection left the rest run after the first on the request's session, so a busy
+    worker never opens extra connections for it. If one lookup fails (e.g. DeadlineExceeded)
+    the others are cancelled, returning their connections at once, and its error is raised.
+    """
+    spare = min(len(lookups) - 1, _NUMBERING_ASYNC_ENGINE.pool.checkedin()) if LOOKUP_FANOUT else 0
+    if spare <= 0:
+        return [await lookup(session) for lookup in lookups]
+
+    async def on_own_session(lookup):
+        async with _NUMBERING_ASYNC_SESSIONMAKER(info={"fan_out": True}) as own:
+            return await lookup(own)
 
+    async def on_request_session(batch):
+        return [await lookup(session) for lookup in batch]
 
+    shared = (lookups[0],) + lookups[1 + spare:]
+    try:
+        async with asyncio.TaskGroup() as group:
+            shared_task = group.create_task(on_request_session(shared))
+            own_tasks = [group.create_task(on_own_session(lookup)) for lookup in lookups[1:1 + spare]]
+    except BaseExceptionGroup as e:
+        raise e.exceptions[0]
+    shared_results = shared_task.result()
+    return [shared_results[0]] + [task.result() for task in own_tasks] + shared_results[1:]
@@ -0,0 +1,161 @@
+import os
+import asyncio
+import logging
+
+from typing import Annotated, Callable, Literal, Optional, Union
+from pydantic import BaseModel, Field, TypeAdapter
+
+import src.databases.redis_cache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "invalidation"
+RESUBSCRIBE_DELAY = 5
+
+#-----------------------------------------------------------------------------------------------------
+# Typed invalidation messages
+#-----------------------------------------------------------------------------------------------------
+# Rates of a product changed (productid None means every product, e.g. an endpoint was renamed) ---------
+class RatesChanged(BaseModel):
+    kind: Literal["rates_changed"] = "rates_changed"
+    productid: Optional[int] = None
+
+# User profile or user settings changed ----------------------------------------------------------------
+class UserChanged(BaseModel):
+    kind: Literal["user_changed"] = "user_changed"
+    uid: int
+
+# LERG6 (and the reference tables derived with it) reloaded ---------------------------------------------
+class Lerg6Reloaded(BaseModel):
+    kind: Literal["lerg6_reloaded"] = "lerg6_reloaded"
+    version: str
+    tables: list[str] = ["lerg6"]
+
+# A ported TN (tn2lrnNPA row) was added, modified or deleted --------------------------------------------
+class TnChanged(BaseModel):
+    kind: Literal["tn_changed"] = "tn_changed"
+    tn: str
+
+# A number pool block (numberpoolblock row) was added, modified or deleted ------------------------------
+class BlockChanged(BaseModel):
+    kind: Literal["block_changed"] = "block_changed"
+    npanxxx: str
+
+# API keys of a user were created or revoked ------------------------------------------------------------
+class ApiKeysChanged(BaseModel):
+    kind: Literal["api_keys_changed"] = "api_keys_changed"
+    uid: int
+
+# Ported-TN filter files of some NPAs were rebuilt (started: epoch seconds the table scan began) ----------
+class PortedFilterRebuilt(BaseModel):
+    kind: Literal["ported_filter_rebuilt"] = "ported_filter_rebuilt"
+    npas: list[str]
+    started: float
+
+InvalidationEvent = Annotated[
+    Union[RatesChanged, UserChanged, Lerg6Reloaded, TnChanged, BlockChanged, ApiKeysChanged, PortedFilterRebuilt],
+    Field(discriminator="kind")
+]
+
+# Envelope published on the channel; one message may carry many events -----------------------------------
+class InvalidationMessage(BaseModel):
+    origin: str
+    events: list[InvalidationEvent]
+
+_message_adapter = TypeAdapter(InvalidationMessage)
+_origin = f"{os.environ.get('HOSTNAME', 'routeapi')}-{os.getpid()}"
+
+_handlers: dict[str, list[Callable]] = {}
+_flush_handlers: list[Callable] = []
+
+# Function to register a handler for one kind of invalidation event ------------------------------------
+def on_event(kind: str, handler: Callable):
+    """
+    Registers `handler(event)` to be called in this worker for every event of `kind`.
+    Handlers must be cheap and must not block; they run on the event loop.
+    """
+    _handlers.setdefault(kind, []).append(handler)
+
+# Function to register a handler that drops everything a cache holds -----------------------------------
+def on_flush(handler: Callable):
+    """
+    Registers `handler()` to be called whenever the subscription is (re)established,
+    since events published while the worker was disconnected are lost.
+    """
+    _flush_handlers.append(handler)
+
+# Function to dispatch events to the local handlers ----------------------------------------------------
+def dispatch(events: list):
+    for event in events:
+        for handler in _handlers.get(event.kind, ()):
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Invalidation handler {handler} failed for {event.kind}: {e}")
+
+# Function to flush all local caches -------------------------------------------------------------------
+def flush_all():
+    for handler in _flush_handlers:
+        try:
+            handler()
+        except Exception as e:
+            logger.error(f"Invalidation flush handler {handler} failed: {e}")
+
+# Async function to publish invalidation events to every worker on every host --------------------------
+async def publish(*events, client=None) -> bool:
+    """
+    Publishes events on the invalidation channel.
+
+    Args:
+        events: RatesChanged, UserChanged, Lerg6Reloaded, TnChanged, BlockChanged, ApiKeysChanged or
+                PortedFilterRebuilt instances.
+        client: Redis client to use; defaults to the worker's shared client.
+
+    Returns:
+        bool: True if the message was handed to Redis. Failures are logged, not raised,
+              so an admin update never fails because Redis is unavailable.
+    """
+    if not events:
+        return True
+    client = client or src.databases.redis_cache.redis_client
+    if client is None:
+        return False
+    message = InvalidationMessage(origin=_origin, events=list(events))
+    try:
+        await client.publish(INVALIDATION_CHANNEL, message.model_dump_json())
+        return True
+    except Exception as e:
+        logger.error(f"Failed to publish invalidation events: {e}")
+        return False
+
+# Async function to subscribe to the invalidation channel (runs in every worker) -----------------------
+async def listen_invalidations(redis_client):
+    """
+    Subscribes to the invalidation channel and dispatches events to the local handlers.
+    On every (re)subscription all local caches are flushed, because anything published
+    while the connection was down was missed.
+    """
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            flush_all()
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    envelope = _message_adapter.validate_json(message["data"])
+                except Exception as e:
+                    logger.error(f"Ignoring malformed invalidation message: {e}")
+                    continue
+                dispatch(envelope.events)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Invalidation subscription lost, resubscribing in {RESUBSCRIBE_DELAY}s: {e}")
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -5,6 +5,7 @@ import redis.asyncio as aioredis
 from typing import Optional
 from sqlalchemy import text
 from src.databases.database_session import _NUMBERING_ASYNC_SESSIONMAKER
+from src.utils.timing import TimedRedis
 
 
 LOCAL_REDIS_URL = "redis://redis:6379"
@@ -16,16 +17,34 @@ def redis_startup():
 
     # Set up periodic sync with Postgres
     redis_url = os.environ.get("REDIS_URL", LOCAL_REDIS_URL)
-    redis_client = aioredis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+    redis_client = TimedRedis.from_url(redis_url, encoding="utf-8", decode_responses=True)
     asyncio.create_task(sync_redis_to_postgres(redis_client))
 
+    # Subscribe to cache invalidation events (admin updates, data loaders)
+    from src.databases.invalidation import listen_invalidations
+    asyncio.create_task(listen_invalidations(redis_client))
+
+    # Share per-customer rate limiter activity between workers
+    from src.utils.ratelimit import sync_rate_limits
+    asyncio.create_task(sync_rate_limits(redis_client))
+
+    # Share per-worker heavy hitters (top TNs, NPANXXs and customers)
+    from src.utils.heavyhitters import sync_heavy_hitters
+    asyncio.create_task(sync_heavy_hitters(redis_client))
+
+# Async function to count billed calls (and their amount) of a user's endpoint, synced to endpoint_stats ------
+async def add_endpoint_calls(redis_client, uid: int, endpointid: int, calls: int, amount: float):
+    # one round trip, count and amount applied together
+    pipe = redis_client.pipeline()
+    pipe.hincrby(f"epcalls:{uid}", endpointid, calls)
+    pipe.hincrbyfloat(f"epamounts:{uid}", endpointid, amount)
+    await pipe.execute()
+
 # Async function to sync Redis data to Postgres -------------------------------------------------------------
 async def sync_redis_to_postgres(redis_client):
     while True:
         await asyncio.sleep(60) # Every minute
 
-        pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-
         # Acquire a global lock for the sync operation
         global_lock_key = "lock:epcalls_sync"
         got_global_lock = await redis_client.set(global_lock_key, "1", nx=True, ex=15)
@@ -34,29 +53,35 @@ async def sync_redis_to_postgres(redis_client):
                 async for key in redis_client.scan_iter(match="epcalls:*"):
                     key_str = key.decode() if isinstance(key, bytes) else key
                     uid = int(key_str.split(":")[1])
-                    data = await redis_client.hgetall(key)
-                    if not data:
+                    amount_key = f"epamounts:{uid}"
+                    # Counts and amounts of all endpoints of the user, read together in one round trip
+                    pipe = redis_client.pipeline()
+                    pipe.hgetall(key_str)
+                    pipe.hgetall(amount_key)
+                    data, amounts = await pipe.execute()
+                    rows = []
+                    for endpointid, count in data.items():
+                        count = int(count)
+                        if count > 0:
+                            amount_str = amounts.get(endpointid)
+                            rows.append({"userid": uid, "endpointid": int(endpointid), "count": count,
+                                         "amount": float(amount_str) if amount_str else 0.0})
+                    if not rows:
                         continue
-                    async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
-                        for endpointid, count in data.items():
-                            count = int(count)
-                            if count > 0:
-                                endpointid = int(endpointid)
-                                amount_key = f"epamounts:{uid}"
-                                amount_str = await redis_client.hget(amount_key, endpointid)
-                                amount = float(amount_str) if amount_str else 0.0
 
-                                # Subtract the counts and amounts from Redis 
-                                await redis_client.hincrby(key_str, endpointid, -count)
-                                await redis_client.hincrbyfloat(amount_key, endpointid, -amount)
+                    # Subtract the counts and amounts from Redis (calls counted meanwhile stay for the next sync)
+                    pipe = redis_client.pipeline()
+                    for row in rows:
+                        pipe.hincrby(key_str, row["endpointid"], -row["count"])
+                        pipe.hincrbyfloat(amount_key, row["endpointid"], -row["amount"])
+                    await pipe.execute()
 
-                                await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
-                                await session.execute(text("""
-                                    INSERT INTO endpoint_stats (userid, endpointid, count, amount)
-                                    VALUES (:userid, :endpointid, :count, :amount)
-                                """), {"userid": uid, "endpointid": endpointid, "count": count, "amount": amount})
-                           
-                                await session.commit()
+                    async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+                        await session.execute(text("""
+                            INSERT INTO endpoint_stats (userid, endpointid, count, amount)
+                            VALUES (:userid, :endpointid, :count, :amount)
+                        """), rows)
+                        await session.commit()
    
             finally:
                 await redis_client.delete(global_lock_key)
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import argparse
+
+from sqlalchemy import text
+from src.databases.database_session import _NUMBERING_ASYNC_ENGINE, _NUMBERING_ASYNC_SESSIONMAKER
+
+logger = logging.getLogger(__name__)
+
+# Tables the fulldata_block rows are derived from
+FULLDATA_SOURCES = ("lerg6", "numberpoolblock", "spidnames", "simple_carrier_names")
+
+_COLUMNS = "npanxxx, pooled, lrn, spid, ported_date, ocn, ocn_name, category, co_spec_name, spid_name, simplified_name, osimplified_name"
+
+# One row per LERG6 NPANXX: the answer for a TN that is neither ported nor in a pool block
+_INSERT_NXX_ROWS = f"""
+INSERT INTO fulldata_block ({_COLUMNS})
+SELECT l.npanxxx, false, '', '', '',
+       coalesce(l.ocn, ''), coalesce(l.ocnname, ''), coalesce(l.category, ''), coalesce(l.co_spec_name, ''),
+       '', coalesce(scn.simplified_name, ''), ''
+FROM lerg6 l
+LEFT JOIN simple_carrier_names scn ON scn.co_spec_name = coalesce(l.co_spec_name, '')
+"""
+
+# One row per pool block: the LRN's LERG6 row, SPID name and both simplified names
+_INSERT_POOLED_ROWS = f"""
+INSERT INTO fulldata_block ({_COLUMNS})
+SELECT pb.npanxxx, true, coalesce(pb.lrn, ''), coalesce(pb.spid, ''), coalesce(pb.activationtimestamp, ''),
+       coalesce(l.ocn, ''), coalesce(l.ocnname, ''), coalesce(l.category, ''), coalesce(l.co_spec_name, ''),
+       coalesce(sn.spidname, ''), coalesce(scn.simplified_name, ''), coalesce(oscn.simplified_name, '')
+FROM numberpoolblock pb
+LEFT JOIN lerg6 l ON l.npanxxx = left(right(pb.lrn, 10), 6)
+LEFT JOIN spidnames sn ON sn.spid = pb.spid AND pb.spid <> ''
+LEFT JOIN simple_carrier_names scn ON scn.co_spec_name = coalesce(l.co_spec_name, '')
+LEFT JOIN lerg6 ol ON ol.npanxxx = left(pb.npanxxx, 6)
+LEFT JOIN simple_carrier_names oscn ON oscn.co_spec_name = ol.co_spec_name
+"""
+
+# Async function to rebuild every fulldata_block row ---------------------------------------------------
+async def rebuild_fulldata_blocks(session) -> int:
+    """
+    Replaces the table in the session's transaction, so readers keep the old rows
+    until the caller commits. Run it after any of FULLDATA_SOURCES is reloaded.
+    """
+    await session.execute(text("DELETE FROM fulldata_block"))
+    nxx = await session.execute(text(_INSERT_NXX_ROWS))
+    pooled = await session.execute(text(_INSERT_POOLED_ROWS))
+    logger.info(f"Rebuilt fulldata_block: {nxx.rowcount} NPANXX rows, {pooled.rowcount} pool block rows")
+    return nxx.rowcount + pooled.rowcount
+
+# Async function to refresh the rows of changed pool blocks -------------------------------------------
+async def refresh_fulldata_blocks(session, npanxxxs: list[str]) -> int:
+    """
+    Re-derives the pooled rows of `npanxxxs` from numberpoolblock (deleted blocks lose
+    theirs). Meant to run in the NPAC delta transaction that changed the blocks.
+    """
+    if not npanxxxs:
+        return 0
+    await session.execute(text("DELETE FROM fulldata_block WHERE pooled AND npanxxx = ANY(:keys)"), {"keys": npanxxxs})
+    result = await session.execute(text(_INSERT_POOLED_ROWS + " WHERE pb.npanxxx = ANY(:keys)"), {"keys": npanxxxs})
+    return result.rowcount
+
+#-----------------------------------------------------------------------------------------------------
+async def run():
+    try:
+        async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+            await rebuild_fulldata_blocks(session)
+            await session.commit()
+    finally:
+        await _NUMBERING_ASYNC_ENGINE.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the per-block full data table (fulldata_block)")
+    parser.parse_args()
+    asyncio.run(run())
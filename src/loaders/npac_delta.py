@@ -0,0 +1,339 @@
+import os
+import csv
+import gzip
+import json
+import asyncio
+import logging
+import argparse
+
+from typing import Callable, Iterator, Optional
+from pydantic import BaseModel
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from src.models.numbering_v1 import Numberpoolblock, NpacDeltaStateModel, create_dynamic_model
+from src.databases.database_session import _NUMBERING_ASYNC_ENGINE, _NUMBERING_ASYNC_SESSIONMAKER
+from src.databases.invalidation import publish, TnChanged, BlockChanged
+from src.loaders.fulldata import refresh_fulldata_blocks
+from src.utils.portedfilter import filter_lock, open_for_update, mark_synced
+
+logger = logging.getLogger(__name__)
+
+SV_OBJECTCLASS = "subscriptionVersion"
+NPB_OBJECTCLASS = "numberPoolBlock"
+DELETE_REASONS = ("delete", "deleted")
+UPSERT_REASONS = ("new", "modify", "modified", "audit-discrepancy")
+DEFAULT_BATCH_SIZE = int(os.environ.get("NPAC_DELTA_BATCH_SIZE", 5000))
+MAX_BUFFERED_RECORDS = int(os.environ.get("NPAC_DELTA_MAX_BUFFERED", 200000))
+# Bind parameters per statement the asyncpg protocol allows (an Int16 count on the wire)
+PG_MAX_BIND_PARAMS = 32767
+
+# Schema describing the keys touched by one applied batch --------------------------------------------
+class NpacChangeSet(BaseModel):
+    objectclass: str
+    npa: str
+    upserted: list[str] = []
+    deleted: list[str] = []
+
+    def keys(self) -> list[str]:
+        return self.upserted + self.deleted
+
+_change_listeners: list[Callable[[NpacChangeSet], None]] = []
+
+# Function to register an in-process listener for applied NPAC changes --------------------------------
+def add_change_listener(listener: Callable[[NpacChangeSet], None]):
+    """
+    Registers a callback invoked with every NpacChangeSet applied by this process.
+    API workers are notified through the invalidation bus instead (tn_changed/block_changed).
+    """
+    _change_listeners.append(listener)
+
+# Function to dispatch a change set to the in-process listeners --------------------------------------
+def dispatch_changes(changes: NpacChangeSet):
+    for listener in _change_listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            logger.error(f"NPAC change listener {listener} failed: {e}")
+
+#-----------------------------------------------------------------------------------------------------
+# Delta file parsing
+#-----------------------------------------------------------------------------------------------------
+def read_delta_file(path: str) -> Iterator[dict]:
+    """
+    Streams records from an NPAC-style delta file.
+
+    The file is pipe-delimited with a header row naming the tn2lrn/numberpoolblock
+    columns. `downloadreason` selects the action (new, modified, delete) and
+    `objectclass` selects subscriptionVersion or numberPoolBlock records; when the
+    objectclass column is absent it is inferred from the key column (tn or npanxxx).
+    Files ending in .gz are decompressed on the fly.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f, delimiter="|")
+        for row in reader:
+            yield {k.strip().lower(): (v.strip() if v is not None and v.strip() != "" else None)
+                   for k, v in row.items() if k is not None}
+
+def record_objectclass(record: dict) -> Optional[str]:
+    objectclass = (record.get("objectclass") or "").lower()
+    if objectclass.startswith("subscription"):
+        return SV_OBJECTCLASS
+    if objectclass.startswith("numberpool"):
+        return NPB_OBJECTCLASS
+    if record.get("tn"):
+        return SV_OBJECTCLASS
+    if record.get("npanxxx"):
+        return NPB_OBJECTCLASS
+    return None
+
+#-----------------------------------------------------------------------------------------------------
+# Batch application
+#-----------------------------------------------------------------------------------------------------
+class DeltaBatch:
+    """
+    Records buffered for one (objectclass, NPA) pair.
+    Only the last action per key is kept, so the order of upserts and deletes inside
+    a batch does not matter when it is applied.
+    """
+    def __init__(self, objectclass: str, npa: str):
+        self.objectclass = objectclass
+        self.npa = npa
+        self.records: dict[str, dict] = {}
+
+    def add(self, key: str, record: dict):
+        self.records[key] = record
+
+    def __len__(self):
+        return len(self.records)
+
+class NpacDeltaLoader:
+    """
+    Applies NPAC SV/NPB delta files in bulk batches grouped by NPA and tracks
+    a high-water mark of the applied `mibupdatetime` per object class.
+    """
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, redis_client=None, dry_run: bool = False):
+        self.batch_size = batch_size
+        self.redis_client = redis_client
+        self.dry_run = dry_run
+        self.batches: dict[tuple[str, str], DeltaBatch] = {}
+        self.buffered = 0
+        self.high_water_marks: dict[str, str] = {}
+        self.file_marks: dict[str, str] = {}
+        self.applied: dict[str, int] = {}
+        self.skipped = 0
+        self._ensured_tables: set[str] = set()
+
+    async def load_high_water_marks(self):
+        async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+            result = await session.execute(select(NpacDeltaStateModel))
+            for row in result.scalars():
+                self.high_water_marks[row.objectclass] = row.high_water_mark
+
+    async def apply_file(self, path: str):
+        """
+        Streams one delta file, applying batches as they fill up, and advances the
+        high-water mark once the whole file has been committed.
+        """
+        self.file_marks = {}
+        self.applied = {}
+        for record in read_delta_file(path):
+            objectclass = record_objectclass(record)
+            if objectclass is None:
+                self.skipped += 1
+                continue
+
+            reason = (record.get("downloadreason") or "new").lower()
+            if reason not in DELETE_REASONS and reason not in UPSERT_REASONS:
+                self.skipped += 1
+                continue
+
+            updated = record.get("mibupdatetime") or ""
+            hwm = self.high_water_marks.get(objectclass, "")
+            if updated and hwm and updated < hwm:
+                self.skipped += 1
+                continue
+            if updated > self.file_marks.get(objectclass, ""):
+                self.file_marks[objectclass] = updated
+
+            key = record.get("tn") if objectclass == SV_OBJECTCLASS else record.get("npanxxx")
+            if not key:
+                self.skipped += 1
+                continue
+            key = key[-10:] if objectclass == SV_OBJECTCLASS else key[-7:]
+
+            batch_key = (objectclass, key[:3])
+            batch = self.batches.get(batch_key)
+            if batch is None:
+                batch = self.batches[batch_key] = DeltaBatch(objectclass, key[:3])
+            before = len(batch)
+            batch.add(key, record)
+            self.buffered += len(batch) - before
+
+            if len(batch) >= self.batch_size:
+                await self.flush_batch(batch_key)
+            elif self.buffered >= MAX_BUFFERED_RECORDS:
+                await self.flush_all()
+
+        await self.flush_all()
+        await self.save_high_water_marks(os.path.basename(path))
+
+    async def flush_all(self):
+        for batch_key in list(self.batches.keys()):
+            await self.flush_batch(batch_key)
+
+    async def flush_batch(self, batch_key: tuple[str, str]):
+        batch = self.batches.pop(batch_key)
+        self.buffered -= len(batch)
+        if not batch.records:
+            return
+
+        upserts = [(k, r) for k, r in batch.records.items() if (r.get("downloadreason") or "new").lower() not in DELETE_REASONS]
+        deletes = [k for k, r in batch.records.items() if (r.get("downloadreason") or "new").lower() in DELETE_REASONS]
+
+        if batch.objectclass == SV_OBJECTCLASS:
+            model = create_dynamic_model("tn2lrn" + batch.npa)
+            key_column = "tn"
+        else:
+            model = Numberpoolblock
+            key_column = "npanxxx"
+        columns = set(model.__table__.columns.keys())
+
+        changes = NpacChangeSet(
+            objectclass=batch.objectclass,
+            npa=batch.npa,
+            upserted=[k for k, _ in upserts],
+            deleted=deletes
+        )
+
+        if not self.dry_run:
+            if batch.objectclass == SV_OBJECTCLASS:
+                await self.ensure_table(model)
+
+            async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+                if upserts:
+                    rows = []
+                    for key, record in upserts:
+                        row = {c: v for c, v in record.items() if c in columns}
+                        row[key_column] = key
+                        rows.append(row)
+                    # Rows of one batch may carry different column sets; group them so each
+                    # INSERT ... ON CONFLICT statement has a single column list.
+                    by_columns: dict[tuple, list[dict]] = {}
+                    for row in rows:
+                        by_columns.setdefault(tuple(sorted(row.keys())), []).append(row)
+                    for cols, group in by_columns.items():
+                        # a multi-row VALUES binds one parameter per column and row
+                        step = PG_MAX_BIND_PARAMS // len(cols)
+                        for start in range(0, len(group), step):
+                            stmt = insert(model).values(group[start:start + step])
+                            stmt = stmt.on_conflict_do_update(
+                                index_elements=[key_column],
+                                set_={c: stmt.excluded[c] for c in cols if c != key_column}
+                            )
+                            await session.execute(stmt)
+                for start in range(0, len(deletes), PG_MAX_BIND_PARAMS):
+                    keys = deletes[start:start + PG_MAX_BIND_PARAMS]
+                    await session.execute(delete(model).where(getattr(model, key_column).in_(keys)))
+                if batch.objectclass == NPB_OBJECTCLASS:
+                    # keep the materialized per-block answers in step, in the same transaction
+                    await refresh_fulldata_blocks(session, changes.keys())
+                    await session.commit()
+                else:
+                    await self.commit_with_filter(session, changes)
+
+        self.applied[batch.objectclass] = self.applied.get(batch.objectclass, 0) + len(batch)
+        logger.info(f"NPAC delta {batch.objectclass} NPA {batch.npa}: {len(upserts)} upserted, {len(deletes)} deleted")
+        await self.notify(changes)
+
+    async def commit_with_filter(self, session, changes: NpacChangeSet):
+        """
+        Commits an SV batch keeping the NPA's ported-TN filter current: new ports are
+        added before the commit (a dip in between must not skip them), deleted ones
+        are cleared after it. The lock keeps a filter rebuild from running in between.
+        """
+        with filter_lock(changes.npa):
+            ported_filter = open_for_update(changes.npa)
+            if ported_filter is None:
+                await session.commit()
+                return
+            try:
+                ported_filter.add(int(tn[-7:]) for tn in changes.upserted)
+                await session.commit()
+                ported_filter.remove(int(tn[-7:]) for tn in changes.deleted)
+            finally:
+                ported_filter.close()
+
+    async def ensure_table(self, model):
+        table_name = model.__tablename__
+        if table_name in self._ensured_tables:
+            return
+        async with _NUMBERING_ASYNC_ENGINE.begin() as conn:
+            await conn.run_sync(model.__table__.create, checkfirst=True)
+        self._ensured_tables.add(table_name)
+
+    async def notify(self, changes: NpacChangeSet):
+        dispatch_changes(changes)
+        if self.redis_client is not None and not self.dry_run:
+            if changes.objectclass == SV_OBJECTCLASS:
+                events = [TnChanged(tn=tn) for tn in changes.keys()]
+            else:
+                events = [BlockChanged(npanxxx=npanxxx) for npanxxx in changes.keys()]
+            await publish(*events, client=self.redis_client)
+
+    async def save_high_water_marks(self, filename: str):
+        if self.dry_run:
+            return
+        async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+            for objectclass, applied in self.applied.items():
+                mark = max(self.file_marks.get(objectclass, ""), self.high_water_marks.get(objectclass, ""))
+                stmt = insert(NpacDeltaStateModel).values(
+                    objectclass=objectclass,
+                    high_water_mark=mark,
+                    last_file=filename,
+                    records_applied=applied
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["objectclass"],
+                    set_={
+                        "high_water_mark": mark,
+                        "last_file": filename,
+                        "records_applied": NpacDeltaStateModel.records_applied + applied,
+                        "updated": func.now()
+                    }
+                )
+                await session.execute(stmt)
+                self.high_water_marks[objectclass] = mark
+            await session.commit()
+
+#-----------------------------------------------------------------------------------------------------
+async def run(paths: list[str], batch_size: int, notify: bool, dry_run: bool):
+    redis_client = None
+    if notify:
+        import redis.asyncio as aioredis
+        from src.databases.redis_cache import LOCAL_REDIS_URL
+        redis_client = aioredis.from_url(os.environ.get("REDIS_URL", LOCAL_REDIS_URL), encoding="utf-8", decode_responses=True)
+
+    loader = NpacDeltaLoader(batch_size=batch_size, redis_client=redis_client, dry_run=dry_run)
+    try:
+        await loader.load_high_water_marks()
+        for path in paths:
+            await loader.apply_file(path)
+            logger.info(f"NPAC delta file {path} applied, high-water marks: {json.dumps(loader.high_water_marks)}")
+        if not dry_run:
+            mark_synced()   # every port committed so far is in this host's filter files
+        if loader.skipped:
+            logger.info(f"NPAC delta: {loader.skipped} records skipped")
+    finally:
+        if redis_client is not None:
+            await redis_client.aclose()
+        await _NUMBERING_ASYNC_ENGINE.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply NPAC SV/NPB delta files")
+    parser.add_argument("files", nargs="+", help="Pipe-delimited delta files (optionally .gz), applied in order")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Records per NPA batch")
+    parser.add_argument("--no-notify", action="store_true", help="Do not publish change sets to Redis")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and group records without touching the database")
+    args = parser.parse_args()
+    asyncio.run(run(args.files, args.batch_size, not args.no_notify, args.dry_run))
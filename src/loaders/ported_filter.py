@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+import logging
+import argparse
+
+from array import array
+from sqlalchemy import text
+from src.databases.database_session import _NUMBERING_ASYNC_ENGINE, _NUMBERING_ASYNC_SESSIONMAKER
+from src.databases.invalidation import publish, PortedFilterRebuilt
+from src.utils.portedfilter import PORTED_FILTER_DIR, KIND_BITMAP, filter_lock, write_filter, PortedFilter
+from src.utils.warmup import get_known_npas
+
+logger = logging.getLogger(__name__)
+
+# Async function to build the ported-TN filter of one NPA from its tn2lrn table ---------------------------
+async def build_filter(npa: str, directory: str) -> PortedFilter:
+    """
+    Scans tn2lrnNPA and writes the NPA's filter file. Holds the NPA's filter lock, so
+    the NPAC delta loader cannot commit ports that the scan would miss.
+    """
+    with filter_lock(npa, directory):
+        suffixes = array("L")
+        async with _NUMBERING_ASYNC_ENGINE.connect() as conn:
+            result = await conn.stream(text(f"SELECT tn FROM tn2lrn{npa}"))
+            async for (tn,) in result:
+                suffixes.append(int(tn[-7:]))
+        path = write_filter(npa, suffixes, directory)
+
+    ported_filter = PortedFilter(npa, path)
+    kind = "bitmap" if ported_filter.kind == KIND_BITMAP else f"bloom k={ported_filter.hashes}"
+    logger.info(f"Ported-TN filter {npa}: {len(suffixes)} TNs, {ported_filter.size} bytes, {kind}, "
+                f"estimated false positive rate {ported_filter.fp_rate():.4%}")
+    return ported_filter
+
+#-----------------------------------------------------------------------------------------------------
+async def run(npas: list[str], directory: str, notify: bool):
+    started = time.time()
+    try:
+        if not npas:
+            async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+                npas = await get_known_npas(session)
+        total = 0
+        for npa in npas:
+            ported_filter = await build_filter(npa, directory)
+            total += ported_filter.size
+            ported_filter.close()
+        logger.info(f"Built {len(npas)} ported-TN filters, {total} bytes")
+
+        if notify and npas:
+            import redis.asyncio as aioredis
+            from src.databases.redis_cache import LOCAL_REDIS_URL
+            redis_client = aioredis.from_url(os.environ.get("REDIS_URL", LOCAL_REDIS_URL), encoding="utf-8", decode_responses=True)
+            try:
+                await publish(PortedFilterRebuilt(npas=npas, started=started), client=redis_client)
+            finally:
+                await redis_client.aclose()
+    finally:
+        await _NUMBERING_ASYNC_ENGINE.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the per-NPA ported-TN filters from the tn2lrn tables")
+    parser.add_argument("--npa", nargs="+", default=[], help="NPAs to build (default: every tn2lrnNPA table)")
+    parser.add_argument("--dir", default=PORTED_FILTER_DIR, help="Filter directory shared with the API workers")
+    parser.add_argument("--no-notify", action="store_true", help="Do not tell the workers to remap the new files")
+    args = parser.parse_args()
+    asyncio.run(run(args.npa, args.dir, not args.no_notify))
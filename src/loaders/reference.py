@@ -0,0 +1,50 @@
+import os
+import asyncio
+import logging
+import argparse
+
+from datetime import datetime
+from src.databases.invalidation import publish, Lerg6Reloaded
+from src.loaders.fulldata import FULLDATA_SOURCES
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_TABLES = ("lerg6", "local", "spidnames", "simple_carrier_names", "nnmp", "numberpoolblock")
+
+# Async function to announce a reference data reload to every API worker --------------------------------
+async def announce_reload(version: str, tables: list[str], redis_client) -> bool:
+    """
+    Publishes lerg6_reloaded so the workers drop everything derived from the
+    reference tables. Call it after the reload transaction has been committed.
+    """
+    ok = await publish(Lerg6Reloaded(version=version, tables=tables), client=redis_client)
+    if ok:
+        logger.info(f"Announced reload of {', '.join(tables)} (version {version})")
+    return ok
+
+#-----------------------------------------------------------------------------------------------------
+async def run(version: str, tables: list[str], rebuild: bool = True):
+    import redis.asyncio as aioredis
+    from src.databases.redis_cache import LOCAL_REDIS_URL
+
+    # fulldata_block is derived from the reloaded tables: rebuild it before the workers drop their caches
+    if rebuild and set(tables) & set(FULLDATA_SOURCES):
+        from src.databases.database_session import _NUMBERING_ASYNC_SESSIONMAKER
+        from src.loaders.fulldata import rebuild_fulldata_blocks
+        async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+            await rebuild_fulldata_blocks(session)
+            await session.commit()
+
+    redis_client = aioredis.from_url(os.environ.get("REDIS_URL", LOCAL_REDIS_URL), encoding="utf-8", decode_responses=True)
+    try:
+        await announce_reload(version, tables, redis_client)
+    finally:
+        await redis_client.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Announce a LERG6/reference data reload to the API workers")
+    parser.add_argument("--version", default=datetime.now().strftime("%Y%m%d%H%M%S"), help="Version tag of the loaded data")
+    parser.add_argument("--tables", nargs="+", default=["lerg6"], choices=REFERENCE_TABLES, help="Reloaded tables")
+    parser.add_argument("--no-rebuild", action="store_true", help="Do not rebuild fulldata_block")
+    args = parser.parse_args()
+    asyncio.run(run(args.version, args.tables, not args.no_rebuild))
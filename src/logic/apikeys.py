@@ -0,0 +1,148 @@
+import logging
+import secrets
+import hashlib
+
+from sqlalchemy import select, func, update
+from src.models.users import ApiKeysModel, UserProfilesModel, UserSettingsModel
+from src.logic.utilities import normalize_str_date, normalize_str_expdate
+from src.logic.users import settings_change_secs
+from src.databases.invalidation import publish, ApiKeysChanged
+
+logger = logging.getLogger(__name__)
+
+API_KEY_PREFIX = "rk_"
+
+# Function to hash an API key (only hashes are stored) ------------------------------------------------------------
+def hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+# Function to generate a new random API key -----------------------------------------------------------------------
+def generate_api_key() -> str:
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+# Function to get the active API keys with their user and product context ---------------------------------------
+async def get_active_api_keys(session, userid: int = None):
+    """
+    Returns (keyhash, userid, username, productid, ratio, valid_secs) for every unrevoked
+    key of an active user with an active product, optionally for one user only. The
+    product is the user's highest priority one, as in check_user_access; valid_secs is
+    how long that holds (until the key's revocation date or the next settings change).
+    """
+    valid_secs = func.least(
+        settings_change_secs(ApiKeysModel.userid),
+        func.extract("epoch", ApiKeysModel.daterevoked - func.localtimestamp())
+    )
+    query = (
+        select(ApiKeysModel.keyhash, ApiKeysModel.userid, UserProfilesModel.username,
+               UserSettingsModel.productid, UserSettingsModel.ratio, valid_secs)
+        .join(UserProfilesModel, ApiKeysModel.userid == UserProfilesModel.id)
+        .join(UserSettingsModel, ApiKeysModel.userid == UserSettingsModel.userid)
+        .where(
+            ApiKeysModel.daterevoked > func.now(),
+            UserProfilesModel.isactive == True,
+            UserSettingsModel.dateeff <= func.now(),
+            UserSettingsModel.dateexp > func.now()
+        )
+        .distinct(ApiKeysModel.keyhash)
+        .order_by(ApiKeysModel.keyhash, UserSettingsModel.productpriority.desc())
+    )
+    if userid is not None:
+        query = query.where(ApiKeysModel.userid == userid)
+
+    result = await session.execute(query, stage="db.get_active_api_keys")
+    return result.all()
+
+# Function to get a list of API keys with pagination -------------------------------------------------------------
+async def get_api_key_list(session, range_from=0, range_to=24, filter_dict={}, sort_list=[]):
+
+    query = select(ApiKeysModel)
+
+    if sort_list and isinstance(sort_list, list) and len(sort_list) == 2:
+        field_name, order = sort_list
+        field = getattr(ApiKeysModel, field_name, None)
+
+        if field is not None:
+            if order.upper() == "ASC":
+                query = query.order_by(field.asc())
+            elif order.upper() == "DESC":
+                query = query.order_by(field.desc())
+
+    if filter_dict and isinstance(filter_dict, dict):
+        for field_name, value in filter_dict.items():
+            if field_name in ("id", "userid"):
+                try:
+                    query = query.where(getattr(ApiKeysModel, field_name) == int(value))
+                except (ValueError, TypeError):
+                    continue
+            elif field_name in ("prefix", "note") and value:
+                query = query.where(getattr(ApiKeysModel, field_name).ilike(f"%{value}%"))
+
+    result = await session.execute(query, stage="db.get_api_key_list")
+    ret = result.all()
+    total_count = len(ret)
+
+    # Apply pagination
+    paginated_ret = ret[range_from:range_to + 1]
+
+    data = [
+        {
+            "id": row[0].id,
+            "userid": row[0].userid,
+            "prefix": row[0].prefix,
+            "note": row[0].note,
+            "datecreated": normalize_str_date(str(row[0].datecreated)),
+            "daterevoked": normalize_str_expdate(str(row[0].daterevoked))
+        }
+        for row in paginated_ret
+    ]
+
+    return {
+        "data": data,
+        "total": total_count
+    }
+
+# Function to create a new API key (the key itself is returned only once) ----------------------------------------
+async def create_api_key(session, key_data):
+
+    api_key = generate_api_key()
+    new_key = ApiKeysModel(
+        userid = int(key_data.get("userid")),
+        keyhash = hash_api_key(api_key),
+        prefix = api_key[:len(API_KEY_PREFIX) + 6],
+        note = key_data.get("note", "")
+    )
+
+    session.add(new_key)
+    await session.commit()
+    await session.refresh(new_key)
+    await publish(ApiKeysChanged(uid=new_key.userid))
+
+    return {
+        "id": new_key.id,
+        "userid": new_key.userid,
+        "prefix": new_key.prefix,
+        "note": new_key.note,
+        "api_key": api_key
+    }
+
+# Function to revoke an API key by ID ----------------------------------------------------------------------------
+async def revoke_api_key(session, key_id):
+
+    existing_key = await session.get(ApiKeysModel, key_id, stage="db.revoke_api_key")
+    if not existing_key:
+        return {"error": "API key not found"}
+
+    await session.execute(
+        update(ApiKeysModel)
+        .where(ApiKeysModel.id == key_id)
+        .values(daterevoked=func.now()), stage="db.revoke_api_key"
+    )
+    await session.commit()
+    await publish(ApiKeysChanged(uid=existing_key.userid))
+
+    return {
+        "id": existing_key.id,
+        "userid": existing_key.userid,
+        "prefix": existing_key.prefix,
+        "note": existing_key.note
+    }
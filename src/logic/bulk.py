@@ -0,0 +1,348 @@
+import re
+
+from typing import Optional
+from sqlalchemy import select, func, tuple_, or_, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from src.databases.database_session import fan_out
+from src.models.numbering_v1  import Lerg6Model, LocalModel, SPIDNamesModel, Numberpoolblock, NNMPModel, SimpleCarrierNamesModel
+from src.models.numbering_v1  import FullDataBlockModel, create_dynamic_model
+from src.logic.numbering_v1   import NormalizedTN, get_NPANXX, setPrefix
+from src.schemas.numbering_v1 import FullDataCoSpecSchema, LRNwithJurisdictionSchema
+from src.utils.portedfilter   import maybe_ported, false_positive
+
+BULK_SEPARATORS = re.compile(r"[,;|\t]")
+
+# Function to parse one line of a CSV/text TN list into (tn, cn); None for blank and header lines -------
+def parse_bulk_line(line: str, first: bool = False) -> Optional[tuple[str, Optional[str]]]:
+    cells = [cell.strip().strip('"') for cell in BULK_SEPARATORS.split(line)]
+    if not cells[0]:
+        return None
+    if first and not cells[0].lstrip("+").isdigit():
+        return None   # header row
+    return cells[0], cells[1] if len(cells) > 1 and cells[1] else None
+
+#-----------------------------------------------------------------------------------------------------
+# Grouped lookups: one statement per table (per NPA for tn2lrn) instead of one per TN
+#-----------------------------------------------------------------------------------------------------
+# The keys go in as one array parameter per column (= ANY / unnest) rather than an IN list of
+# one parameter per key: any number of keys fits the bind parameter limit of a statement (a
+# 10k-TN job chunk would pass it), and the SQL text, hence asyncpg's prepared statement, is
+# the same for every batch size.
+
+# Function to bind a collection of keys as one array parameter of a column's type ------------------------
+def _array(column, values):
+    return bindparam(None, list(values), type_=ARRAY(column.type))
+
+# Function to match a column against a collection of keys ---------------------------------------------
+def _in_keys(column, values):
+    return column == any_(_array(column, values))
+
+# Function to get the tn2lrn rows of many TNs, one query per NPA ---------------------------------------
+def tn2lrn_lookups(ntns: list[NormalizedTN]) -> list:
+    """
+    Returns the lookups (functions of a session, for fan_out) of the TNs the ported-TN
+    filters do not rule out; each returns {ten_digit: row}.
+    """
+    by_npa: dict[str, set[str]] = {}
+    for ntn in ntns:
+        if maybe_ported(ntn.npa, ntn.as_int % 10_000_000):
+            by_npa.setdefault(ntn.npa, set()).add(ntn.ten_digit)
+
+    def lookup(npa: str, tens: set[str]):
+        async def inner(session) -> dict:
+            model = create_dynamic_model("tn2lrn" + npa)
+            result = await session.execute(select(model).where(_in_keys(model.tn, tens)), stage="db.tn2lrn_lookups")
+            rows = {row.tn: row for row in result.scalars()}
+            for _ in range(len(tens) - len(rows)):
+                false_positive(npa)
+            return rows
+        return inner
+
+    return [lookup(npa, tens) for npa, tens in by_npa.items()]
+
+# Async function to get the tn2lrn rows of many TNs -----------------------------------------------------
+async def get_TN2LRN_by_TNs(ntns: list[NormalizedTN], session) -> dict:
+    found = {}
+    lookups = tn2lrn_lookups(ntns)
+    if lookups:
+        for rows in await fan_out(session, *lookups):
+            found.update(rows)
+    return found
+
+# Async function to get number pool blocks by NPANXXX -------------------------------------------------
+async def get_NumberPool_by_Blocks(npanxxxs: set[str], session) -> dict:
+    if not npanxxxs:
+        return {}
+    result = await session.execute(select(Numberpoolblock).where(_in_keys(Numberpoolblock.npanxxx, npanxxxs)), stage="db.get_NumberPool_by_Blocks")
+    return {row.npanxxx: row for row in result.scalars()}
+
+# Async function to get LERG6 rows by NPANXX ----------------------------------------------------------
+async def get_Lerg6_by_NPANXXs(npanxxs: set[str], session) -> dict:
+    if not npanxxs:
+        return {}
+    result = await session.execute(select(Lerg6Model).where(_in_keys(Lerg6Model.npanxxx, npanxxs)), stage="db.get_Lerg6_by_NPANXXs")
+    return {row.npanxxx: row for row in result.scalars()}
+
+# Async function to get the precomputed full data of pool blocks and NPANXXs ------------------------------
+async def get_FullData_by_Blocks(npanxxxs: set[str], npanxxs: set[str], session) -> tuple[dict, dict]:
+    conditions = []
+    if npanxxxs:
+        conditions.append(_in_keys(FullDataBlockModel.npanxxx, npanxxxs) & FullDataBlockModel.pooled.is_(True))
+    if npanxxs:
+        conditions.append(_in_keys(FullDataBlockModel.npanxxx, npanxxs) & FullDataBlockModel.pooled.is_(False))
+    blocks, nxxs = {}, {}
+    if conditions:
+        result = await session.execute(select(FullDataBlockModel).where(or_(*conditions)), stage="db.get_FullData_by_Blocks")
+        for row in result.scalars():
+            (blocks if row.pooled else nxxs)[row.npanxxx] = row
+    return blocks, nxxs
+
+# Async function to get SPID names by SPID --------------------------------------------------------------
+async def get_SPID_Names(spids: set[str], session) -> dict:
+    if not spids:
+        return {}
+    result = await session.execute(select(SPIDNamesModel.spid, SPIDNamesModel.spidname).where(_in_keys(SPIDNamesModel.spid, spids)), stage="db.get_SPID_Names")
+    return {spid: name for spid, name in result.all()}
+
+# Async function to get simplified carrier names by co_spec_name -------------------------------------------
+async def get_Simple_Names(co_spec_names: set[str], session) -> dict:
+    if not co_spec_names:
+        return {}
+    result = await session.execute(select(SimpleCarrierNamesModel.co_spec_name, SimpleCarrierNamesModel.simplified_name)
+                                   .where(_in_keys(SimpleCarrierNamesModel.co_spec_name, co_spec_names)), stage="db.get_Simple_Names")
+    return {name: simplified for name, simplified in result.all()}
+
+# Async function to get NNMPs by co_spec_name (case-insensitive, keyed by the upper-cased name) ------------
+async def get_NNMPs(co_spec_names: set[str], session) -> dict:
+    if not co_spec_names:
+        return {}
+    upper = func.upper(NNMPModel.co_spec_name, type_=NNMPModel.co_spec_name.type)
+    result = await session.execute(select(upper, NNMPModel.nnmp).where(_in_keys(upper, {name.upper() for name in co_spec_names})), stage="db.get_NNMPs")
+    return {name: nnmp for name, nnmp in result.all()}
+
+# Async function to get which LERG6 pairs are local by the local table -------------------------------------
+async def get_Local_Pairs(pairs: set[tuple], session) -> set[tuple]:
+    if not pairs:
+        return set()
+    columns = (LocalModel.from_rc_abbrev, LocalModel.from_state, LocalModel.from_lata,
+               LocalModel.to_rc_abbrev, LocalModel.to_state, LocalModel.to_lata)
+    pairs = list(pairs)
+    keys = select(*(func.unnest(_array(column, [pair[i] for pair in pairs])) for i, column in enumerate(columns)))
+    result = await session.execute(select(*columns).where(tuple_(*columns).in_(keys)), stage="db.get_Local_Pairs")
+    return {tuple(row) for row in result.all()}
+
+#-----------------------------------------------------------------------------------------------------
+# Bulk lookup engine
+#-----------------------------------------------------------------------------------------------------
+class BulkLookup:
+    """
+    Resolves a list of TNs with the fewest grouped statements, in stages whose
+    statements run concurrently (fan_out). Each method fills the per-TN results the
+    same way the single-TN lookup does, so the rows render byte-identically.
+    """
+    def __init__(self, ntns: list[NormalizedTN], session):
+        self.ntns = ntns
+        self.session = session
+        self.filled: set[int] = set()     # rows full_data has filled (the rest are empty if it runs out of time)
+
+    # LRN of every TN (tn2lrn, else its pool block), without the TN's prefix
+    async def lrns(self) -> list[Optional[str]]:
+        tn2lrn, pool = await fan_out(
+            self.session,
+            lambda s: get_TN2LRN_by_TNs(self.ntns, s),
+            lambda s: get_NumberPool_by_Blocks({ntn.npanxxx for ntn in self.ntns}, s),
+        )
+        ret = []
+        for ntn in self.ntns:
+            record = tn2lrn.get(ntn.ten_digit) or pool.get(ntn.npanxxx)
+            ret.append(record.lrn if record is not None else None)
+        return ret
+
+    async def full_data(self, rows: list[FullDataCoSpecSchema]) -> list[int]:
+        """
+        Fills `rows` from the precomputed fulldata_block rows:
+          1. tn2lrn rows (per NPA) | pool block and NPANXX rows of all TNs
+          2. NPANXX rows of the LRNs ported elsewhere | SPID names of the ported TNs
+        Returns the indexes of the TNs whose NPANXX has no rows, for full_data_live.
+        """
+        ntns = self.ntns
+        (tn2lrn, (blocks, nxxs)) = await fan_out(
+            self.session,
+            lambda s: get_TN2LRN_by_TNs(ntns, s),
+            lambda s: get_FullData_by_Blocks({ntn.npanxxx for ntn in ntns}, {ntn.npanxx for ntn in ntns}, s),
+        )
+
+        live, ported = [], []
+        for i, ntn in enumerate(ntns):
+            block, nxx = blocks.get(ntn.npanxxx), nxxs.get(ntn.npanxx)
+            if block is None and nxx is None:
+                live.append(i)
+            elif ntn.ten_digit in tn2lrn:
+                ported.append(i)
+            else:
+                fillFromBlock(rows[i], ntn, block, block or nxx)
+                self.filled.add(i)
+
+        if ported:
+            records = [tn2lrn[ntns[i].ten_digit] for i in ported]
+            missing = {get_NPANXX(record.lrn) for record in records} - nxxs.keys()
+            spids = {record.spid for record in records if record.spid}
+            lrn_nxxs, spid_names = await fan_out(
+                self.session,
+                lambda s: get_FullData_by_Blocks(set(), missing, s),
+                lambda s: get_SPID_Names(spids, s),
+            )
+            nxxs.update(lrn_nxxs[1])
+            for i, record in zip(ported, records):
+                fillPorted(rows[i], ntns[i], record, nxxs.get(get_NPANXX(record.lrn)), nxxs.get(ntns[i].npanxx),
+                           (spid_names.get(record.spid) or "") if record.spid else "")
+                self.filled.add(i)
+        return live
+
+    async def full_data_live(self, rows: list[FullDataCoSpecSchema], indexes: list[int]):
+        """
+        Fills rows[indexes] from the live tables, as fillFullDataCoSpecLive does per TN:
+          1. tn2lrn rows (per NPA) | pool blocks | LERG6 rows of the TNs' NPANXXs
+          2. LERG6 rows of the LRNs ported elsewhere | SPID names | simplified names of the TNs' carriers
+          3. simplified names of the serving carriers not looked up yet
+        """
+        ntns = [self.ntns[i] for i in indexes]
+        (tn2lrn, pool, lerg6) = await fan_out(
+            self.session,
+            lambda s: get_TN2LRN_by_TNs(ntns, s),
+            lambda s: get_NumberPool_by_Blocks({ntn.npanxxx for ntn in ntns}, s),
+            lambda s: get_Lerg6_by_NPANXXs({ntn.npanxx for ntn in ntns}, s),
+        )
+
+        records = [tn2lrn.get(ntn.ten_digit) or pool.get(ntn.npanxxx) for ntn in ntns]
+        missing = {get_NPANXX(record.lrn) for record in records if record is not None} - lerg6.keys()
+        spids = {record.spid for record in records if record is not None and record.spid}
+        names = {row.co_spec_name for row in lerg6.values()}
+        lrn_lerg6, spid_names, simple_names = await fan_out(
+            self.session,
+            lambda s: get_Lerg6_by_NPANXXs(missing, s),
+            lambda s: get_SPID_Names(spids, s),
+            lambda s: get_Simple_Names(names, s),
+        )
+        lerg6.update(lrn_lerg6)
+
+        for i, ntn, record in zip(indexes, ntns, records):
+            fillLive(rows[i], ntn, record, lerg6, spid_names, simple_names)
+        names = {rows[i].co_spec_name for i in indexes} - names
+        simple_names.update(await get_Simple_Names(names, self.session))
+        for i in indexes:
+            rows[i].simplified_name = simple_names.get(rows[i].co_spec_name) or ""
+            self.filled.add(i)
+
+    # NNMP of every row (0 unless CLEC), as get_nnmp computes it
+    async def nnmps(self, rows: list[FullDataCoSpecSchema]) -> list[int]:
+        nnmps = await get_NNMPs({row.co_spec_name for row in rows if row.category == "CLEC"}, self.session)
+        return [(nnmps.get(row.co_spec_name.upper()) or 0) if row.category == "CLEC" else 0 for row in rows]
+
+    async def lrn_jurisdiction(self, rows: list[LRNwithJurisdictionSchema], cns: list[NormalizedTN]):
+        """
+        Fills `rows` (LRN, the LRN's LERG6 data and the cn -> tn jurisdiction):
+          1. tn2lrn rows (per NPA) | pool blocks | LERG6 rows of the TNs' and cns' NPANXXs
+          2. LERG6 rows of the LRNs ported elsewhere | local table pairs
+        """
+        ntns = self.ntns
+        (tn2lrn, pool, lerg6) = await fan_out(
+            self.session,
+            lambda s: get_TN2LRN_by_TNs(ntns, s),
+            lambda s: get_NumberPool_by_Blocks({ntn.npanxxx for ntn in ntns}, s),
+            lambda s: get_Lerg6_by_NPANXXs({ntn.npanxx for ntn in ntns} | {cn.npanxx for cn in cns}, s),
+        )
+
+        lrns = []
+        for ntn in ntns:
+            record = tn2lrn.get(ntn.ten_digit) or pool.get(ntn.npanxxx)
+            lrns.append(record.lrn if record is not None else None)
+
+        missing = {get_NPANXX(lrn) for lrn in lrns if lrn is not None} - lerg6.keys()
+        pairs = set()
+        for ntn, cn in zip(ntns, cns):
+            lerg6_from, lerg6_to = lerg6.get(cn.npanxx), lerg6.get(ntn.npanxx)
+            if lerg6_from is not None and lerg6_to is not None and not sameRateCenter(lerg6_from, lerg6_to):
+                pairs.add(localKey(lerg6_from, lerg6_to))
+        lrn_lerg6, local = await fan_out(
+            self.session,
+            lambda s: get_Lerg6_by_NPANXXs(missing, s),
+            lambda s: get_Local_Pairs(pairs, s),
+        )
+        lerg6.update(lrn_lerg6)
+
+        for row, ntn, cn, lrn in zip(rows, ntns, cns, lrns):
+            row_lerg6 = lerg6.get(ntn.npanxx)
+            if lrn is not None:
+                row.lrn = setPrefix(lrn, ntn.prefix)
+                row_lerg6 = lerg6.get(get_NPANXX(lrn))
+            if row_lerg6 is not None:
+                row.ocn = row_lerg6.ocn
+                row.lata = row_lerg6.lata
+                row.state = row_lerg6.state
+                row.rc = row_lerg6.rc
+                row.lec = row_lerg6.ocnname
+                row.lecType = row_lerg6.category
+            row.jurisdiction = jurisdictionOf(lerg6.get(cn.npanxx), lerg6.get(ntn.npanxx), local)
+
+#-----------------------------------------------------------------------------------------------------
+# Row fillers
+#-----------------------------------------------------------------------------------------------------
+def fillFromBlock(row: FullDataCoSpecSchema, ntn: NormalizedTN, block, data):
+    if block is not None:
+        row.spid = block.spid
+        row.lrn = setPrefix(block.lrn, ntn.prefix)
+        row.ported_date = block.ported_date
+        row.spid_name = block.spid_name
+        row.osimplified_name = block.osimplified_name
+    fillFromNPANXX(row, data)
+
+def fillPorted(row: FullDataCoSpecSchema, ntn: NormalizedTN, record, lrn_nxx, own_nxx, spid_name: str):
+    row.spid = record.spid
+    row.lrn = setPrefix(record.lrn, ntn.prefix)
+    row.ported_date = record.activationtimestamp
+    row.spid_name = spid_name
+    if own_nxx is not None:
+        row.osimplified_name = own_nxx.simplified_name
+    fillFromNPANXX(row, lrn_nxx)
+
+def fillLive(row: FullDataCoSpecSchema, ntn: NormalizedTN, record, lerg6: dict, spid_names: dict, simple_names: dict):
+    own_lerg6 = row_lerg6 = lerg6.get(ntn.npanxx)
+    if record is not None:
+        row.spid = record.spid
+        row.lrn = setPrefix(record.lrn, ntn.prefix)
+        row.ported_date = record.activationtimestamp
+        row_lerg6 = lerg6.get(get_NPANXX(record.lrn))
+        if own_lerg6 is not None:
+            row.osimplified_name = simple_names.get(own_lerg6.co_spec_name) or ""
+    if row.spid:
+        row.spid_name = spid_names.get(row.spid) or ""
+    if row_lerg6 is not None:
+        row.ocn = row_lerg6.ocn
+        row.ocn_name = row_lerg6.ocnname
+        row.category = row_lerg6.category
+        row.co_spec_name = row_lerg6.co_spec_name
+
+def fillFromNPANXX(row: FullDataCoSpecSchema, data):
+    if data is not None:
+        row.ocn = data.ocn
+        row.ocn_name = data.ocn_name
+        row.category = data.category
+        row.co_spec_name = data.co_spec_name
+        row.simplified_name = data.simplified_name
+
+def sameRateCenter(lerg6_from, lerg6_to) -> bool:
+    return lerg6_from.state == lerg6_to.state and lerg6_from.lata == lerg6_to.lata and lerg6_from.rc == lerg6_to.rc
+
+def localKey(lerg6_from, lerg6_to) -> tuple:
+    return (lerg6_from.rc, lerg6_from.state, lerg6_from.lata, lerg6_to.rc, lerg6_to.state, lerg6_to.lata)
+
+# Function to classify a call as findJurisdiction does, with the local pairs looked up in bulk -------------
+def jurisdictionOf(lerg6_from, lerg6_to, local: set[tuple]) -> str:
+    if lerg6_from is None or lerg6_to is None:
+        return "Unknown"
+    if sameRateCenter(lerg6_from, lerg6_to) or localKey(lerg6_from, lerg6_to) in local:
+        return "Local"
+    if lerg6_from.state == lerg6_to.state:
+        return "Intrastate"
+    return "Interstate"
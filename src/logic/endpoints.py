@@ -2,6 +2,7 @@ import os
 
 from sqlalchemy import select, delete
 from src.models.users import EndpointsModel
+from src.databases.invalidation import publish, RatesChanged
 
 # Function to get a list of endpoints with pagination -----------------------------------------------------------
 async def get_endpoint_list(session, range_from=0, range_to=24, filter_dict={}, sort_list=[]):
@@ -48,7 +49,7 @@ async def get_endpoint_list(session, range_from=0, range_to=24, filter_dict={},
                 if field is not None and value:
                     query = query.where(field.ilike(f"%{value}%"))
 
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_endpoint_list")
     ret = result.all()
     total_count = len(ret)
 
@@ -75,7 +76,7 @@ async def get_endpoint(session, endpoint_id):
 
     result = await session.execute(
         select(EndpointsModel)
-        .where(EndpointsModel.id == endpoint_id)
+        .where(EndpointsModel.id == endpoint_id), stage="db.get_endpoint"
     )
     ret = result.first()
 
@@ -111,7 +112,7 @@ async def create_endpoint(session, endpoint_data):
 async def update_endpointid(session, endpoint_id, endpoint_data):  
 
     # Fetch existing endpoint
-    existing_endpoint = await session.get(EndpointsModel, endpoint_id)
+    existing_endpoint = await session.get(EndpointsModel, endpoint_id, stage="db.update_endpointid")
     if not existing_endpoint:
        return {"error": "Endpoint not found"}
  
@@ -124,6 +125,9 @@ async def update_endpointid(session, endpoint_id, endpoint_data):
     await session.commit()
     await session.refresh(existing_endpoint)
 
+    # Rates are looked up by endpoint name, so a rename affects every product
+    await publish(RatesChanged(productid=None))
+
     return {
         "id": existing_endpoint.id,
         "endpoint": existing_endpoint.endpoint,
@@ -135,7 +139,7 @@ async def delete_endpointid(session, endpoint_id):
 
     result = await session.execute(
         select(EndpointsModel)
-        .where(EndpointsModel.id == endpoint_id)
+        .where(EndpointsModel.id == endpoint_id), stage="db.delete_endpointid"
     )
     ret = result.first()
 
@@ -144,8 +148,9 @@ async def delete_endpointid(session, endpoint_id):
 
     endpoint = ret[0]
 
-    await session.execute(delete(EndpointsModel).where(EndpointsModel.id == endpoint_id))
+    await session.execute(delete(EndpointsModel).where(EndpointsModel.id == endpoint_id), stage="db.delete_endpointid")
     await session.commit()
+    await publish(RatesChanged(productid=None))
 
     return {
         "id": endpoint.id,
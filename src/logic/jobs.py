@@ -0,0 +1,282 @@
+import io
+import os
+import csv
+import gzip
+import uuid
+import shutil
+import asyncio
+import logging
+
+from datetime import timedelta
+from typing import AsyncIterator, Optional
+from sqlalchemy import select, update, func, case
+from sqlalchemy.dialects.postgresql import insert
+from src.models.users import JobsModel, JobChunksModel
+from src.schemas.auth.users import UserEndpointSchema
+from src.schemas.numbering_v1 import is_valid_tn
+from src.logic.bulk import parse_bulk_line
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")                           # shared by the API nodes and job workers
+JOBS_CHUNK_SIZE = int(os.getenv("JOBS_CHUNK_SIZE", 10000))         # TNs per queued task
+JOBS_MAX_BYTES = int(os.getenv("JOBS_MAX_BYTES", 1 << 30))         # upload size limit
+JOBS_QUEUE = os.getenv("JOBS_QUEUE", "jobs:queue")
+JOBS_STALE_SECS = int(os.getenv("JOBS_STALE_SECS", 60))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 5))        # runs of a failing task before its job fails
+JOBS_RETRY_DELAY = float(os.getenv("JOBS_RETRY_DELAY", 1.0))       # seconds, doubled per attempt
+JOBS_ATTEMPTS = f"{JOBS_QUEUE}:attempts"                           # task -> failed attempts
+
+UNFINISHED = ("queued", "splitting", "running")
+_READ_BLOCK = 1 << 20
+
+#-----------------------------------------------------------------------------------------------------
+# Job files: JOBS_DIR/<id>/input, chunk-NNNNNN.txt (valid rows) and part-NNNNNN.csv.gz (results)
+#-----------------------------------------------------------------------------------------------------
+def job_dir(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+def input_path(job_id: str) -> str:
+    return os.path.join(job_dir(job_id), "input")
+
+def chunk_path(job_id: str, n: int) -> str:
+    return os.path.join(job_dir(job_id), f"chunk-{n:06d}.txt")
+
+def part_path(job_id: str, n: int) -> str:
+    return os.path.join(job_dir(job_id), f"part-{n:06d}.csv.gz")
+
+# Function to write a file atomically (a requeued task may write the same file concurrently) -------------
+def write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+# Function to remove the files of a job ---------------------------------------------------------------
+def remove_files(job_id: str):
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+
+# Async function to store an uploaded TN file, returns its size -----------------------------------------
+async def save_input(job_id: str, stream: AsyncIterator[bytes]) -> int:
+    os.makedirs(job_dir(job_id), exist_ok=True)
+    size = 0
+    with open(input_path(job_id), "wb") as f:
+        async for block in stream:
+            size += len(block)
+            if size > JOBS_MAX_BYTES:
+                raise ValueError(f"The file exceeds {JOBS_MAX_BYTES} bytes")
+            f.write(block)
+    return size
+
+# Function to split the uploaded file into chunk files of valid rows ------------------------------------
+def split_input(job_id: str, with_cn: bool) -> tuple[int, int, int]:
+    """
+    Reads the upload (CSV or text, one TN per line, optionally gzipped) and writes
+    JOBS_CHUNK_SIZE valid rows per chunk file. Returns (valid rows, invalid rows, chunks).
+    """
+    path = input_path(job_id)
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+
+    total = invalid = chunks = 0
+    rows = []
+    with (gzip.open if gzipped else open)(path, "rt", encoding="utf-8-sig", errors="replace", newline="") as f:
+        for n, line in enumerate(f):
+            item = parse_bulk_line(line.rstrip("\r\n"), first=n == 0)
+            if item is None:
+                continue
+            tn, cn = item
+            if not is_valid_tn(tn) or (with_cn and (cn is None or not is_valid_tn(cn))):
+                invalid += 1
+                continue
+            rows.append(f"{tn},{cn}" if with_cn else tn)
+            if len(rows) == JOBS_CHUNK_SIZE:
+                write_atomic(chunk_path(job_id, chunks), "\n".join(rows).encode())
+                total, chunks, rows = total + len(rows), chunks + 1, []
+    if rows:
+        write_atomic(chunk_path(job_id, chunks), "\n".join(rows).encode())
+        total, chunks = total + len(rows), chunks + 1
+    return total, invalid, chunks
+
+# Function to read the (tn, cn) rows of a chunk -----------------------------------------------------------
+def read_chunk(job_id: str, n: int) -> list[tuple[str, Optional[str]]]:
+    with open(chunk_path(job_id, n), encoding="utf-8") as f:
+        return [(tn, cn or None) for tn, _, cn in (line.rstrip("\n").partition(",") for line in f)]
+
+# Function to write the result rows of a chunk as one gzip member (the parts concatenate into one file) ----
+def write_part(job_id: str, n: int, header: Optional[list[str]], rows: list[list]):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    write_atomic(part_path(job_id, n), gzip.compress(buf.getvalue().encode(), compresslevel=6))
+
+# Async generator of the result file: the gzip members of the parts, in order -----------------------------
+async def read_result(job: JobsModel) -> AsyncIterator[bytes]:
+    if job.chunks == 0:
+        yield gzip.compress(b"")
+        return
+    for n in range(job.chunks):
+        with open(part_path(job.id, n), "rb") as f:
+            while block := await asyncio.to_thread(f.read, _READ_BLOCK):
+                yield block
+
+#-----------------------------------------------------------------------------------------------------
+# Queue: a Redis list of "split:<id>" and "chunk:<id>:<n>" tasks
+#-----------------------------------------------------------------------------------------------------
+def split_task(job_id: str) -> str:
+    return f"split:{job_id}"
+
+def chunk_task(job_id: str, n: int) -> str:
+    return f"chunk:{job_id}:{n}"
+
+async def enqueue(redis_client, *tasks: str):
+    if tasks:
+        await redis_client.lpush(JOBS_QUEUE, *tasks)
+
+# Async function to count a failed attempt of a task, returns the attempts so far ----------------------------
+async def task_failed(redis_client, task: str) -> int:
+    return await redis_client.hincrby(JOBS_ATTEMPTS, task, 1)
+
+# Async function to forget the failed attempts of a finished task ----------------------------------------------
+async def clear_attempts(redis_client, task: str):
+    await redis_client.hdel(JOBS_ATTEMPTS, task)
+
+#-----------------------------------------------------------------------------------------------------
+# Job state (Postgres)
+#-----------------------------------------------------------------------------------------------------
+# Async function to create a queued job ------------------------------------------------------------------
+async def create_job(session, job_id: str, userinfo: UserEndpointSchema, product: str) -> JobsModel:
+    job = JobsModel(
+        id=job_id,
+        userid=userinfo.uid,
+        product=product,
+        userinfo=userinfo.model_dump_json(),
+        status="queued",
+    )
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+# Async function to get a job, optionally only if it belongs to the user -----------------------------------
+async def get_job(session, job_id: str, userid: int = None) -> Optional[JobsModel]:
+    query = select(JobsModel).where(JobsModel.id == job_id)
+    if userid is not None:
+        query = query.where(JobsModel.userid == userid)
+    result = await session.execute(query, stage="db.get_job")
+    return result.scalar_one_or_none()
+
+# Async function to get the latest jobs of a user -----------------------------------------------------------
+async def get_jobs(session, userid: int, limit: int = 100) -> list[JobsModel]:
+    result = await session.execute(
+        select(JobsModel).where(JobsModel.userid == userid).order_by(JobsModel.datecreated.desc()).limit(limit), stage="db.get_jobs"
+    )
+    return list(result.scalars())
+
+# Async function to set the fields of an unfinished job ----------------------------------------------------
+async def _update_job(session, job_id: str, statuses: tuple, **values) -> Optional[JobsModel]:
+    result = await session.execute(
+        update(JobsModel)
+        .where(JobsModel.id == job_id, JobsModel.status.in_(statuses))
+        .values(dateupdated=func.now(), **values)
+        .returning(JobsModel), stage="db._update_job"
+    )
+    job = result.scalar_one_or_none()
+    await session.commit()
+    return job
+
+# Async function to claim the split of a queued job (None if another worker has it) ----------------------
+async def claim_split(session, job_id: str) -> Optional[JobsModel]:
+    return await _update_job(session, job_id, ("queued",), status="splitting")
+
+# Async function to put an interrupted split back in the queued state (to be retried) ---------------------------
+async def requeue_split(session, job_id: str) -> Optional[JobsModel]:
+    return await _update_job(session, job_id, ("splitting",), status="queued")
+
+# Async function to start resolving the chunks of a split job -------------------------------------------
+async def start_job(session, job_id: str, total: int, invalid: int, chunks: int) -> Optional[JobsModel]:
+    if chunks == 0:
+        return await _update_job(session, job_id, ("splitting",), status="done", total=total, invalid=invalid,
+                                 chunks=0, datefinished=func.now())
+    return await _update_job(session, job_id, ("splitting",), status="running", total=total, invalid=invalid, chunks=chunks)
+
+# Async function to fail an unfinished job -----------------------------------------------------------------
+async def fail_job(session, job_id: str, error: str) -> Optional[JobsModel]:
+    return await _update_job(session, job_id, UNFINISHED, status="failed", error=error[:1000], datefinished=func.now())
+
+# Async function to cancel an unfinished job ---------------------------------------------------------------
+async def cancel_job(session, job_id: str) -> Optional[JobsModel]:
+    return await _update_job(session, job_id, UNFINISHED, status="cancelled", datefinished=func.now())
+
+# Async function to mark a finished job deleted (its files are removed) --------------------------------------
+async def delete_job(session, job_id: str) -> Optional[JobsModel]:
+    return await _update_job(session, job_id, ("done",), status="deleted")
+
+# Async function to tell whether a chunk is resolved -------------------------------------------------------
+async def chunk_done(session, job_id: str, n: int) -> bool:
+    return await session.get(JobChunksModel, (job_id, n), stage="db.chunk_done") is not None
+
+# Async function to claim a resolved chunk, uncommitted until complete_chunk ---------------------------------
+async def claim_chunk(session, job_id: str, n: int, rows: int, billed: int) -> bool:
+    """
+    Returns False if the chunk was already recorded (a requeued duplicate). A duplicate
+    running at the same time waits on the uncommitted row, then gets False too, so
+    each chunk is counted and billed once.
+    """
+    result = await session.execute(
+        insert(JobChunksModel)
+        .values(jobid=job_id, chunk=n, rows=rows, billed=billed)
+        .on_conflict_do_nothing()
+        .returning(JobChunksModel.chunk), stage="db.claim_chunk"
+    )
+    if result.scalar_one_or_none() is None:
+        await session.rollback()
+        return False
+    return True
+
+# Async function to record the job's progress and commit a claimed chunk -----------------------------------
+async def complete_chunk(session, job_id: str, rows: int):
+    """The last chunk finishes the job."""
+    finished = JobsModel.chunks_done + 1 >= JobsModel.chunks
+    await session.execute(
+        update(JobsModel)
+        .where(JobsModel.id == job_id, JobsModel.status == "running")
+        .values(
+            chunks_done=JobsModel.chunks_done + 1,
+            processed=JobsModel.processed + rows,
+            dateupdated=func.now(),
+            status=case((finished, "done"), else_=JobsModel.status),
+            datefinished=case((finished, func.now()), else_=JobsModel.datefinished),
+        ), stage="db.complete_chunk"
+    )
+    await session.commit()
+
+# Async function to get the tasks of unfinished jobs that are neither queued nor in flight -----------------
+async def lost_tasks(session) -> list[str]:
+    """
+    For recovery once the queue and all workers are idle (e.g. Redis restarted without
+    persistence): splits of queued or interrupted jobs and the unresolved chunks of
+    running ones, for jobs not updated in JOBS_STALE_SECS.
+    """
+    stale = func.now() - timedelta(seconds=JOBS_STALE_SECS)
+    result = await session.execute(
+        update(JobsModel)
+        .where(JobsModel.status.in_(("queued", "splitting")), JobsModel.dateupdated < stale)
+        .values(status="queued", dateupdated=func.now())
+        .returning(JobsModel.id), stage="db.lost_tasks"
+    )
+    tasks = [split_task(job_id) for job_id in result.scalars()]
+
+    result = await session.execute(
+        update(JobsModel)
+        .where(JobsModel.status == "running", JobsModel.dateupdated < stale)
+        .values(dateupdated=func.now())
+        .returning(JobsModel.id, JobsModel.chunks), stage="db.lost_tasks"
+    )
+    for job_id, chunks in result.all():
+        done = set((await session.execute(select(JobChunksModel.chunk).where(JobChunksModel.jobid == job_id), stage="db.lost_tasks")).scalars())
+        tasks.extend(chunk_task(job_id, n) for n in range(chunks) if n not in done)
+    await session.commit()
+    return tasks
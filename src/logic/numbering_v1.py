@@ -1,12 +1,14 @@
-from sqlalchemy import select, func
+from typing import Iterable, NamedTuple, Optional
+from sqlalchemy import select, func, or_, and_
 from src.models.numbering_v1  import Lerg6Model,LocalModel, SPIDNamesModel, SimpleCarrierNamesModel   
 from src.models.numbering_v1  import Numberpoolblock, NNMPModel
-from src.models.numbering_v1  import create_dynamic_model
+from src.models.numbering_v1  import create_dynamic_model, FullDataBlockModel
 from src.schemas.numbering_v1 import LRNInfoSchema
+from src.utils.portedfilter   import maybe_ported, false_positive
 
 # Function to get Lerg6 record by NPANXX -------------------------------------------------
 async def get_Lerg6_by_NPANXX(dial_code: str, session):
-    ret = await session.scalar(select(Lerg6Model).where(Lerg6Model.npanxxx == dial_code))
+    ret = await session.scalar(select(Lerg6Model).where(Lerg6Model.npanxxx == dial_code), stage="db.get_Lerg6_by_NPANXX")
     return ret 
 
 # Function to get Local jurisdiction information -----------------------------------------
@@ -19,60 +21,63 @@ async def get_Local(lerg6_from: Lerg6Model, lerg6_to: Lerg6Model, session):
             LocalModel.to_rc_abbrev == lerg6_to.rc,
             LocalModel.to_state == lerg6_to.state,
             LocalModel.to_lata == lerg6_to.lata
-        )
+        ), stage="db.get_Local"
     )
     return ret
 
 # Function to get Local Routing Number (LRN) Information by Telephone Number (TN) ---------
-async def get_LRN_Info_by_TN(tn: str, session):
+async def get_LRN_Info_by_TN(ntn: "NormalizedTN", session):
     """
     Retrieves the Local Routing Number (LRN) information for a given telephone number (TN).
     
     Args:
-        tn (str): The telephone number in E.164 format.
+        ntn (NormalizedTN): The normalized telephone number.
         session: The database session to execute the query.
     
     Returns:
         TN2LRNxxx: The LRN record associated with the TN, or None if not found.
     """
-    ten_digit = get_10digitNumber(tn)
-    npa = ten_digit[:3]
-    TN2LRNDynamicModel = create_dynamic_model("tn2lrn" + npa)
+    # No round trip when the NPA's ported-TN filter says the TN is not ported
+    suffix = ntn.as_int % 10_000_000
+    if not maybe_ported(ntn.npa, suffix):
+        return None
+    TN2LRNDynamicModel = create_dynamic_model("tn2lrn" + ntn.npa)
     ret = await session.scalar(
-        select(TN2LRNDynamicModel).where(TN2LRNDynamicModel.tn == ten_digit)
+        select(TN2LRNDynamicModel).where(TN2LRNDynamicModel.tn == ntn.ten_digit), stage="db.get_LRN_Info_by_TN"
     )
+    if ret is None:
+        false_positive(ntn.npa)
     return ret
 
 # Function to get Local Routing Number (LRN) Information by NPANXX -------------------------
-async def get_LRN_NumberPool_by_TN(tn: str, session):
+async def get_LRN_NumberPool_by_TN(ntn: "NormalizedTN", session):
     """ Retrieves the Local Routing Number (LRN) information for a given NPANXX.
     Args:
-        npanxxx (str): The NPANXX.
+        ntn (NormalizedTN): The normalized telephone number (its NPANXXX is used).
         session: The database session to execute the query.
     Returns:
         Numberpoolblock: The LRN record associated with the NPANXX, or None if not found.
     """ 
-    ten_digit = get_10digitNumber(tn)
-    npanxxx = ten_digit[:7]
     ret = await session.scalar(
-        select(Numberpoolblock).where(Numberpoolblock.npanxxx == npanxxx)
+        select(Numberpoolblock).where(Numberpoolblock.npanxxx == ntn.npanxxx), stage="db.get_LRN_NumberPool_by_TN"
     )
     return ret
 
 #  Function to get LRN information by telephone number (TN) ---------------------------------
-async def get_LRN_Info(tn: str, session)-> LRNInfoSchema:
+async def get_LRN_Info(ntn: "NormalizedTN", session)-> LRNInfoSchema:
     """Retrieves the Local Routing Number (LRN) information for a given telephone number (TN).
     
     Args:
-        tn (str): The telephone number in E.164 format.
+        ntn (NormalizedTN): The normalized telephone number.
         session: The database session to execute the query.
     
     Returns:
         LRN record associated with the TN, or None if not found.
     """
-    lrn_record = await get_LRN_Info_by_TN(tn, session)
+    tn = ntn.tn
+    lrn_record = await get_LRN_Info_by_TN(ntn, session)
     if lrn_record is None:
-        lrn_record = await get_LRN_NumberPool_by_TN(tn, session)
+        lrn_record = await get_LRN_NumberPool_by_TN(ntn, session)
         if lrn_record is not None:
             return LRNInfoSchema (
                 tn=tn,
@@ -109,6 +114,36 @@ async def get_LRN_Info(tn: str, session)-> LRNInfoSchema:
         )
     return None
 
+# Function to get the precomputed full data of a TN's pool block and NPANXX -------------
+async def get_FullData_by_Block(ntn: "NormalizedTN", session) -> tuple[Optional[FullDataBlockModel], Optional[FullDataBlockModel]]:
+    """Retrieves the fulldata_block rows of a TN in one query.
+    Args:
+        ntn (NormalizedTN): The normalized telephone number (its NPANXXX and NPANXX are used).
+        session: The database session to execute the query.
+    Returns:
+        tuple: The pool block row and the NPANXX row, each None if not found.
+    """
+    result = await session.execute(
+        select(FullDataBlockModel).where(or_(
+            and_(FullDataBlockModel.npanxxx == ntn.npanxxx, FullDataBlockModel.pooled.is_(True)),
+            and_(FullDataBlockModel.npanxxx == ntn.npanxx, FullDataBlockModel.pooled.is_(False)),
+        )), stage="db.get_FullData_by_Block"
+    )
+    block = nxx = None
+    for row in result.scalars():
+        if row.pooled:
+            block = row
+        else:
+            nxx = row
+    return block, nxx
+
+# Function to get the precomputed full data of an NPANXX --------------------------------
+async def get_FullData_by_NPANXX(npanxx: str, session) -> Optional[FullDataBlockModel]:
+    ret = await session.scalar(
+        select(FullDataBlockModel).where(FullDataBlockModel.npanxxx == npanxx, FullDataBlockModel.pooled.is_(False)), stage="db.get_FullData_by_NPANXX"
+    )
+    return ret
+
 # Function to get SPID name by SPID ----------------------------------------------------
 async def get_SPID_Name(spid: str, session):
     """Retrieves the SPID name for a given SPID.
@@ -121,7 +156,7 @@ async def get_SPID_Name(spid: str, session):
         str: The name of the service provider, or None if not found.
     """
     spid_name = await session.scalar(
-        select(SPIDNamesModel.spidname).where(SPIDNamesModel.spid == spid)
+        select(SPIDNamesModel.spidname).where(SPIDNamesModel.spid == spid), stage="db.get_SPID_Name"
     )
     return spid_name if spid_name else ""
 
@@ -137,7 +172,7 @@ async def get_NNMP(co_spec_name: str, session):
         str: The NNMP, or None if not found.
     """
     nnmp = await session.scalar(
-        select(NNMPModel.nnmp).where(func.upper(NNMPModel.co_spec_name) == co_spec_name.upper())
+        select(NNMPModel.nnmp).where(func.upper(NNMPModel.co_spec_name) == co_spec_name.upper()), stage="db.get_NNMP"
     )
     return nnmp if nnmp else 0
 
@@ -151,7 +186,7 @@ async def get_Simple_Name(co_spec_name: str, session):
         str: The simplified name, or None if not found.
     """
     sn_name = await session.scalar(
-        select(SimpleCarrierNamesModel.simplified_name).where(SimpleCarrierNamesModel.co_spec_name == co_spec_name)
+        select(SimpleCarrierNamesModel.simplified_name).where(SimpleCarrierNamesModel.co_spec_name == co_spec_name), stage="db.get_Simple_Name"
     )
     return sn_name if sn_name else ""
 
@@ -166,4 +201,51 @@ def get_NPANXX(tn: str) -> str:
     ten_digit = get_10digitNumber(tn)
     return ten_digit[:6]
 
+# Function to put the TN's prefix in front of a 10-digit number -------------------------
+def setPrefix(tn: str, prefix: str) -> str:
+    """
+    Set the prefix for the TN if it is not already set.
+    """
+    return prefix + tn
+
+# Normalized telephone number, parsed once per request --------------------------------
+class NormalizedTN(NamedTuple):
+    tn: str          # as received
+    prefix: str      # '', '1' or '+1'
+    ten_digit: str
+    npa: str
+    nxx: str
+    npanxx: str      # LERG6 key
+    npanxxx: str     # number pool block key
+    as_int: int
 
+# Function to normalize a telephone number ---------------------------------------------
+def normalize_tn(tn: str) -> NormalizedTN:
+    """
+    Parses a validated TN (E.164, 10-digit, or 1 followed by 10 digits) once into all
+    the forms the lookups need.
+    """
+    prefix = ""
+    if tn[0] == "+":
+        prefix = "+1" if tn.startswith("+1") else ""
+    elif tn[0] == "1":
+        prefix = "1"
+    ten_digit = tn[-10:]
+    return NormalizedTN(tn, prefix, ten_digit, ten_digit[:3], ten_digit[3:6], ten_digit[:6], ten_digit[:7], int(ten_digit))
+
+# Function to normalize a batch of telephone numbers -----------------------------------
+def normalize_tns(tns: Iterable[str]) -> list[NormalizedTN]:
+    """
+    Batch variant of normalize_tn; the per-item work is a handful of slices, so the
+    batch form mainly saves the per-call overhead in bulk lookups.
+    """
+    new = NormalizedTN
+    ret = []
+    append = ret.append
+    for tn in tns:
+        first = tn[0]
+        prefix = ("+1" if tn.startswith("+1") else "") if first == "+" else ("1" if first == "1" else "")
+        ten_digit = tn[-10:]
+        npanxx = ten_digit[:6]
+        append(new(tn, prefix, ten_digit, npanxx[:3], npanxx[3:], npanxx, ten_digit[:7], int(ten_digit)))
+    return ret
@@ -3,6 +3,7 @@ import logging
 from sqlalchemy import select, delete
 from src.models.users import RatesModel, ProductsModel, EndpointsModel, UserSettingsModel
 from src.logic.utilities import normalize_date_for_pg, normalize_str_date, normalize_str_expdate
+from src.databases.invalidation import publish, RatesChanged
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -52,7 +53,7 @@ async def get_product_list(session, range_from=0, range_to=24, filter_dict={}, s
                 if field is not None and value:
                     query = query.where(field.ilike(f"%{value}%"))
 
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_product_list")
     ret = result.all()
     total_count = len(ret)
 
@@ -79,7 +80,7 @@ async def get_product(session, product_id):
 
     result = await session.execute(
         select(ProductsModel)
-        .where(ProductsModel.id == product_id)
+        .where(ProductsModel.id == product_id), stage="db.get_product"
     )
     ret = result.first()
 
@@ -95,13 +96,15 @@ async def get_product(session, product_id):
         .where(RatesModel.productid == product_id)
         .order_by(EndpointsModel.endpoint.asc())
     )
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_product")
     ret = result.all()
     rates = [
         {
             "id": row[0].id,
             "endpointid": row[0].endpointid,
             "rate": row[0].rate,
+            "ratelimit": row[0].ratelimit,
+            "burst": row[0].burst,
             "dateeff": normalize_str_date(str(row[0].dateeff)) if row[0].dateeff is not None else None,
             "dateexp": normalize_str_expdate(str(row[0].dateexp)) if row[0].dateexp is not None else None
         }
@@ -136,7 +139,7 @@ async def create_product(session, product_data):
 async def update_productid(session, product_id, product_data):  
 
     # Fetch existing product
-    existing_product = await session.get(ProductsModel, product_id)
+    existing_product = await session.get(ProductsModel, product_id, stage="db.update_productid")
     if not existing_product:
        return {"error": "Product not found"}
  
@@ -148,7 +151,7 @@ async def update_productid(session, product_id, product_data):
     if "rates" in product_data:
         result = await session.execute(
             select(RatesModel.id)
-            .where(RatesModel.productid == product_id)
+            .where(RatesModel.productid == product_id), stage="db.update_productid"
         )
         existing_ids = {row[0] for row in result.all()}
         incoming_ids = set()
@@ -164,9 +167,9 @@ async def update_productid(session, product_id, product_data):
 
             if rate_id:
                 incoming_ids.add(rate_id)
-                existing_rate = await session.get(RatesModel, rate_id)
+                existing_rate = await session.get(RatesModel, rate_id, stage="db.update_productid")
                 if existing_rate:
-                    for field in ["endpointid", "rate", "dateeff", "dateexp"]:
+                    for field in ["endpointid", "rate", "ratelimit", "burst", "dateeff", "dateexp"]:
                         if field in rate_data:
                             setattr(existing_rate, field, rate_data[field])
             else:
@@ -174,6 +177,8 @@ async def update_productid(session, product_id, product_data):
                     productid=product_id,
                     endpointid=rate_data.get("endpointid"),
                     rate=rate_data.get("rate"),
+                    ratelimit=rate_data.get("ratelimit"),
+                    burst=rate_data.get("burst"),
                     dateeff=rate_data.get("dateeff"),
                     dateexp=rate_data.get("dateexp")
                 )
@@ -183,12 +188,13 @@ async def update_productid(session, product_id, product_data):
         ids_to_delete = list(existing_ids - incoming_ids)
         if ids_to_delete:
             await session.execute(
-                delete(RatesModel).where(RatesModel.id.in_(ids_to_delete))
+                delete(RatesModel).where(RatesModel.id.in_(ids_to_delete)), stage="db.update_productid"
             )
 
     session.add(existing_product)
     await session.commit()
     await session.refresh(existing_product)
+    await publish(RatesChanged(productid=product_id))
 
     return {
         "id": existing_product.id,
@@ -201,7 +207,7 @@ async def delete_productid(session, product_id):
 
     result = await session.execute(
         select(ProductsModel)
-        .where(ProductsModel.id == product_id)
+        .where(ProductsModel.id == product_id), stage="db.delete_productid"
     )
     ret = result.first()
 
@@ -213,16 +219,17 @@ async def delete_productid(session, product_id):
     # Check if a product assigned to any users
     result = await session.execute(
         select(UserSettingsModel)
-        .where(UserSettingsModel.productid == product_id)
+        .where(UserSettingsModel.productid == product_id), stage="db.delete_productid"
     )
     ret = result.first()
     if ret:
         return  {"error" : "Cannot delete product assigned to users"}
 
     # Delete associated rates in one DB call, then delete product
-    await session.execute(delete(RatesModel).where(RatesModel.productid == product_id))
-    await session.execute(delete(ProductsModel).where(ProductsModel.id == product_id))
+    await session.execute(delete(RatesModel).where(RatesModel.productid == product_id), stage="db.delete_productid")
+    await session.execute(delete(ProductsModel).where(ProductsModel.id == product_id), stage="db.delete_productid")
     await session.commit()
+    await publish(RatesChanged(productid=product_id))
 
     return {
         "id": product.id,
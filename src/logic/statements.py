@@ -7,7 +7,7 @@ from src.models.users import UserProfilesModel, EndpointsModel, EndpointStatsMod
 from sqlalchemy import func
 
 from datetime import datetime, timedelta
-from src.logic.utilities import normalize_date_for_pg, normalize_str_date, normalize_str_expdate
+from src.logic.utilities import normalize_date_for_pg, normalize_str_date, normalize_str_expdate, column_in_timezone, to_session_time
 
 # Function to get a list of users with pagination -----------------------------------------------------------
 async def get_users_statinfo(session, range_from=0, range_to=24, filter_dict={}, sort_list=[]):
@@ -53,7 +53,7 @@ async def get_users_statinfo(session, range_from=0, range_to=24, filter_dict={},
                 if field is not None and value:
                     query = query.where(field.ilike(f"%{value}%"))
 
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_users_statinfo")
     ret = result.all()
     total_count = len(ret)
 
@@ -89,7 +89,7 @@ async def get_statement(session,user_id):
 
     result = await session.execute(
         select(UserProfilesModel)
-        .where(UserProfilesModel.id == user_id)
+        .where(UserProfilesModel.id == user_id), stage="db.get_statement"
     )
     ret = result.first()
 
@@ -100,7 +100,7 @@ async def get_statement(session,user_id):
 
     result = await session.execute(
         select(func.max(EndpointStatsModel.calldate))
-        .where(EndpointStatsModel.userid == user_id)
+        .where(EndpointStatsModel.userid == user_id), stage="db.get_statement"
     )
     last_call = result.scalar()
     if last_call:
@@ -122,9 +122,6 @@ async def get_statement(session,user_id):
 
 # Function to get user summaries with pagination -----------------------------------------------------------
 async def get_user_summaries(session, range_from=0, range_to=24, filter_dict={}):
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
 
     query = select(EndpointsModel.id, EndpointsModel.endpoint, EndpointsModel.description, func.sum(EndpointStatsModel.count), func.sum(EndpointStatsModel.amount)).join(EndpointStatsModel, EndpointsModel.id == EndpointStatsModel.endpointid)
            
@@ -162,7 +159,7 @@ async def get_user_summaries(session, range_from=0, range_to=24, filter_dict={})
                         return {"data": [], "total": 0}
                         
     query = query.order_by(EndpointsModel.endpoint).group_by(EndpointsModel.id, EndpointsModel.endpoint, EndpointsModel.description)
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_user_summaries")
     ret = result.all()
     total_count = len(ret)
 
@@ -201,9 +198,6 @@ async def get_user_summaries(session, range_from=0, range_to=24, filter_dict={})
 
 # Function to get monthly (30 days back from today ) summaries excluding test users -----------------------------------------------------------
 async def get_monthly_summaries(session):
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
 
     now = datetime.now()
     start_date = now - timedelta(days=30)
@@ -221,7 +215,7 @@ async def get_monthly_summaries(session):
         )
     )
 
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_monthly_summaries")
     ret = result.first()
     data = {
         "monthly_dips": ret[0] if ret[0] is not None else 0,
@@ -231,13 +225,12 @@ async def get_monthly_summaries(session):
     return data
 
 # Function to get monthly stats per day with pagination -----------------------------------------------------------
-async def get_monthly_stats_pday(session, range_from=0, range_to=50, filter_dict={},sort_list=[]):
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
+async def get_monthly_stats_pday(session, range_from=0, range_to=50, filter_dict={},sort_list=[], tz=None):
+
+    calldate = column_in_timezone(EndpointStatsModel.calldate, tz)
 
     query = select(
-        func.date(EndpointStatsModel.calldate).label("day"),
+        func.date(calldate).label("day"),
         func.sum(EndpointStatsModel.count).label("total_count"),
         func.sum(EndpointStatsModel.amount).label("total_amount")
     ) .select_from(UserProfilesModel).join(EndpointStatsModel, UserProfilesModel.id == EndpointStatsModel.userid).where(
@@ -251,18 +244,18 @@ async def get_monthly_stats_pday(session, range_from=0, range_to=50, filter_dict
             elif field_name ==  "endpointid":
                  query = query.where(EndpointStatsModel.endpointid == int(value))
             elif field_name ==  "from_date":
-                 from_date = normalize_date_for_pg(value)
+                 from_date = to_session_time(normalize_date_for_pg(value), tz)
                  query = query.where(EndpointStatsModel.calldate >= from_date)
             elif field_name ==  "to_date":
-                 to_date = normalize_date_for_pg(value)
+                 to_date = to_session_time(normalize_date_for_pg(value), tz)
                  query = query.where(EndpointStatsModel.calldate < to_date)
                   
     query = query.group_by(
-        func.date(EndpointStatsModel.calldate)
+        func.date(calldate)
     )
 
-    query = query.order_by(func.date(EndpointStatsModel.calldate).asc())
-    result = await session.execute(query)
+    query = query.order_by(func.date(calldate).asc())
+    result = await session.execute(query, stage="db.get_monthly_stats_pday")
     ret = result.all()
     total_count = len(ret)
 
@@ -284,15 +277,14 @@ async def get_monthly_stats_pday(session, range_from=0, range_to=50, filter_dict
     }
 
 # Function to get daily stats per 5 min with pagination -----------------------------------------------------------
-async def get_daily_stats_p5(session, range_from=0, range_to=300, filter_dict={},sort_list=[]):
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
+async def get_daily_stats_p5(session, range_from=0, range_to=300, filter_dict={},sort_list=[], tz=None):
+
+    calldate = column_in_timezone(EndpointStatsModel.calldate, tz)
 
     time_bucket = func.date_trunc(
         "minute",
-        func.date_trunc("hour", EndpointStatsModel.calldate)
-        + func.floor(func.extract("minute", EndpointStatsModel.calldate) / 5 + 1)
+        func.date_trunc("hour", calldate)
+        + func.floor(func.extract("minute", calldate) / 5 + 1)
         * text("interval '5 minutes'"),
     )
 
@@ -311,15 +303,15 @@ async def get_daily_stats_p5(session, range_from=0, range_to=300, filter_dict={}
             elif field_name ==  "endpointid":
                  query = query.where(EndpointStatsModel.endpointid == int(value))
             elif field_name ==  "from_date":
-                 from_date = normalize_date_for_pg(value)
+                 from_date = to_session_time(normalize_date_for_pg(value), tz)
                  query = query.where(EndpointStatsModel.calldate >= from_date)
             elif field_name ==  "to_date":
-                 to_date = normalize_date_for_pg(value)
+                 to_date = to_session_time(normalize_date_for_pg(value), tz)
                  query = query.where(EndpointStatsModel.calldate < to_date)
                   
     query = query.group_by(time_bucket)
     query = query.order_by(time_bucket.asc())
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_daily_stats_p5")
     ret = result.all()
     total_count = len(ret)
 
@@ -341,10 +333,10 @@ async def get_daily_stats_p5(session, range_from=0, range_to=300, filter_dict={}
     }
 
 # Function to get the latest dip information -----------------------------------------------------------
-async def get_latest_information(session):
+async def get_latest_information(session, tz=None):
 
-    query =  select(func.max(EndpointStatsModel.calldate))
-    result = await session.execute(query)
+    query =  select(func.max(column_in_timezone(EndpointStatsModel.calldate, tz)))
+    result = await session.execute(query, stage="db.get_latest_information")
        
     ret = result.first()
 
@@ -359,7 +351,7 @@ async def get_latest_information(session):
         ).where(
             EndpointStatsModel.calldate >= datetime.now() - timedelta(days=1)
         )
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_latest_information")
     rettotal = result.first()
     
     return {
@@ -371,11 +363,8 @@ async def get_latest_information(session):
 # Helper function to get MTD count for a user -----------------------------------------------------------
 async def get_mtd_count(user_id, session):
 
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
     start_date = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
     query = (
         select(func.sum(EndpointStatsModel.count), func.sum(EndpointStatsModel.amount))
         .where(
@@ -384,7 +373,7 @@ async def get_mtd_count(user_id, session):
         )
     )
 
-    ret = await session.execute(query)
+    ret = await session.execute(query, stage="db.get_mtd_count")
     result = ret.first()
     mtd_dips = result[0] if result[0] is not None else 0
     mtd_amount = float(result[1]) if result[1] is not None else 0.0
@@ -393,14 +382,11 @@ async def get_mtd_count(user_id, session):
 # Helper function to get Last Month count for a user -----------------------------------------------------------
 async def get_lastm_count(user_id, session):
 
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
     now = datetime.now()
     first_day_of_current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     last_month_end = first_day_of_current_month - timedelta(seconds=1)
     last_month_start = last_month_end.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
     query = (
         select(func.sum(EndpointStatsModel.count), func.sum(EndpointStatsModel.amount))
         .where(
@@ -410,7 +396,7 @@ async def get_lastm_count(user_id, session):
         )
     )
 
-    ret = await session.execute(query)
+    ret = await session.execute(query, stage="db.get_lastm_count")
     result = ret.first()
     lastm_dips = result[0] if result[0] is not None else 0
     lastm_amount = float(result[1]) if result[1] is not None else 0.0
@@ -419,11 +405,8 @@ async def get_lastm_count(user_id, session):
 # Helper function to get DTD count for a user -----------------------------------------------------------
 async def get_dtd_count(user_id, session):
 
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
     start_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
     query = (
         select(func.sum(EndpointStatsModel.count), func.sum(EndpointStatsModel.amount))
         .where(
@@ -432,7 +415,7 @@ async def get_dtd_count(user_id, session):
         )
     )
 
-    ret = await session.execute(query)
+    ret = await session.execute(query, stage="db.get_dtd_count")
     result = ret.first()
     dtd_dips = result[0] if result[0] is not None else 0
     dtd_amount = float(result[1]) if result[1] is not None else 0.0
@@ -440,13 +423,10 @@ async def get_dtd_count(user_id, session):
 
 # Helper function to get Last Day count for a user -----------------------------------------------------------
 async def get_ld_totals(user_id, session):
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
     start_date = datetime.now() - timedelta(days=1)
     start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
     query = (
         select(func.sum(EndpointStatsModel.count), func.sum(EndpointStatsModel.amount))
         .where(
@@ -456,7 +436,7 @@ async def get_ld_totals(user_id, session):
         )
     )
 
-    ret = await session.execute(query)
+    ret = await session.execute(query, stage="db.get_ld_totals")
     result = ret.first()
     ld_dips = result[0] if result[0] is not None else 0
     ld_amount = float(result[1]) if result[1] is not None else 0.0
@@ -1,15 +1,34 @@
 import os, logging
 
-from sqlalchemy import select, func, text, delete
+from sqlalchemy import select, func, delete, case
+from sqlalchemy.orm import aliased
 from src.models.users import UserSettingsModel, RatesModel, EndpointsModel, UserSettingsModel
 from src.models.users import UserProfilesModel, EndpointStatsModel, UserProfilesDelModel
 from src.schemas.auth.users import UserEndpointSchema
 from src.schemas.stats import DateRange
-from src.logic.utilities import normalize_date_for_pg, normalize_str_date, normalize_str_expdate
+from src.logic.utilities import normalize_date_for_pg, normalize_str_date, normalize_str_expdate, to_session_time
+from src.databases.invalidation import publish, UserChanged
+from src.auth.passwords import hash_password
 from datetime import datetime
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Function to get the seconds until the product settings of a user change (a scalar subquery) -----------------------
+def settings_change_secs(userid):
+    """
+    Seconds until the next dateeff or dateexp of the user's unexpired settings: until
+    then the product chosen by productpriority stays the same.
+    """
+    settings = aliased(UserSettingsModel)
+    boundary = case((settings.dateeff > func.now(), settings.dateeff), else_=settings.dateexp)
+    return (
+        select(func.extract("epoch", func.min(boundary) - func.localtimestamp()))
+        .where(settings.userid == userid, settings.dateexp > func.now())
+        .correlate_except(settings)
+        .scalar_subquery()
+    )
+
 # Function to check if the user has access to an endpoint -------------------------------------------------------------
 async def check_user_access(
     userid: int, 
@@ -26,13 +45,10 @@ async def check_user_access(
     Returns:
         bool: True if the user has access, False otherwise.
     """
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-
-    # Set timezone for the session (PostgreSQL only) 
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
 
     result = await session.execute(
-        select(UserSettingsModel.productid, EndpointsModel.id, UserProfilesModel.username, UserSettingsModel.ratio, RatesModel.rate)
+        select(UserSettingsModel.productid, EndpointsModel.id, UserProfilesModel.username, UserSettingsModel.ratio, RatesModel.rate,
+               RatesModel.ratelimit, RatesModel.burst)
         .join(RatesModel, UserSettingsModel.productid == RatesModel.productid)
         .join(EndpointsModel, RatesModel.endpointid == EndpointsModel.id)
         .join(UserProfilesModel, UserSettingsModel.userid == UserProfilesModel.id)
@@ -44,7 +60,7 @@ async def check_user_access(
             UserSettingsModel.dateeff <= func.now(),
             UserSettingsModel.dateexp > func.now()
         )
-        .order_by(UserSettingsModel.productpriority.desc())
+        .order_by(UserSettingsModel.productpriority.desc()), stage="db.check_user_access"
     )
     
     ret = result.first()
@@ -58,10 +74,68 @@ async def check_user_access(
             ip_address="",
             productid=ret[0],
             ratio=ret[3],
-            rate=ret[4]
+            rate=ret[4],
+            ratelimit=ret[5],
+            burst=ret[6]
         )
     return None
 
+# Function to get the active product and ratio of a user (signed into the access token) -------------------
+async def get_user_product(
+    userid: int,
+    session
+) -> Optional[tuple[int, float, float]]:
+
+    result = await session.execute(
+        select(UserSettingsModel.productid, UserSettingsModel.ratio, settings_change_secs(userid))
+        .where(
+            UserSettingsModel.userid == userid,
+            UserSettingsModel.dateeff <= func.now(),
+            UserSettingsModel.dateexp > func.now()
+        )
+        .order_by(UserSettingsModel.productpriority.desc()), stage="db.get_user_product"
+    )
+    ret = result.first()
+    if ret:
+        return ret[0], ret[1], float(ret[2])
+    return None
+
+# Function to get the endpoint id, rate and rate limit of a product for an endpoint -------------------------
+async def get_product_rate(
+    productid: int,
+    endpoint: str,
+    session
+) -> Optional[tuple[int, float, Optional[float], Optional[int]]]:
+
+    result = await session.execute(
+        select(EndpointsModel.id, RatesModel.rate, RatesModel.ratelimit, RatesModel.burst)
+        .join(EndpointsModel, RatesModel.endpointid == EndpointsModel.id)
+        .where(
+            RatesModel.productid == productid,
+            EndpointsModel.endpoint == endpoint,
+            RatesModel.dateeff <= func.now(),
+            RatesModel.dateexp > func.now()
+        ), stage="db.get_product_rate"
+    )
+    ret = result.first()
+    if ret:
+        return ret[0], ret[1], ret[2], ret[3]
+    return None
+
+# Function to get the active rates of every product (to prefill the rate cache) ---------------------------
+async def get_active_rates(session):
+
+    result = await session.execute(
+        select(RatesModel.productid, EndpointsModel.endpoint, EndpointsModel.id,
+               RatesModel.rate, RatesModel.ratelimit, RatesModel.burst)
+        .join(EndpointsModel, RatesModel.endpointid == EndpointsModel.id)
+        .where(
+            RatesModel.dateeff <= func.now(),
+            RatesModel.dateexp > func.now()
+        ), stage="db.get_active_rates"
+    )
+    return result.all()
+
 # Function to check if the user is a superuser  -----------------------------------------------------------  
 async def check_superuser_access(
     userid: int,    
@@ -79,7 +153,7 @@ async def check_superuser_access(
     result = await session.execute(
         select(UserProfilesModel.username)
         .where(UserProfilesModel.id == userid,
-               UserProfilesModel.issuperuser == True)
+               UserProfilesModel.issuperuser == True), stage="db.check_superuser_access"
     )
     ret = result.first()
     if ret:
@@ -92,7 +166,7 @@ def get_username_by_id (
     session
 ) -> str:
 
-    ret = session.scalar(select(UserProfilesModel.username).where(UserProfilesModel.id == userid))
+    ret = session.scalar(select(UserProfilesModel.username).where(UserProfilesModel.id == userid), stage="db.get_username_by_id")
     if ret is not None:
         return ret[0]
     return None  
@@ -100,16 +174,12 @@ def get_username_by_id (
 # Function to get user statistics for a given date range ----------------------------------------------------
 async def get_user_stats(userid: int,
                          dates: DateRange, 
-                         session):
-    
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-
-    # Convert to datetime objects
-    start_date = datetime.strptime(dates.start_date, "%Y-%m-%d %H:%M:%S")
-    end_date = datetime.strptime(dates.end_date, "%Y-%m-%d %H:%M:%S")
+                         session,
+                         tz: str = None):
 
-    # Set timezone for the session (PostgreSQL only)
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
+    # Convert to datetime objects (given in the report timezone, compared in the session timezone)
+    start_date = to_session_time(datetime.strptime(dates.start_date, "%Y-%m-%d %H:%M:%S"), tz)
+    end_date = to_session_time(datetime.strptime(dates.end_date, "%Y-%m-%d %H:%M:%S"), tz)
 
     result = await session.execute(
         select(EndpointsModel.endpoint, func.sum(EndpointStatsModel.count))
@@ -119,7 +189,7 @@ async def get_user_stats(userid: int,
             EndpointStatsModel.calldate >= start_date,
             EndpointStatsModel.calldate < end_date
         )
-        .group_by(EndpointsModel.endpoint)
+        .group_by(EndpointsModel.endpoint), stage="db.get_user_stats"
     )
 
     ret = result.all()
@@ -169,7 +239,7 @@ async def get_users(session, range_from=0, range_to=24, filter_dict={}, sort_lis
                 if field is not None and value:
                     query = query.where(field.ilike(f"%{value}%"))
 
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_users")
     ret = result.all()
     total_count = len(ret)
 
@@ -197,16 +267,9 @@ async def get_users(session, range_from=0, range_to=24, filter_dict={}, sort_lis
 
 # Function to create a new user -------------------------------------------------------------------------------
 async def create_user(session, user_data):
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-
-    # Hash the password using PostgreSQL crypt and gen_salt('md5')
+    # Hash the password with bcrypt in the password thread pool
     password_plain = user_data.get("password", "")
-    result = await session.execute(
-        text("SELECT crypt(:password, gen_salt('md5'))"),
-        {"password": password_plain}
-    )
-    hashed_password = result.scalar()
-
+    hashed_password = await hash_password(password_plain)
 
     new_user = UserProfilesModel(
         username=user_data.get("username"),
@@ -218,9 +281,6 @@ async def create_user(session, user_data):
         issuperuser=user_data.get("issuperuser", False)
     )
 
-    # Set timezone for the session (PostgreSQL only) 
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
-
     session.add(new_user)
     await session.commit()
     await session.refresh(new_user)
@@ -238,15 +298,13 @@ async def create_user(session, user_data):
 
 # Function to update an existing user -------------------------------------------------------------------------------
 async def update_user(session, user_id, user_data):
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-
     if user_data.get("datedeactivated"):
         user_data["datedeactivated"] = normalize_date_for_pg(user_data["datedeactivated"])
     else:
         user_data["datedeactivated"] = datetime(2222, 1, 1, 0, 0, 0)
 
     # Fetch the existing user
-    existing_user = await session.get(UserProfilesModel, user_id)
+    existing_user = await session.get(UserProfilesModel, user_id, stage="db.update_user")
     if not existing_user:
         raise ValueError("User not found")
 
@@ -255,20 +313,16 @@ async def update_user(session, user_id, user_data):
         if field in user_data:
             setattr(existing_user, field, user_data[field])
     
-    # If password is provided, hash it using PostgreSQL crypt and gen_salt('md5')
+    # If password is provided, hash it with bcrypt in the password thread pool
     if "password" in user_data and user_data["password"] :
         password_plain = user_data["password"]
-        result = await session.execute(
-            text("SELECT crypt(:password, gen_salt('md5'))"),
-            {"password": password_plain}
-        )
-        hashed_password = result.scalar()
+        hashed_password = await hash_password(password_plain)
         existing_user.password = hashed_password
 
     # Update user settings if provided
     if "usersettings" in user_data:
         result = await session.execute(
-            select(UserSettingsModel.id).where(UserSettingsModel.userid == user_id)
+            select(UserSettingsModel.id).where(UserSettingsModel.userid == user_id), stage="db.update_user"
         )
         existing_ids = {row[0] for row in result.all()}
         incoming_ids = set()
@@ -283,7 +337,7 @@ async def update_user(session, user_id, user_data):
 
             if setting_id:
                 incoming_ids.add(setting_id)
-                existing_setting = await session.get(UserSettingsModel, setting_id)
+                existing_setting = await session.get(UserSettingsModel, setting_id, stage="db.update_user")
                 if existing_setting:
                     for field in ["note", "ratio", "productpriority", "dateeff", "dateexp", "productid"]:
                         if field in us:
@@ -306,15 +360,13 @@ async def update_user(session, user_id, user_data):
         ids_to_delete = list(existing_ids - incoming_ids)
         if ids_to_delete:
             await session.execute(
-                delete(UserSettingsModel).where(UserSettingsModel.id.in_(ids_to_delete))
+                delete(UserSettingsModel).where(UserSettingsModel.id.in_(ids_to_delete)), stage="db.update_user"
             )
 
-    # Set timezone for the session (PostgreSQL only) 
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
-
     session.add(existing_user)
     await session.commit()
     await session.refresh(existing_user)
+    await publish(UserChanged(uid=user_id))
     
     return {
         "id": existing_user.id,
@@ -333,7 +385,7 @@ async def get_user(session, user_id):
 
     result = await session.execute(
         select(UserProfilesModel)
-        .where(UserProfilesModel.id == user_id)
+        .where(UserProfilesModel.id == user_id), stage="db.get_user"
     )
     ret = result.first()
 
@@ -343,7 +395,7 @@ async def get_user(session, user_id):
     user = ret[0]
 
     query = select(UserSettingsModel).where(UserSettingsModel.userid == user_id).order_by(UserSettingsModel.productpriority.desc())
-    result = await session.execute(query)
+    result = await session.execute(query, stage="db.get_user")
     ret = result.all()
     usersettings = [
         {
@@ -373,10 +425,8 @@ async def get_user(session, user_id):
 
 # Function to delete a user by ID -------------------------------------------------------------------------------
 async def delete_user(session, user_id):
-    pg_timezone = os.getenv("PG_TIMEZONE", "UTC")
-
     # Fetch the existing user
-    existing_user = await session.get(UserProfilesModel, user_id)
+    existing_user = await session.get(UserProfilesModel, user_id, stage="db.delete_user")
     if not existing_user:
          return {"error": "User not found"}
     
@@ -393,12 +443,11 @@ async def delete_user(session, user_id):
         datedeactivated=existing_user.datedeactivated
     )
 
-    # Set timezone for the session (PostgreSQL only) 
-    await session.execute(text(f"SET TIMEZONE = '{pg_timezone}'"))
     session.add(deleted_user)
-    await session.execute(delete(UserSettingsModel).where(UserSettingsModel.userid == user_id))
-    await session.execute(delete(UserProfilesModel).where(UserProfilesModel.id == user_id))
+    await session.execute(delete(UserSettingsModel).where(UserSettingsModel.userid == user_id), stage="db.delete_user")
+    await session.execute(delete(UserProfilesModel).where(UserProfilesModel.id == user_id), stage="db.delete_user")
     await session.commit()
+    await publish(UserChanged(uid=user_id))
 
     return {"id": existing_user.id, 
             "username": existing_user.username, 
@@ -1,5 +1,8 @@
 from datetime import datetime
 from typing import Optional
+from zoneinfo import ZoneInfo
+from sqlalchemy import func
+from src.databases.database_session import PG_TIMEZONE
 
 # Utility function to normalize date inputs ------------------------------------------------
 def normalize_date_for_pg(date_input: Optional[str]) -> Optional[datetime]:
@@ -40,3 +43,22 @@ def normalize_str_expdate(date_str: str) -> str:
         return ""
     return normalize_str_date(date_str)
 
+# Utility function to express a timestamp column in a report timezone ------------------------------------------------
+def column_in_timezone(column, tz: Optional[str] = None):
+    """
+    Timestamps are stored without time zone in the session timezone (PG_TIMEZONE).
+    Returns the column converted with AT TIME ZONE when another timezone is requested.
+    """
+    if not tz or tz == PG_TIMEZONE:
+        return column
+    return func.timezone(tz, func.timezone(PG_TIMEZONE, column))
+
+# Utility function to convert a report-timezone datetime to the session timezone ------------------------------------------------
+def to_session_time(value: Optional[datetime], tz: Optional[str] = None) -> Optional[datetime]:
+    """
+    Converts a naive datetime given in `tz` to a naive datetime in PG_TIMEZONE, so that
+    range filters keep comparing the raw column and can still use its index.
+    """
+    if value is None or not tz or tz == PG_TIMEZONE:
+        return value
+    return value.replace(tzinfo=ZoneInfo(tz)).astimezone(ZoneInfo(PG_TIMEZONE)).replace(tzinfo=None)
@@ -0,0 +1,35 @@
+"""NPAC delta ingestion state
+
+Revision ID: 3f2b9c1d7a40
+Revises: 6e601450b7b8
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2b9c1d7a40'
+down_revision: Union[str, Sequence[str], None] = '6e601450b7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('npac_delta_state',
+    sa.Column('objectclass', sa.String(), nullable=False),
+    sa.Column('high_water_mark', sa.String(), nullable=False),
+    sa.Column('last_file', sa.String(), nullable=False),
+    sa.Column('records_applied', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+    sa.Column('updated', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('objectclass')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('npac_delta_state')
@@ -0,0 +1,43 @@
+"""API keys
+
+Revision ID: 8c4d2e6f1a93
+Revises: 3f2b9c1d7a40
+Create Date: 2026-10-19 16:48:05.271931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4d2e6f1a93'
+down_revision: Union[str, Sequence[str], None] = '3f2b9c1d7a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('api_keys',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('userid', sa.Integer(), nullable=False),
+    sa.Column('keyhash', sa.String(), nullable=False),
+    sa.Column('prefix', sa.String(), nullable=False),
+    sa.Column('note', sa.String(), nullable=False),
+    sa.Column('datecreated', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('daterevoked', sa.DateTime(), server_default=sa.text("'2222-01-01 00:00:00'::timestamp without time zone"), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_api_keys_userid'), 'api_keys', ['userid'], unique=False)
+    op.create_index(op.f('ix_api_keys_keyhash'), 'api_keys', ['keyhash'], unique=True)
+    op.create_index(op.f('ix_api_keys_daterevoked'), 'api_keys', ['daterevoked'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_api_keys_daterevoked'), table_name='api_keys')
+    op.drop_index(op.f('ix_api_keys_keyhash'), table_name='api_keys')
+    op.drop_index(op.f('ix_api_keys_userid'), table_name='api_keys')
+    op.drop_table('api_keys')
@@ -0,0 +1,57 @@
+"""Lookup jobs
+
+Revision ID: a93f6d2c8b14
+Revises: d4a7c2e19f05
+Create Date: 2026-10-19 20:12:48.315907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93f6d2c8b14'
+down_revision: Union[str, Sequence[str], None] = 'd4a7c2e19f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('userid', sa.Integer(), nullable=False),
+    sa.Column('product', sa.String(), nullable=False),
+    sa.Column('userinfo', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('total', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('invalid', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('chunks', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('chunks_done', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('processed', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('error', sa.String(), server_default=sa.text("''"), nullable=False),
+    sa.Column('datecreated', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('dateupdated', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('datefinished', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_jobs_userid'), 'jobs', ['userid'], unique=False)
+    op.create_index(op.f('ix_jobs_status'), 'jobs', ['status'], unique=False)
+    op.create_table('job_chunks',
+    sa.Column('jobid', sa.String(), nullable=False),
+    sa.Column('chunk', sa.Integer(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('billed', sa.Integer(), nullable=False),
+    sa.Column('dateprocessed', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('jobid', 'chunk')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('job_chunks')
+    op.drop_index(op.f('ix_jobs_status'), table_name='jobs')
+    op.drop_index(op.f('ix_jobs_userid'), table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,30 @@
+"""Per-product rate limits
+
+Revision ID: b71e05c93d28
+Revises: 8c4d2e6f1a93
+Create Date: 2026-10-19 17:21:44.506318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e05c93d28'
+down_revision: Union[str, Sequence[str], None] = '8c4d2e6f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('rates', sa.Column('ratelimit', sa.Float(), nullable=True))
+    op.add_column('rates', sa.Column('burst', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('rates', 'burst')
+    op.drop_column('rates', 'ratelimit')
@@ -0,0 +1,42 @@
+"""Full data by block
+
+Revision ID: d4a7c2e19f05
+Revises: b71e05c93d28
+Create Date: 2026-10-19 19:05:37.602114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7c2e19f05'
+down_revision: Union[str, Sequence[str], None] = 'b71e05c93d28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('fulldata_block',
+    sa.Column('npanxxx', sa.String(), nullable=False),
+    sa.Column('pooled', sa.Boolean(), nullable=False),
+    sa.Column('lrn', sa.String(), nullable=False),
+    sa.Column('spid', sa.String(), nullable=False),
+    sa.Column('ported_date', sa.String(), nullable=False),
+    sa.Column('ocn', sa.String(), nullable=False),
+    sa.Column('ocn_name', sa.String(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('co_spec_name', sa.String(), nullable=False),
+    sa.Column('spid_name', sa.String(), nullable=False),
+    sa.Column('simplified_name', sa.String(), nullable=False),
+    sa.Column('osimplified_name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('npanxxx', 'pooled')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('fulldata_block')
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, declarative_base
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, DateTime, Boolean, text
 
 Base = declarative_base()
 
@@ -130,3 +130,30 @@ class NNMPModel(Base):
 
     co_spec_name: Mapped[str] = mapped_column(primary_key=True, index=True)
     nnmp: Mapped[int]
+
+# NPAC Delta State Table Model ------------------------------
+class NpacDeltaStateModel(Base):
+    __tablename__ = "npac_delta_state"
+
+    objectclass: Mapped[str] = mapped_column(primary_key=True)
+    high_water_mark: Mapped[str]
+    last_file: Mapped[str]
+    records_applied: Mapped[int]
+    updated: Mapped[str] = mapped_column(DateTime, nullable=False, server_default=text("now()"))
+
+# Full Data by block Table Model (materialized from lerg6, numberpoolblock, spidnames, simple_carrier_names) ----
+class FullDataBlockModel(Base):
+    __tablename__ = "fulldata_block"
+
+    npanxxx: Mapped[str] = mapped_column(primary_key=True)    # pool block (pooled) or LERG6 NPANXX key
+    pooled: Mapped[bool] = mapped_column(Boolean, primary_key=True)
+    lrn: Mapped[str]
+    spid: Mapped[str]
+    ported_date: Mapped[str]
+    ocn: Mapped[str]
+    ocn_name: Mapped[str]
+    category: Mapped[str]
+    co_spec_name: Mapped[str]
+    spid_name: Mapped[str]
+    simplified_name: Mapped[str]
+    osimplified_name: Mapped[str]
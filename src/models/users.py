@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column, declarative_base
 from sqlalchemy import text, DateTime
+from typing import Optional
 
 Base = declarative_base()
 
@@ -55,6 +56,8 @@ class RatesModel(Base):
     productid: Mapped[int]
     endpointid: Mapped[int]
     rate: Mapped[float]
+    ratelimit: Mapped[Optional[float]] = mapped_column(nullable=True)   # requests per second, NULL = unlimited
+    burst: Mapped[Optional[int]] = mapped_column(nullable=True)         # bucket size, NULL = ratelimit
     dateeff: Mapped[str] = mapped_column(DateTime, nullable=False, index=True, server_default=text("now()") )
     dateexp: Mapped[str] = mapped_column(DateTime, nullable=False, index=True, server_default=text("'2222-01-01 00:00:00'::timestamp without time zone"))
 
@@ -84,3 +87,44 @@ class EndpointStatsModel(Base):
     count: Mapped[int] = mapped_column(nullable=False, server_default=text("0"))
     amount: Mapped[float] = mapped_column(nullable=False, server_default=text("0.0"))
 
+
+# API Keys Table Model ---------------------------------------------------
+class ApiKeysModel(Base):
+    __tablename__ = "api_keys"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    userid: Mapped[int] = mapped_column(index=True)
+    keyhash: Mapped[str] = mapped_column(unique=True, index=True)
+    prefix: Mapped[str]
+    note: Mapped[str]
+    datecreated: Mapped[str] = mapped_column(DateTime, nullable=False, server_default=text("now()"))
+    daterevoked: Mapped[str] = mapped_column(DateTime, nullable=False, index=True, server_default=text("'2222-01-01 00:00:00'::timestamp without time zone"))
+
+# Lookup Jobs Table Model ---------------------------------------------------
+class JobsModel(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[str] = mapped_column(primary_key=True)
+    userid: Mapped[int] = mapped_column(index=True)
+    product: Mapped[str]
+    userinfo: Mapped[str]
+    status: Mapped[str] = mapped_column(index=True)
+    total: Mapped[int] = mapped_column(nullable=False, server_default=text("0"))
+    invalid: Mapped[int] = mapped_column(nullable=False, server_default=text("0"))
+    chunks: Mapped[int] = mapped_column(nullable=False, server_default=text("0"))
+    chunks_done: Mapped[int] = mapped_column(nullable=False, server_default=text("0"))
+    processed: Mapped[int] = mapped_column(nullable=False, server_default=text("0"))
+    error: Mapped[str] = mapped_column(nullable=False, server_default=text("''"))
+    datecreated: Mapped[str] = mapped_column(DateTime, nullable=False, server_default=text("now()"))
+    dateupdated: Mapped[str] = mapped_column(DateTime, nullable=False, server_default=text("now()"))
+    datefinished: Mapped[Optional[str]] = mapped_column(DateTime, nullable=True)
+
+# Lookup Job Chunks Table Model (one row per completed chunk) -------------------------------------
+class JobChunksModel(Base):
+    __tablename__ = "job_chunks"
+
+    jobid: Mapped[str] = mapped_column(primary_key=True)
+    chunk: Mapped[int] = mapped_column(primary_key=True)
+    rows: Mapped[int]
+    billed: Mapped[int]
+    dateprocessed: Mapped[str] = mapped_column(DateTime, nullable=False, server_default=text("now()"))
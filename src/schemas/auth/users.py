@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 
 # Schema for validating user login credentials ----------------------------------------
 class UserLoginSchema(BaseModel):
@@ -19,6 +20,8 @@ class UserEndpointSchema(BaseModel):
     productid: int
     ratio: float
     rate: float
+    ratelimit: Optional[float] = None
+    burst: Optional[int] = None
 
 # Schema for user information --------------------------------------------------------
 class UserInfoSchema(BaseModel):
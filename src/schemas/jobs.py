@@ -0,0 +1,28 @@
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import datetime
+from typing import Optional
+from src.schemas.numbering_v1 import BulkProduct
+
+# Schema for validating job submission parameters ------------------------------------------
+class Job_ParamsSchema(BaseModel):
+    product: BulkProduct = Field(
+        ...,
+        description="Lookup applied to every TN of the file; the result has the /v1/<product> fields as CSV columns"
+    )
+
+# Schema for a lookup job and its progress --------------------------------------------------
+class JobSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    product: str
+    status: str
+    total: int
+    invalid: int
+    processed: int
+    chunks: int
+    chunks_done: int
+    error: str
+    datecreated: datetime
+    dateupdated: datetime
+    datefinished: Optional[datetime] = None
@@ -2,6 +2,15 @@ from pydantic import BaseModel, field_validator, Field
 from typing import Optional, Literal
 import re
 
+# Validation patterns, compiled once ---------------------------------------------------
+DIAL_CODE_RE = re.compile(r'\d{6,11}')
+TN_RE = re.compile(r'[1-9]\d{9,14}')
+
+# Function to check a TN the way the tn/cn parameters are validated -------------------
+def is_valid_tn(v: str) -> bool:
+    v0 = v[1:] if v.startswith("+") else v
+    return TN_RE.fullmatch(v0) is not None
+
 # Schema for validating type parameter ------------------------------------------------
 class TypeParamsSchema(BaseModel):
     type: Optional[Literal['json', 'raw', 'xml']] = Field(
@@ -21,10 +30,8 @@ class DialCode_TypeParamsSchema(TypeParamsSchema):
 
     @field_validator("dial_code")
     def validate_dial_code_e164_format(cls, v):
-        v0 = v
-        if v0.startswith("+"):
-            v0 = v0[1:]
-        if not re.fullmatch(r'^\d{6,11}$', v0):
+        v0 = v[1:] if v.startswith("+") else v
+        if not DIAL_CODE_RE.fullmatch(v0):
             raise ValueError("Dial code must be in 6-10 digit format. 1 or +1 prefix is allowed.")
         return v
     
@@ -38,7 +45,7 @@ class PhoneCodes_TypeParamsSchema(DialCode_TypeParamsSchema):
     @field_validator("dialing_code")
     def validate_dialing_code_e164_format(cls, v):
         v0 = v.lstrip("+")
-        if not re.fullmatch(r'^\d{6,11}$', v0):
+        if not DIAL_CODE_RE.fullmatch(v0):
             raise ValueError("Dialing code must be in 6-10 digit format. 1 or +1 prefix is allowed.")
         return v
 
@@ -48,10 +55,8 @@ class PhoneNumber_TypeParamsSchema(TypeParamsSchema):
 
     @field_validator("tn")
     def validate_tn_e164_format(cls, v):
-        v0 = v
-        if v0.startswith("+"):
-            v0 = v0[1:]
-        if not re.fullmatch(r'^[1-9]\d{9,14}$', v0):
+        v0 = v[1:] if v.startswith("+") else v
+        if not TN_RE.fullmatch(v0):
             raise ValueError("Telephone number must be in E.164 format (e.g. +12345678900),a 10-digit number, or a 1 followed by a 10-digit number")
         return v
 
@@ -61,13 +66,21 @@ class PhoneNumbers_TypeParamsSchema(PhoneNumber_TypeParamsSchema):
 
     @field_validator("cn")
     def validate_cn_e164_format(cls, v):
-        v0 = v
-        if v0.startswith("+"):
-            v0 = v0[1:]
-        if not re.fullmatch(r'^[1-9]\d{9,14}$', v0):
+        v0 = v[1:] if v.startswith("+") else v
+        if not TN_RE.fullmatch(v0):
             raise ValueError("Calling number must be in E.164 format (e.g. +12345678900),a 10-digit number, or a 1 followed by a 10-digit number.")
         return v
 
+# Products of bulk lookups and jobs (the /v1/<product> endpoints)
+BulkProduct = Literal['LRN', 'OCN', 'OCNName', 'SPID', 'category', 'NNMP', 'FullData', 'FullDataCoSpec', 'LRNjurisdiction']
+
+# Schema for validating bulk lookup parameters ---------------------------------------------
+class Bulk_TypeParamsSchema(TypeParamsSchema):
+    product: BulkProduct = Field(
+        ...,
+        description="Lookup applied to every TN; each row is what the /v1/<product> endpoint returns for it"
+    )
+
 # Schema for Local Routing Number (LRN) information -----------------------------------------
 class LRNInfoSchema(BaseModel):
     tn: str
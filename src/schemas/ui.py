@@ -1,8 +1,15 @@
-from typing import Optional, List, Any
-from pydantic import BaseModel
+from typing import Optional, List, Any, Literal
+from pydantic import BaseModel, Field
 
 # Schema for handling request parameters for customer list endpoint -------------------------
 class RequestCustomerListSchema(BaseModel):
     filter: Optional[str] = None  
     range: Optional[str] = None
-    sort: Optional[str] = None
\ No newline at end of file
+    sort: Optional[str] = None
+
+# Schema for handling request parameters for heavy hitters endpoint -------------------------
+class RequestHeavyHittersSchema(BaseModel):
+    dimension: Literal["tn", "npanxx", "customer"] = "tn"
+    endpoint: Optional[str] = None
+    windows: int = Field(15, ge=1, description="Number of most recent windows (HH_WINDOW_SECS each) to merge")
+    limit: int = Field(20, ge=1, le=1000)
@@ -0,0 +1,115 @@
+import os
+import asyncio
+import logging
+
+from collections import deque
+from typing import Optional
+from prometheus_client import Counter, Gauge
+
+from src.databases.database_session import POOL_SIZE, MAX_OVERFLOW
+
+logger = logging.getLogger(__name__)
+
+# DB-bound requests running at once in this worker (default: what the pool can serve)
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", POOL_SIZE + MAX_OVERFLOW))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", ADMISSION_MAX_INFLIGHT * 2))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 0.5))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+
+ADMISSION_INFLIGHT = Gauge(
+    "fastapi_admission_inflight",
+    "Gauge of admitted DB-bound /v1 requests currently running",
+    multiprocess_mode="livesum",
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "fastapi_admission_queue_depth",
+    "Gauge of /v1 requests waiting for admission",
+    multiprocess_mode="livesum",
+)
+
+ADMISSION_SHED = Counter(
+    "fastapi_admission_shed_total",
+    "Total count of /v1 requests shed by the admission controller by reason",
+    ["reason"],
+)
+
+ADMISSION_CACHE_ONLY = Counter(
+    "fastapi_admission_cache_only_total",
+    "Total count of /v1 requests served in cache-only mode instead of being shed",
+    ["endpoint"],
+)
+
+# Raised when a request cannot be admitted ------------------------------------------------------
+class Overloaded(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+# Admission controller of one worker ----------------------------------------------------------
+class AdmissionController:
+    """
+    Limits the DB-bound requests running at once to `max_inflight`. Up to `queue_size`
+    more wait in FIFO order for at most `queue_timeout` seconds; anything beyond is
+    rejected at once, so a slow database turns into fast 503s instead of requests
+    piling up on the pool timeout.
+    """
+    def __init__(self, max_inflight: int, queue_size: int, queue_timeout: float):
+        self.max_inflight = max_inflight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self, timeout: Optional[float] = None):
+        if self.inflight < self.max_inflight and not self._waiters:
+            self._admit()
+            return
+        if len(self._waiters) >= self.queue_size:
+            self._shed("queue_full")
+        if timeout is not None and timeout <= 0:
+            self._shed("deadline")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUE_DEPTH.inc()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter),
+                                   timeout=self.queue_timeout if timeout is None else min(self.queue_timeout, timeout))
+        except asyncio.TimeoutError:
+            # the slot may have been handed over right at the deadline
+            if not (waiter.done() and not waiter.cancelled()):
+                waiter.cancel()
+                self._shed("queue_timeout")
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            ADMISSION_QUEUE_DEPTH.dec()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self):
+        # hand the slot straight to the oldest waiter, so queued requests are not overtaken
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.inflight -= 1
+        ADMISSION_INFLIGHT.dec()
+
+    def _admit(self):
+        self.inflight += 1
+        ADMISSION_INFLIGHT.inc()
+
+    def _shed(self, reason: str):
+        ADMISSION_SHED.labels(reason=reason).inc()
+        raise Overloaded(reason)
+
+admission = AdmissionController(ADMISSION_MAX_INFLIGHT, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
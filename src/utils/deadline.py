@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+import logging
+
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+RESULT_STATUS_HEADER = "X-Result-Status"
+
+DEADLINE_DEFAULT_MS = int(os.getenv("DEADLINE_DEFAULT_MS", 2000))
+DEADLINE_MAX_MS = int(os.getenv("DEADLINE_MAX_MS", 10000))
+DEADLINE_DISCONNECT_POLL_MS = int(os.getenv("DEADLINE_DISCONNECT_POLL_MS", 50))
+DEADLINE_STATEMENT_TIMEOUT = os.getenv("DEADLINE_STATEMENT_TIMEOUT", "true").lower() in ("1", "true", "yes")
+
+# Per-endpoint defaults, e.g. DEADLINE_ENDPOINTS_MS="get_lrn=100,get_lrn_jurisdiction=250"
+ENDPOINT_DEADLINES_MS = {
+    name.strip(): int(ms)
+    for name, ms in (item.split("=") for item in os.getenv("DEADLINE_ENDPOINTS_MS", "").split(",") if "=" in item)
+}
+
+DEADLINE_EXCEEDED = Counter(
+    "fastapi_deadline_exceeded_total",
+    "Total count of /v1 requests that ran out of time by endpoint and cause (deadline or disconnect)",
+    ["endpoint", "cause"],
+)
+
+_SET_STATEMENT_TIMEOUT = text("SELECT set_config('statement_timeout', :ms, true)")
+
+# Raised by a DB statement once the request has no time left -----------------------------------
+class DeadlineExceeded(Exception):
+    pass
+
+# Deadline of one request -------------------------------------------------------------------------
+class Deadline:
+    __slots__ = ("endpoint", "expires", "status", "cause", "_timeouts")
+
+    def __init__(self, endpoint: str, budget_ms: int):
+        self.endpoint = endpoint
+        self.expires = time.monotonic() + budget_ms / 1000
+        self.status = "complete"      # complete | partial | timeout
+        self.cause: Optional[str] = None
+        self._timeouts: set[asyncio.Timeout] = set()
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    # Expire now (client went away) and interrupt the statements in flight
+    def expire(self, cause: str):
+        self.expires = time.monotonic()
+        self.cause = cause
+        loop = asyncio.get_running_loop()
+        for timeout in self._timeouts:
+            timeout.reschedule(loop.time())
+
+    # Record that the result lacks what could not be looked up in time
+    def mark(self, status: str):
+        if self.status != "timeout":
+            self.status = status
+        DEADLINE_EXCEEDED.labels(endpoint=self.endpoint, cause=self.cause or "deadline").inc()
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+# Function to get the deadline of the current request (None outside /v1 requests) ------------------
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+# Function to get the time budget of a request from its header or the endpoint default -------------
+def request_budget_ms(endpoint: str, header: Optional[str]) -> int:
+    budget = ENDPOINT_DEADLINES_MS.get(endpoint, DEADLINE_DEFAULT_MS)
+    if header:
+        try:
+            budget = int(header)
+        except ValueError:
+            pass
+    return max(1, min(budget, DEADLINE_MAX_MS))
+
+# Function to start the deadline of a request ---------------------------------------------------
+def start_deadline(endpoint: str, budget_ms: int):
+    deadline = Deadline(endpoint, budget_ms)
+    return deadline, _deadline.set(deadline)
+
+# Function to stop the deadline of a request ----------------------------------------------------
+def stop_deadline(token):
+    _deadline.reset(token)
+
+# Function to tell whether a request still has body messages to receive --------------------------
+def _body_pending(request) -> bool:
+    # is_disconnected() receives the next ASGI message and drops it unless it is a disconnect,
+    # so it may only poll once the endpoint has read the body (GETs have none to read)
+    return request.method not in ("GET", "HEAD") and not request._stream_consumed
+
+# Async function to expire the deadline when the client disconnects ------------------------------
+async def watch_disconnect(request, deadline: Deadline):
+    while deadline.remaining() > 0:
+        await asyncio.sleep(DEADLINE_DISCONNECT_POLL_MS / 1000)
+        if _body_pending(request):
+            continue
+        if await request.is_disconnected():
+            deadline.expire("disconnect")
+            return
+
+# Async context manager bounding one DB statement by the request deadline -------------------------
+@asynccontextmanager
+async def statement_deadline(session):
+    """
+    Outside a request it does nothing. Within one, the statement gets the time left:
+    Postgres enforces it as statement_timeout (set once per transaction) and the
+    client cancels the asyncpg query when it runs out or the client disconnects.
+    Raises DeadlineExceeded instead of asyncio.TimeoutError.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        yield
+        return
+
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded()
+
+    timeout = asyncio.timeout(remaining)
+    deadline._timeouts.add(timeout)
+    try:
+        async with timeout:
+            if DEADLINE_STATEMENT_TIMEOUT:
+                await _set_statement_timeout(session, remaining)
+            yield
+    except TimeoutError:
+        if timeout.expired():
+            raise DeadlineExceeded() from None
+        raise
+    finally:
+        deadline._timeouts.discard(timeout)
+
+async def _set_statement_timeout(session, remaining: float):
+    sync_session = session.sync_session
+    # short-lived fan-out sessions rely on the client-side cancel (a SET would double their round trips)
+    if sync_session.info.get("fan_out"):
+        return
+    transaction = sync_session.get_transaction()
+    if transaction is not None and sync_session.info.get("statement_timeout_tx") is transaction:
+        return
+    # base AsyncSession.execute: not timed and not bounded again
+    await AsyncSession.execute(session, _SET_STATEMENT_TIMEOUT, {"ms": str(max(1, int(remaining * 1000)))})
+    sync_session.info["statement_timeout_tx"] = sync_session.get_transaction()
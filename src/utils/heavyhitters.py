@@ -0,0 +1,225 @@
+import os
+import time
+import asyncio
+import logging
+
+from array import array
+from typing import Optional
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+HH_WINDOW_SECS = int(os.getenv("HH_WINDOW_SECS", 60))          # one sketch epoch
+HH_RETENTION_WINDOWS = int(os.getenv("HH_RETENTION_WINDOWS", 60))
+HH_SYNC_INTERVAL = float(os.getenv("HH_SYNC_INTERVAL", 10))
+HH_TOP_K = int(os.getenv("HH_TOP_K", 100))
+HH_SKETCH_WIDTH = int(os.getenv("HH_SKETCH_WIDTH", 4096))
+HH_SKETCH_DEPTH = int(os.getenv("HH_SKETCH_DEPTH", 4))
+
+DIMENSIONS = ("tn", "npanxx", "customer")
+
+_worker = f"{os.environ.get('HOSTNAME', 'routeapi')}-{os.getpid()}"
+
+HH_EVENTS = Counter(
+    "fastapi_heavy_hitters_events_total",
+    "Total count of billed /v1 calls fed to the heavy-hitters tracker by endpoint",
+    ["endpoint"],
+)
+
+HH_TOPK_SHARE = Gauge(
+    "fastapi_heavy_hitters_topk_share",
+    "Share of the current window's calls that went to the top-K keys by dimension and endpoint",
+    ["dimension", "endpoint"],
+    multiprocess_mode="livemax",
+)
+
+# Count-Min Sketch with conservative update ----------------------------------------------------
+class CountMinSketch:
+    """
+    depth x width counters; a key's estimate never undercounts and overcounts by at most
+    ~e/width of the total with probability 1 - exp(-depth). Memory is fixed.
+    """
+    __slots__ = ("width", "depth", "rows", "total")
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("L", bytes(array("L").itemsize * width)) for _ in range(depth)]
+        self.total = 0
+
+    # Count one occurrence and return the key's estimate
+    def add(self, key) -> int:
+        h = hash(key)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        width = self.width
+        slots = [(h1 + i * h2) % width for i in range(self.depth)]
+        rows = self.rows
+        estimate = min(rows[i][slot] for i, slot in enumerate(slots)) + 1
+        for i, slot in enumerate(slots):
+            if rows[i][slot] < estimate:
+                rows[i][slot] = estimate
+        self.total += 1
+        return estimate
+
+# Top-K candidates by sketch estimate ----------------------------------------------------------
+class TopK:
+    __slots__ = ("k", "counts", "floor")
+
+    def __init__(self, k: int):
+        self.k = k
+        self.counts: dict[str, int] = {}
+        self.floor = 0          # smallest count kept once full
+
+    def offer(self, key: str, estimate: int):
+        counts = self.counts
+        if key in counts:
+            counts[key] = estimate
+            return
+        if len(counts) < self.k:
+            counts[key] = estimate
+            if len(counts) == self.k:
+                self.floor = min(counts.values())
+            return
+        if estimate <= self.floor:
+            return
+        del counts[min(counts, key=counts.get)]
+        counts[key] = estimate
+        self.floor = min(counts.values())
+
+# Sketches and top-K of one window in this worker -----------------------------------------------
+class Window:
+    __slots__ = ("epoch", "sketches", "tops", "calls")
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.sketches = {dim: CountMinSketch(HH_SKETCH_WIDTH, HH_SKETCH_DEPTH) for dim in DIMENSIONS}
+        self.tops: dict[tuple[str, str], TopK] = {}
+        self.calls: dict[str, int] = {}
+
+    def record(self, dim: str, endpoint: str, key: str):
+        estimate = self.sketches[dim].add((endpoint, key))
+        top = self.tops.get((dim, endpoint))
+        if top is None:
+            top = self.tops[(dim, endpoint)] = TopK(HH_TOP_K)
+        top.offer(key, estimate)
+
+_window: Optional[Window] = None
+_closed: list[Window] = []     # ended windows not yet written to Redis
+
+# Function to feed one billed call to the tracker (called from billing_logger.log_event) -------------
+def record_call(endpoint: str, customer: str, tn: str):
+    global _window
+    epoch = int(time.time()) // HH_WINDOW_SECS
+    window = _window
+    if window is None or window.epoch != epoch:
+        if window is not None:
+            _closed.append(window)
+            if len(_closed) > HH_RETENTION_WINDOWS:
+                del _closed[0]   # not synced (no sync task, or Redis down) and past retention anyway
+        window = _window = Window(epoch)
+
+    window.calls[endpoint] = window.calls.get(endpoint, 0) + 1
+    window.record("customer", endpoint, customer)
+    if tn:
+        ten_digit = tn[-10:]
+        window.record("tn", endpoint, ten_digit)
+        window.record("npanxx", endpoint, ten_digit[:6])
+    HH_EVENTS.labels(endpoint=endpoint).inc()
+
+def _redis_key(epoch: int, dim: str, endpoint: str) -> str:
+    return f"hh:{epoch}:{dim}:{endpoint}:{_worker}"
+
+# Async function to write the top-K of this worker's windows to Redis ------------------------------
+async def sync_heavy_hitters(redis_client):
+    """
+    Every HH_SYNC_INTERVAL, replaces this worker's top-K sorted sets of the current (and
+    any just ended) window in Redis and registers them in the window's index set, from
+    which get_heavy_hitters merges all workers.
+    """
+    ttl = HH_WINDOW_SECS * (HH_RETENTION_WINDOWS + 1)
+    while True:
+        await asyncio.sleep(HH_SYNC_INTERVAL)
+
+        windows = _closed[:] + ([_window] if _window is not None else [])
+        if not windows:
+            continue
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for window in windows:
+                index = f"hh:{window.epoch}:index"
+                for (dim, endpoint), top in window.tops.items():
+                    if not top.counts:
+                        continue
+                    key = _redis_key(window.epoch, dim, endpoint)
+                    pipe.delete(key)
+                    pipe.zadd(key, top.counts)
+                    pipe.expire(key, ttl)
+                    pipe.sadd(index, key)
+                    pipe.hset(f"hh:{window.epoch}:calls", f"{endpoint}:{_worker}", window.calls.get(endpoint, 0))
+                pipe.expire(index, ttl)
+                pipe.expire(f"hh:{window.epoch}:calls", ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Heavy hitters sync failed: {e}")
+            continue
+
+        for window in windows:
+            if window is _window:
+                for (dim, endpoint), top in window.tops.items():
+                    calls = window.calls.get(endpoint, 0)
+                    if calls:
+                        HH_TOPK_SHARE.labels(dimension=dim, endpoint=endpoint).set(sum(top.counts.values()) / calls)
+            else:
+                _closed.remove(window)
+
+# Async function to merge the top keys of all workers over the last windows -----------------------
+async def get_heavy_hitters(redis_client, dimension: str, endpoint: Optional[str] = None,
+                            windows: int = 15, limit: int = 20) -> dict:
+    """
+    Sums the per-worker top-K counts of `dimension` over the last `windows` windows and
+    returns the `limit` heaviest keys per endpoint with their share of the endpoint's calls.
+    """
+    current = int(time.time()) // HH_WINDOW_SECS
+    epochs = range(current - min(windows, HH_RETENTION_WINDOWS) + 1, current + 1)
+
+    pipe = redis_client.pipeline(transaction=False)
+    for epoch in epochs:
+        pipe.smembers(f"hh:{epoch}:index")
+        pipe.hgetall(f"hh:{epoch}:calls")
+    indexes = await pipe.execute()
+
+    keys, calls = [], {}
+    for members, epoch_calls in zip(indexes[0::2], indexes[1::2]):
+        for key in members:
+            _, _, dim, ep, _ = key.split(":", 4)
+            if dim == dimension and (endpoint is None or ep == endpoint):
+                keys.append((ep, key))
+        for field, count in epoch_calls.items():
+            ep = field.split(":", 1)[0]
+            calls[ep] = calls.get(ep, 0) + int(count)
+
+    pipe = redis_client.pipeline(transaction=False)
+    for _, key in keys:
+        pipe.zrange(key, 0, -1, withscores=True)
+    results = await pipe.execute() if keys else []
+
+    merged: dict[str, dict[str, float]] = {}
+    for (ep, _), members in zip(keys, results):
+        counts = merged.setdefault(ep, {})
+        for member, score in members:
+            counts[member] = counts.get(member, 0) + score
+
+    return {
+        "dimension": dimension,
+        "window_secs": HH_WINDOW_SECS * len(epochs),
+        "endpoints": {
+            ep: {
+                "calls": calls.get(ep, 0),
+                "top": [
+                    {"key": key, "count": int(count), "share": round(count / calls[ep], 4) if calls.get(ep) else None}
+                    for key, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+                ],
+            }
+            for ep, counts in sorted(merged.items())
+        },
+    }
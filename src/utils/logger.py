@@ -1,5 +1,7 @@
 import logging
 import os
+import gzip
+import json
 import asyncio
 import hashlib
 
@@ -7,9 +9,13 @@ from logging import Logger
 from src.schemas.auth.users   import UserEndpointSchema
 from datetime import datetime
 from sqlalchemy import text
+from src.utils.timing import span
+from src.utils.heavyhitters import record_call
 
 bill_interval = int(os.environ.get("BILLING_LOGGER_INTERVAL", 300))
 ui_interval = int(os.environ.get("UI_ACTIVITY_LOGGER_INTERVAL", 300))
+# Write the per-TN detail of batch billing records to a side file next to the billing log
+bill_batch_detail = os.environ.get("BILLING_BATCH_DETAIL", "true").lower() in ("1", "true", "yes")
 log = logging.getLogger("app")
 
 # logger class to handle periodic log rotation and logging ----------------------------------------------------
@@ -79,12 +85,14 @@ class RouteLogger:
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
 
         if self.type == "billing":    
-            retvar = kwargs.get("retvar", "")
-            dn = kwargs.get("dn", "")
-            tn = kwargs.get("tn", "")
-            log = f"BILL\tIP={userinfo.ip_address}\tID={userinfo.username}\tEP={userinfo.endpoint}\tPID={userinfo.productid}\tRATIO={userinfo.ratio}\tRATE={userinfo.rate}\treturn=[{retvar}]\t{dn}\t{tn}"
-            eventid = hashlib.sha256((log + str(self.counter) + timestamp).encode()).hexdigest()
-            self.logger.info(f"{log}\t{eventid}")
+            with span("billing_log"):
+                retvar = kwargs.get("retvar", "")
+                dn = kwargs.get("dn", "")
+                tn = kwargs.get("tn", "")
+                log = f"BILL\tIP={userinfo.ip_address}\tID={userinfo.username}\tEP={userinfo.endpoint}\tPID={userinfo.productid}\tRATIO={userinfo.ratio}\tRATE={userinfo.rate}\treturn=[{retvar}]\t{dn}\t{tn}"
+                eventid = hashlib.sha256((log + str(self.counter) + timestamp).encode()).hexdigest()
+                self.logger.info(f"{log}\t{eventid}")
+                record_call(userinfo.endpoint, userinfo.username, tn)
 
         if self.type == "ui":
             data = kwargs.get("data", {})
@@ -93,6 +101,50 @@ class RouteLogger:
             eventid = hashlib.sha256((log + str(self.counter) + timestamp).encode()).hexdigest()
             self.logger.info(f"{log}\t{eventid}")
 
+    # Log one billing record for a batch of calls (bulk requests and jobs)
+    async def log_batch(self, userinfo: UserEndpointSchema, tns: list[str], retvars: list, dns: list[str] = None) -> str:
+        """
+        Logs a single BATCH record with the count, amount and a SHA-256 digest of the inputs
+        instead of one BILL line per TN. With BILLING_BATCH_DETAIL the per-TN tn, dn and return
+        values go to a gzipped columnar JSON side file named in the record, written in a thread
+        before the record is logged. Returns the event id.
+        """
+        self.counter += 1
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+
+        with span("billing_log"):
+            count = len(tns)
+            amount = float(userinfo.rate or 0) * float(userinfo.ratio or 0) * count
+            digest = hashlib.sha256()
+            for i, tn in enumerate(tns):
+                digest.update(f"{dns[i] if dns else ''}\t{tn}\n".encode())
+            log = (f"BATCH\tIP={userinfo.ip_address}\tID={userinfo.username}\tEP={userinfo.endpoint}\tPID={userinfo.productid}"
+                   f"\tRATIO={userinfo.ratio}\tRATE={userinfo.rate}\tCOUNT={count}\tAMOUNT={amount:.6f}\tDIGEST={digest.hexdigest()}")
+            eventid = hashlib.sha256((log + str(self.counter) + timestamp).encode()).hexdigest()
+
+            detail = ""
+            if bill_batch_detail and count:
+                detail = await asyncio.to_thread(self.write_batch_detail, eventid, userinfo, tns, retvars, dns)
+            self.logger.info(f"{log}\tDETAIL={detail}\t{eventid}")
+
+            for tn in tns:
+                record_call(userinfo.endpoint, userinfo.username, tn)
+        return eventid
+
+    # Write the per-TN detail of a batch record: one array per column, gzipped JSON
+    def write_batch_detail(self, eventid: str, userinfo: UserEndpointSchema, tns: list[str], retvars: list, dns: list[str] = None) -> str:
+        filename = f"{self.type}-detail-{eventid[:16]}-{self.hostname}-{self.worker_id}.json.gz"
+        columns = {"tn": tns, "return": ["" if retvar is None else str(retvar) for retvar in retvars]}
+        if dns:
+            columns["dn"] = dns
+        data = {"event": eventid, "endpoint": userinfo.endpoint, "username": userinfo.username, "count": len(tns), "columns": columns}
+        # written under a dot name and renamed, like the rotated logs, so collectors see complete files only
+        tmp_path = os.path.join(self.log_dir, f".{filename}")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.rename(tmp_path, os.path.join(self.log_dir, filename))
+        return filename
+
 #---------------------------------------------------------
 billing_logger = RouteLogger(bill_interval,"billing")
 ui_logger = RouteLogger(ui_interval,"ui")
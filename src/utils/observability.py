@@ -6,22 +6,20 @@ from typing import Tuple
 from starlette.middleware.base import (BaseHTTPMiddleware,
                                        RequestResponseEndpoint)
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.responses import Response, JSONResponse
 from starlette.routing import Match
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 from starlette.types import ASGIApp
 
 from prometheus_client import generate_latest, REGISTRY, CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, CollectorRegistry
-from opentelemetry.instrumentation.logging import LoggingInstrumentor
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
-from fastapi.security.utils import get_authorization_scheme_param
 from fastapi import HTTPException
 
-from src.auth.jwt import security
-from http.cookies import SimpleCookie
-from prometheus_client import multiprocess
+from src.auth.principal import resolve_principal
+from src.utils.timing import SERVER_TIMING, span, start_request_timing, stop_request_timing, enable_tracing
 from src.utils.logger import getIPAddress
+from src.utils.queryprofiler import query_summary
+from src.utils.deadline import RESULT_STATUS_HEADER
 
 ALLOWED_NETWORK_PREFIXES = ("172.1", "192.168")
 
@@ -72,35 +70,14 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
         if not is_handled_path or not path.startswith('/v'):
             return await call_next(request)
 
-    # Extract token from Authorization header
-        cookie_header = request.headers.get("cookie")
-        access_token = None
-        token = None
-        if cookie_header:
-            cookie = SimpleCookie()
-            cookie.load(cookie_header)
-            if "access_token" in cookie:
-                access_token = cookie["access_token"].value
-                if access_token:
-                    scheme, token = get_authorization_scheme_param(f"Bearer {access_token}")
-        
-        if not access_token:
-            auth_header = request.headers.get("Authorization")
-            if auth_header:
-                scheme, token = get_authorization_scheme_param(auth_header)
-                if token=='':
-                    token, x = get_authorization_scheme_param(auth_header)                    
-
-        username = ''
-       
-        if token:
-            try: 
-                payload = security._decode_token(token)
-                username = payload.uname
-            except Exception:
-                pass
-            
-   
+    # Record per-stage timings of this request (DB, Redis, vendor, billing log)
+        timing, timing_token = start_request_timing(path)
+
+    # Authenticate once; the dependencies reuse the principal stored on request.state
+        with span("auth"):
+            payload = resolve_principal(request)
+        username = getattr(payload, "uname", '') if payload is not None else ''
+
         if username!='':    
             INFO.labels(app_name=username).inc() 
 
@@ -126,6 +103,11 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
         else:
             status_code = response.status_code
             after_time = time.perf_counter()
+            if SERVER_TIMING:
+                response.headers["Server-Timing"] = timing.header(total=after_time - before_time)
+            deadline = getattr(request.state, "deadline", None)
+            if deadline is not None and status_code == 200:
+                response.headers[RESULT_STATUS_HEADER] = deadline.status
             if username!='':
                 REQUESTS_PROCESSING_TIME.labels(method=method, path=path, app_name=username).observe(
                                                 after_time - before_time, exemplar={'TraceID':""})
@@ -143,6 +125,7 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
                     method=method, path=path, app_name=username).dec()
             REQUESTS_IN_PROGRESS.labels(
                 method=method, path=path, app_name=self.app_name).dec()
+            stop_request_timing(timing_token)
 
         return response
 
@@ -163,6 +146,7 @@ def metrics(request: Request) -> Response:
         raise HTTPException(status_code=403, detail="Forbidden")
     
     if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
         pmd = os.environ["PROMETHEUS_MULTIPROC_DIR"]
 
         if os.path.isdir(pmd):
@@ -177,10 +161,44 @@ def metrics(request: Request) -> Response:
 
     return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
 
+# Endpoint for the SQL statement profile of this worker ------------------------------------------
+def debug_queries(request: Request) -> Response:
+
+    ip_address = getIPAddress(request)
+    if not ip_address.startswith(ALLOWED_NETWORK_PREFIXES):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return JSONResponse(query_summary())
+
 # Function to set up OpenTelemetry for FastAPI -----------------------------------------------------
 def setting_otlp(app: ASGIApp, app_name: str, endpoint: str, log_correlation: bool = True) -> None:
+    # The SDK, exporter and instrumentors are only needed when tracing is enabled
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.logging import LoggingInstrumentor
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    # Setting OpenTelemetry
+    # set the service name to show in traces
+    resource = Resource.create(attributes={
+        "service.name": app_name,
+        "compose_service": app_name
+    })
+
+    # set the tracer provider
+    tracer = TracerProvider(resource=resource)
+    trace.set_tracer_provider(tracer)
+
+    tracer.add_span_processor(BatchSpanProcessor(
+        OTLPSpanExporter(endpoint=endpoint, insecure=True)))
 
     if log_correlation:
         LoggingInstrumentor().instrument(set_logging_format=True)
 
-    FastAPIInstrumentor.instrument_app(app)
\ No newline at end of file
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=tracer)
+
+    # Stage timings (DB, Redis, vendor, billing log) become child spans of the request span
+    enable_tracing()
\ No newline at end of file
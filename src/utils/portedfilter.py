@@ -0,0 +1,338 @@
+import os
+import math
+import mmap
+import time
+import fcntl
+import struct
+import logging
+
+from contextlib import contextmanager
+from typing import Iterable, Optional, Sequence
+from prometheus_client import Counter, Gauge
+
+from src.databases.invalidation import on_event, on_flush
+
+logger = logging.getLogger(__name__)
+
+PORTED_FILTER = os.getenv("PORTED_FILTER", "true").lower() in ("1", "true", "yes")
+PORTED_FILTER_DIR = os.getenv("PORTED_FILTER_DIR", "filters")
+PORTED_FILTER_FP_RATE = float(os.getenv("PORTED_FILTER_FP_RATE", 0.01))
+PORTED_FILTER_HEADROOM = float(os.getenv("PORTED_FILTER_HEADROOM", 0.25))   # room for ports added by deltas
+PORTED_FILTER_MAX_SKEW = float(os.getenv("PORTED_FILTER_MAX_SKEW", 2.0))     # clock skew allowed between hosts (s)
+PORTED_FILTER_RECENT_MAX = int(os.getenv("PORTED_FILTER_RECENT_MAX", 100_000)) # announced ports kept in memory
+
+SUFFIXES = 10_000_000            # 7-digit line suffixes of an NPA
+KIND_BLOOM, KIND_BITMAP = 0, 1
+
+# magic, version, kind, hashes, bits, items, built (epoch seconds)
+_HEADER = struct.Struct("<4sBBHQQd")
+_MAGIC = b"RTPF"
+_VERSION = 1
+_ITEMS_OFFSET = 16
+_SYNCED_FILE = "synced"          # time up to which the delta loader has applied every port to the files
+_SYNCED_CHECK_SECS = 1.0
+_MASK64 = (1 << 64) - 1
+
+PORTED_FILTER_BYTES = Gauge(
+    "fastapi_ported_filter_bytes",
+    "Bytes of ported-TN filters mapped by the worker (shared between workers through the page cache)",
+    multiprocess_mode="livemax",
+)
+
+PORTED_FILTER_FP_ESTIMATE = Gauge(
+    "fastapi_ported_filter_fp_rate",
+    "Estimated false-positive rate of the ported-TN filter of an NPA (0 for exact bitmaps)",
+    ["npa"],
+    multiprocess_mode="livemax",
+)
+
+PORTED_FILTER_CHECKS = Counter(
+    "fastapi_ported_filter_checks_total",
+    "Total count of tn2lrn lookups checked against the ported-TN filter by result (skipped, maybe, unfiltered, stale)",
+    ["result"],
+)
+
+PORTED_FILTER_FALSE_POSITIVES = Counter(
+    "fastapi_ported_filter_false_positives_total",
+    "Total count of tn2lrn lookups the filter let through that found no row",
+)
+
+#-----------------------------------------------------------------------------------------------------
+# Filter files
+#-----------------------------------------------------------------------------------------------------
+# Function to get the filter file path of an NPA ----------------------------------------------------------
+def filter_path(npa: str, directory: str = None) -> str:
+    return os.path.join(directory or PORTED_FILTER_DIR, f"tn2lrn{npa}.filter")
+
+# Function to get the Bloom filter bit positions of a suffix (splitmix64 double hashing) --------------------
+def bloom_positions(suffix: int, hashes: int, bits: int) -> list[int]:
+    z = (suffix + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    h1 = z ^ (z >> 31)
+    h2 = ((h1 * 0xD6E8FEB86659FD93) & _MASK64) | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+# Function to size a filter for `items` suffixes: a Bloom filter, or an exact bitmap once that is smaller -----
+def filter_layout(items: int, fp_rate: float = None) -> tuple[int, int, int]:
+    fp_rate = fp_rate or PORTED_FILTER_FP_RATE
+    expected = max(1, int(items * (1 + PORTED_FILTER_HEADROOM)))
+    bits = math.ceil(-expected * math.log(fp_rate) / math.log(2) ** 2)
+    if bits >= SUFFIXES:
+        return KIND_BITMAP, 0, SUFFIXES
+    bits = max(64, (bits + 7) // 8 * 8)
+    return KIND_BLOOM, max(1, round(bits / expected * math.log(2))), bits
+
+# Ported-TN filter of one NPA, memory-mapped ---------------------------------------------------------------
+class PortedFilter:
+    """
+    Membership of the 7-digit suffixes that have a tn2lrnNPA row. A bitmap answers
+    exactly; a Bloom filter answers "not ported" exactly and "maybe" with a false
+    positive rate. The file is mapped shared, so every worker of a host reads the same
+    pages and sees the delta loader's updates at once.
+    """
+    def __init__(self, npa: str, path: str, writable: bool = False):
+        self.npa = npa
+        self.path = path
+        with open(path, "r+b" if writable else "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, version, self.kind, self.hashes, self.bits, _, self.built = _HEADER.unpack_from(self.map, 0)
+        if magic != _MAGIC or version != _VERSION or len(self.map) < _HEADER.size + self.bits // 8:
+            self.map.close()
+            raise ValueError(f"{path} is not a ported-TN filter")
+
+    @property
+    def items(self) -> int:
+        return _HEADER.unpack_from(self.map, 0)[5]
+
+    @property
+    def size(self) -> int:
+        return len(self.map)
+
+    def positions(self, suffix: int) -> list[int]:
+        if self.kind == KIND_BITMAP:
+            return [suffix]
+        return bloom_positions(suffix, self.hashes, self.bits)
+
+    def might_contain(self, suffix: int) -> bool:
+        data, base = self.map, _HEADER.size
+        for bit in self.positions(suffix):
+            if not data[base + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    # Estimated false-positive rate for the items it holds
+    def fp_rate(self) -> float:
+        if self.kind == KIND_BITMAP:
+            return 0.0
+        return (1 - math.exp(-self.hashes * self.items / self.bits)) ** self.hashes
+
+    # Writer side (delta loader): set / clear the bits of suffixes in place
+    def add(self, suffixes: Iterable[int]):
+        data, base, added = self.map, _HEADER.size, 0
+        for suffix in suffixes:
+            for bit in self.positions(suffix):
+                data[base + (bit >> 3)] |= 1 << (bit & 7)
+            added += 1
+        struct.pack_into("<Q", data, _ITEMS_OFFSET, self.items + added)
+
+    def remove(self, suffixes: Iterable[int]):
+        # only a bitmap can forget a suffix; a Bloom filter keeps answering "maybe"
+        if self.kind != KIND_BITMAP:
+            return
+        data, base, removed = self.map, _HEADER.size, 0
+        for suffix in suffixes:
+            if data[base + (suffix >> 3)] & (1 << (suffix & 7)):
+                data[base + (suffix >> 3)] &= ~(1 << (suffix & 7)) & 0xFF
+                removed += 1
+        struct.pack_into("<Q", data, _ITEMS_OFFSET, max(0, self.items - removed))
+
+    def close(self):
+        self.map.close()
+
+# Function to write a new filter file for the given suffixes (atomically replaces the old one) -------------
+def write_filter(npa: str, suffixes: Sequence[int], directory: str = None) -> str:
+    kind, hashes, bits = filter_layout(len(suffixes))
+    data = bytearray(_HEADER.size + bits // 8)
+    _HEADER.pack_into(data, 0, _MAGIC, _VERSION, kind, hashes, bits, 0, time.time())
+    base = _HEADER.size
+    if kind == KIND_BITMAP:
+        for suffix in suffixes:
+            data[base + (suffix >> 3)] |= 1 << (suffix & 7)
+    else:
+        for suffix in suffixes:
+            for bit in bloom_positions(suffix, hashes, bits):
+                data[base + (bit >> 3)] |= 1 << (bit & 7)
+    struct.pack_into("<Q", data, _ITEMS_OFFSET, len(suffixes))
+
+    path = filter_path(npa, directory)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+# Function to open the filter of an NPA for in-place updates (None if it has none) --------------------------
+def open_for_update(npa: str, directory: str = None) -> Optional[PortedFilter]:
+    path = filter_path(npa, directory)
+    if not os.path.exists(path):
+        return None
+    return PortedFilter(npa, path, writable=True)
+
+# Context manager serializing the writers of one NPA's filter (builder and delta loader) -------------------
+@contextmanager
+def filter_lock(npa: str, directory: str = None):
+    path = filter_path(npa, directory) + ".lock"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# Function to record that the filters of a directory hold every port committed until now (delta loader) -----
+def mark_synced(directory: str = None):
+    path = os.path.join(directory or PORTED_FILTER_DIR, _SYNCED_FILE)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(repr(time.time()))
+    os.replace(tmp, path)
+
+#-----------------------------------------------------------------------------------------------------
+# Worker side
+#-----------------------------------------------------------------------------------------------------
+_filters: dict[str, Optional[PortedFilter]] = {}     # NPA -> mapped filter, None if there is no file
+_recent: dict[str, dict[int, float]] = {}            # NPA -> suffixes announced by tn_changed since the last build or sync
+_recent_pruned = [0.0]                               # synced stamp _recent was last pruned to
+_listening_since: Optional[float] = None             # start of the current invalidation subscription
+_synced = [0.0, 0.0]                                 # synced stamp of the filter directory, time it was read
+
+# Function to get the time up to which the delta loader applied every port to the filter files -------------
+def synced_at() -> float:
+    now = time.monotonic()
+    if now - _synced[1] >= _SYNCED_CHECK_SECS:
+        _synced[1] = now
+        try:
+            with open(os.path.join(PORTED_FILTER_DIR, _SYNCED_FILE)) as f:
+                _synced[0] = float(f.read())
+        except (OSError, ValueError):
+            _synced[0] = 0.0
+    return _synced[0]
+
+# Function to tell whether a filter holds every port this worker may have missed -------------------------
+def is_current(ported_filter: PortedFilter) -> bool:
+    """
+    Ports committed after the file was built (or last synced by the delta loader) are
+    only known from tn_changed events, so the file can be trusted only if it covers
+    everything committed before the current subscription started; events published
+    while the worker was not subscribed are lost. Workers that do not listen (job
+    workers) never trust a filter.
+    """
+    if _listening_since is None:
+        return False
+    covered = max(ported_filter.built, synced_at())
+    return covered >= _listening_since + PORTED_FILTER_MAX_SKEW
+
+# Function to get the mapped filter of an NPA (None if it has none) ----------------------------------------
+def get_filter(npa: str) -> Optional[PortedFilter]:
+    if npa in _filters:
+        return _filters[npa]
+    ported_filter = None
+    path = filter_path(npa)
+    if os.path.exists(path):
+        try:
+            ported_filter = PortedFilter(npa, path)
+            PORTED_FILTER_FP_ESTIMATE.labels(npa=npa).set(ported_filter.fp_rate())
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot map ported-TN filter {path}: {e}")
+    _filters[npa] = ported_filter
+    PORTED_FILTER_BYTES.set(sum(f.size for f in _filters.values() if f is not None))
+    return ported_filter
+
+# Function to tell whether a TN may have a tn2lrnNPA row -------------------------------------------------
+def maybe_ported(npa: str, suffix: int) -> bool:
+    """
+    False only when the NPA's filter says the TN is definitely not ported; NPAs
+    without a current filter (or PORTED_FILTER=false) always answer True.
+    """
+    if not PORTED_FILTER:
+        return True
+    ported_filter = _filters[npa] if npa in _filters else get_filter(npa)
+    if ported_filter is None:
+        PORTED_FILTER_CHECKS.labels(result="unfiltered").inc()
+        return True
+    if not is_current(ported_filter):
+        PORTED_FILTER_CHECKS.labels(result="stale").inc()
+        return True
+    if ported_filter.might_contain(suffix) or suffix in _recent.get(npa, ()):
+        PORTED_FILTER_CHECKS.labels(result="maybe").inc()
+        return True
+    PORTED_FILTER_CHECKS.labels(result="skipped").inc()
+    return False
+
+# Function to count a lookup that found no row although the NPA's filter let it through ----------------------
+def false_positive(npa: str):
+    if PORTED_FILTER and _filters.get(npa) is not None:
+        PORTED_FILTER_FALSE_POSITIVES.inc()
+
+# Function to drop the mapped filters of NPAs (remapped on next use) ----------------------------------------
+def unmap(npas: Iterable[str] = None):
+    for npa in list(_filters) if npas is None else npas:
+        ported_filter = _filters.pop(npa, None)
+        if ported_filter is not None:
+            # lookups check it synchronously, so nothing still reads it
+            ported_filter.close()
+    PORTED_FILTER_BYTES.set(sum(f.size for f in _filters.values() if f is not None))
+
+#-----------------------------------------------------------------------------------------------------
+# Invalidation handlers
+#-----------------------------------------------------------------------------------------------------
+def _prune_recent():
+    # ports announced before the delta loader's last sync are in the files
+    covered = synced_at() - PORTED_FILTER_MAX_SKEW
+    if covered <= _recent_pruned[0]:
+        return
+    _recent_pruned[0] = covered
+    for npa in list(_recent):
+        kept = {suffix: seen for suffix, seen in _recent[npa].items() if seen >= covered}
+        if kept:
+            _recent[npa] = kept
+        else:
+            del _recent[npa]
+
+def _tn_changed(event):
+    # other hosts' filters learn new ports at the next build or sync; until then they are kept here
+    global _listening_since
+    ten_digit = event.tn[-10:]
+    _recent.setdefault(ten_digit[:3], {})[int(ten_digit[3:])] = time.time()
+    _prune_recent()
+    if sum(len(recent) for recent in _recent.values()) > PORTED_FILTER_RECENT_MAX:
+        # too many ports the files miss: forget them and stop trusting the filters
+        # until they are rebuilt or synced, as after a resubscription
+        logger.warning(f"More than {PORTED_FILTER_RECENT_MAX} ports announced since the filters were synced, "
+                       "querying every NPA until they are")
+        _recent.clear()
+        _listening_since = time.time()
+
+def _ported_filter_rebuilt(event):
+    unmap(event.npas)
+    for npa in event.npas:
+        recent = _recent.get(npa)
+        if recent:
+            # ports announced after the build started may be missing from the new file
+            _recent[npa] = {suffix: seen for suffix, seen in recent.items() if seen >= event.started}
+
+def _flush():
+    # (re)subscribed: ports announced while disconnected are missing from _recent, so
+    # a filter counts only once it is rebuilt or synced after this point
+    global _listening_since
+    _listening_since = time.time()
+    _recent.clear()
+    unmap()
+
+on_event("tn_changed", _tn_changed)
+on_event("ported_filter_rebuilt", _ported_filter_rebuilt)
+on_flush(_flush)
@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import hashlib
+import logging
+
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+
+STATEMENT_DURATION = Histogram(
+    "fastapi_sql_statement_duration_seconds",
+    "Histogram of SQL statement latency by statement template (see /debug/queries for the text)",
+    ["template"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+REQUEST_STATEMENTS = Histogram(
+    "fastapi_request_sql_statements",
+    "Histogram of SQL statements issued per request by path",
+    ["path"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 20, 50, 100, 250, 1000),
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TN2LRN_RE = re.compile(r"\btn2lrn\d{3}\b")
+_IN_LIST_RE = re.compile(r"\bIN \((?:\$\d+|%\(\w+\)s|\?)(?:, (?:\$\d+|%\(\w+\)s|\?))*\)", re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+
+# Aggregated latency of one statement template in this worker ---------------------------------------
+class TemplateStats:
+    __slots__ = ("template", "count", "total", "max")
+
+    def __init__(self, template: str):
+        self.template = template
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+# Aggregated statement counts of one route in this worker -------------------------------------------
+class PathStats:
+    __slots__ = ("requests", "statements", "max_statements")
+
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.max_statements = 0
+
+_templates: dict[str, TemplateStats] = {}
+_template_ids: dict[str, tuple[str, str]] = {}   # raw statement -> (fingerprint, template)
+_paths: dict[str, PathStats] = {}
+_request_statements: ContextVar[Optional[list]] = ContextVar("request_statements", default=None)
+
+# Function to normalize a statement into a template --------------------------------------------------
+def normalize_statement(statement: str) -> str:
+    """
+    Collapses whitespace, literals, IN-lists and the per-NPA tn2lrnNPA tables, so that
+    the same query on different NPAs or with different literals has one template.
+    """
+    template = _WHITESPACE_RE.sub(" ", statement).strip()
+    template = _TN2LRN_RE.sub("tn2lrnNNN", template)
+    template = _STRING_RE.sub("?", template)
+    template = _NUMBER_RE.sub("?", template)
+    template = _IN_LIST_RE.sub("IN (...)", template)
+    return template
+
+# Function to get the fingerprint and template of a statement (cached per raw statement) -------------
+def statement_template(statement: str) -> tuple[str, str]:
+    cached = _template_ids.get(statement)
+    if cached is None:
+        template = normalize_statement(statement)
+        fingerprint = hashlib.sha1(template.encode()).hexdigest()[:12]
+        if len(_template_ids) < 10000:
+            _template_ids[statement] = (fingerprint, template)
+        cached = (fingerprint, template)
+    return cached
+
+# Function to redact bound parameters for logging (types and sizes only) -----------------------------
+def redact_parameters(parameters) -> str:
+    if parameters is None:
+        return "()"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: <{type(v).__name__}>" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(
+            f"<{type(v).__name__}:{len(v)}>" if isinstance(v, (str, bytes, list, tuple)) else f"<{type(v).__name__}>"
+            for v in parameters) + ")"
+    return f"<{type(parameters).__name__}>"
+
+#-----------------------------------------------------------------------------------------------------
+# Engine event hooks
+#-----------------------------------------------------------------------------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profiler_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_profiler_start", None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+
+    fingerprint, template = statement_template(statement)
+    stats = _templates.get(fingerprint)
+    if stats is None:
+        stats = _templates[fingerprint] = TemplateStats(template)
+    stats.count += 1
+    stats.total += duration
+    if duration > stats.max:
+        stats.max = duration
+    STATEMENT_DURATION.labels(template=fingerprint).observe(duration)
+
+    counter = _request_statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+    if duration * 1000 >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query {duration * 1000:.1f} ms [{fingerprint}]: {template} params={redact_parameters(parameters)}")
+
+# Function to install the profiler on an engine ------------------------------------------------------
+def install_query_profiler(engine: AsyncEngine):
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+# ASGI middleware counting the statements of every request by route -----------------------------------
+class QueryProfilerMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0]
+        token = _request_statements.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_statements.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                path = route.path
+                stats = _paths.get(path)
+                if stats is None:
+                    stats = _paths[path] = PathStats()
+                stats.requests += 1
+                stats.statements += counter[0]
+                if counter[0] > stats.max_statements:
+                    stats.max_statements = counter[0]
+                REQUEST_STATEMENTS.labels(path=path).observe(counter[0])
+
+# Function to summarize the statements of this worker (for /debug/queries) ------------------------------
+def query_summary() -> dict:
+    templates = sorted(_templates.items(), key=lambda item: item[1].total, reverse=True)
+    return {
+        "pid": os.getpid(),
+        "slow_query_ms": SLOW_QUERY_MS,
+        "paths": {
+            path: {
+                "requests": s.requests,
+                "avg_statements": round(s.statements / s.requests, 2) if s.requests else 0,
+                "max_statements": s.max_statements,
+            }
+            for path, s in sorted(_paths.items())
+        },
+        "templates": [
+            {
+                "template_id": fingerprint,
+                "template": s.template,
+                "count": s.count,
+                "total_ms": round(s.total * 1000, 3),
+                "avg_ms": round(s.total * 1000 / s.count, 3) if s.count else 0,
+                "max_ms": round(s.max * 1000, 3),
+            }
+            for fingerprint, s in templates
+        ],
+    }
@@ -0,0 +1,104 @@
+import msgspec
+
+from typing import Any, Optional
+from fastapi import Response
+from pydantic import BaseModel
+
+MEDIA_TYPES = {
+    "raw": "text/plain; charset=utf-8",
+    "json": "application/json",
+    "xml": "application/xml",
+}
+
+_json_encoder = msgspec.json.Encoder()
+_XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+# Function to escape a value for an XML text node ----------------------------------------------------
+def xml_escape(value: Any) -> str:
+    if value is None:
+        return ""
+    return str(value).translate(_XML_ESCAPES)
+
+# Precompiled raw/json/xml rendering of a result schema ----------------------------------------------
+class ResponseFormat:
+    """
+    Renders a result straight to a Response for the requested type:
+      raw  - the `fields` joined with '|' (text/plain)
+      json - the whole result (or `json_fields`) encoded with msgspec
+      xml  - a template compiled once from `root` and `fields`, values escaped
+
+    Returning a Response skips FastAPI's jsonable_encoder/response-model pass.
+    """
+    def __init__(self, root: str, fields: tuple[str, ...], json_fields: Optional[tuple[str, ...]] = None):
+        self.root = root
+        self.fields = fields
+        self.json_fields = json_fields
+        self._xml = f"<{root}>" + "".join(f"<{f}>{{}}</{f}>" for f in fields) + f"</{root}>"
+
+    def render(self, type: str, data) -> Response:
+        return Response(content=self.body(type, data), media_type=MEDIA_TYPES[type])
+
+    # Body bytes of the response (one row of a bulk response)
+    def body(self, type: str, data) -> bytes:
+        values = data.model_dump() if isinstance(data, BaseModel) else data
+        if type == "raw":
+            return "|".join("" if values[f] is None else str(values[f]) for f in self.fields).encode()
+        elif type == "json":
+            if self.json_fields is not None:
+                values = {f: values[f] for f in self.json_fields}
+            return _json_encoder.encode(values)
+        elif type == "xml":
+            return self._xml.format(*(xml_escape(values[f]) for f in self.fields)).encode()
+        raise ValueError("Invalid type parameter. Must be 'raw', 'json', or 'xml'.")
+
+# Precompiled raw/json/xml rendering of a single value ------------------------------------------------
+class ValueFormat:
+    """
+    Renders one value as raw text, {json_key: value} or <xml_tag>value</xml_tag>.
+    """
+    def __init__(self, xml_tag: str, json_key: Optional[str] = None):
+        self.json_key = json_key or xml_tag
+        self._xml = f"<{xml_tag}>{{}}</{xml_tag}>"
+
+    def render(self, type: str, value) -> Response:
+        return Response(content=self.body(type, value), media_type=MEDIA_TYPES[type])
+
+    # Body bytes of the response (one row of a bulk response)
+    def body(self, type: str, value) -> bytes:
+        if type == "raw":
+            return ("" if value is None else str(value)).encode()
+        elif type == "json":
+            return _json_encoder.encode({self.json_key: value})
+        elif type == "xml":
+            return self._xml.format(xml_escape(value)).encode()
+        raise ValueError("Invalid type parameter. Must be 'raw', 'json', or 'xml'.")
+
+_value_formats: dict[tuple[str, str], ValueFormat] = {}
+
+# Function to get the compiled format of a single value, cached per field ------------------------------
+def value_format(field: str, json_key: Optional[str] = None) -> ValueFormat:
+    key = (field, json_key or field)
+    fmt = _value_formats.get(key)
+    if fmt is None:
+        fmt = _value_formats[key] = ValueFormat(field, json_key)
+    return fmt
+
+# Function to render a single value, caching the compiled format per field ---------------------------
+def render_value(type: str, field: str, value, json_key: Optional[str] = None) -> Response:
+    return value_format(field, json_key).render(type, value)
+
+# Function to render the rows of a bulk response ------------------------------------------------------
+def render_rows(type: str, root: str, rows: list[bytes]) -> Response:
+    """
+    Each row is the exact body the single-TN endpoint returns; json wraps them in an
+    array, raw puts one per line and xml wraps them in <root>.
+    """
+    if type == "raw":
+        body = b"\n".join(rows)
+    elif type == "json":
+        body = b"[" + b",".join(rows) + b"]"
+    elif type == "xml":
+        body = f"<{root}>".encode() + b"".join(rows) + f"</{root}>".encode()
+    else:
+        raise ValueError("Invalid type parameter. Must be 'raw', 'json', or 'xml'.")
+    return Response(content=body, media_type=MEDIA_TYPES[type])
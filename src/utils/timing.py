@@ -0,0 +1,112 @@
+import os
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import redis.asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+from prometheus_client import Histogram
+from src.utils.deadline import statement_deadline
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+STAGE_DURATION = Histogram(
+    "fastapi_stage_duration_seconds",
+    "Histogram of time spent per request stage (DB statement, Redis command, vendor call, ...) by path",
+    ["stage", "path"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+_tracer = None   # set by enable_tracing(); OpenTelemetry is only imported when tracing is on
+
+# Stages recorded for the current request -----------------------------------------------------------
+class RequestTiming:
+    __slots__ = ("path", "spans")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.spans: list[tuple[str, float]] = []
+
+    # Server-Timing header value, durations of repeated stages summed (ms)
+    def header(self, total: Optional[float] = None) -> str:
+        stages: dict[str, float] = {}
+        for stage, duration in self.spans:
+            stages[stage] = stages.get(stage, 0.0) + duration
+        if total is not None:
+            stages["total"] = total
+        return ", ".join(f"{stage};dur={duration * 1000:.2f}" for stage, duration in stages.items())
+
+_request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+# Function to turn recorded stages into OpenTelemetry spans (called by setting_otlp) ----------------
+def enable_tracing():
+    global _tracer
+    from opentelemetry import trace
+    _tracer = trace.get_tracer(__name__)
+
+# Function to start recording the stages of a request ----------------------------------------------
+def start_request_timing(path: str):
+    timing = RequestTiming(path)
+    return timing, _request_timing.set(timing)
+
+# Function to stop recording the stages of a request -----------------------------------------------
+def stop_request_timing(token):
+    _request_timing.reset(token)
+
+# Context manager timing one stage of the current request ------------------------------------------
+@contextmanager
+def span(stage: str):
+    """
+    Records the duration of `stage` for the current request: a Prometheus histogram
+    sample labeled with the route template, an entry for the Server-Timing header and,
+    when OpenTelemetry is enabled, a child span. Outside a request it does nothing.
+    """
+    timing = _request_timing.get()
+    if timing is None:
+        yield
+        return
+
+    otel = _tracer.start_as_current_span(stage) if _tracer is not None else None
+    if otel is not None:
+        otel.__enter__()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        # the span records the exception and the error status
+        _record(timing, stage, start, otel, type(e), e, e.__traceback__)
+        raise
+    _record(timing, stage, start, otel, None, None, None)
+
+def _record(timing: RequestTiming, stage: str, start: float, otel, exc_type, exc, tb):
+    duration = time.perf_counter() - start
+    if otel is not None:
+        otel.__exit__(exc_type, exc, tb)
+    timing.spans.append((stage, duration))
+    STAGE_DURATION.labels(stage=stage, path=timing.path).observe(duration)
+
+# AsyncSession that times every statement under the stage its caller names (stage="db.<function>") -
+# and bounds it by the deadline of the request
+class TimedAsyncSession(AsyncSession):
+    async def execute(self, *args, stage: str = "db", **kwargs):
+        with span(stage):
+            async with statement_deadline(self):
+                return await super().execute(*args, **kwargs)
+
+    async def scalar(self, *args, stage: str = "db", **kwargs):
+        with span(stage):
+            async with statement_deadline(self):
+                return await super().scalar(*args, **kwargs)
+
+    async def get(self, *args, stage: str = "db", **kwargs):
+        with span(stage):
+            async with statement_deadline(self):
+                return await super().get(*args, **kwargs)
+
+# Redis client that times every command ------------------------------------------------------------
+class TimedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        with span(f"redis.{args[0]}"):
+            return await super().execute_command(*args, **options)
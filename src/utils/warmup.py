@@ -0,0 +1,111 @@
+import os
+import re
+import time
+import asyncio
+import logging
+
+from contextlib import AsyncExitStack
+from sqlalchemy import text, select
+
+from src.databases.database_session import _NUMBERING_ASYNC_ENGINE, _NUMBERING_ASYNC_SESSIONMAKER
+from src.models.numbering_v1 import create_dynamic_model
+from src.logic.numbering_v1 import normalize_tn
+from src.logic.users import check_user_access, get_active_rates
+from src.auth.principal import set_cached_rate
+from src.auth.apikeys import load_api_keys
+from src.utils.timing import TimedAsyncSession
+
+logger = logging.getLogger(__name__)
+
+WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
+WARMUP_POOL_CONNECTIONS = int(os.getenv("WARMUP_POOL_CONNECTIONS", _NUMBERING_ASYNC_ENGINE.pool.size()))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 60))
+WARMUP_TN = os.getenv("WARMUP_TN", "")
+
+_TN2LRN_TABLE_RE = re.compile(r"^tn2lrn(\d{3})$")
+
+# Warmup progress of this worker; /health reports it
+state = {"warm": not WARMUP, "stage": "disabled" if not WARMUP else "pending", "seconds": 0.0}
+
+# Function to tell whether this worker finished warming up -----------------------------------------------
+def is_warm() -> bool:
+    return state["warm"]
+
+# Async function to list the NPAs that have a tn2lrnNPA table -------------------------------------------
+async def get_known_npas(session) -> list[str]:
+    result = await session.execute(
+        text("SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND tablename LIKE 'tn2lrn%'")
+    )
+    return sorted(m.group(1) for (name,) in result.all() if (m := _TN2LRN_TABLE_RE.match(name)))
+
+# Async function to pick a sample TN whose NPANXX exists in LERG6 --------------------------------------
+async def get_sample_tns(session) -> list[str]:
+    if WARMUP_TN:
+        return [WARMUP_TN]
+    result = await session.execute(text("SELECT npanxx FROM lerg6 LIMIT 2"))
+    return [row[0] + "0000" for row in result.all()] or ["2015550100"]
+
+# Async function to run the hot statements of the /v1 endpoints on one connection ---------------------
+async def prepare_hot_statements(session, tns: list[str]):
+    """
+    Runs the same statements the handlers issue, so that the SQLAlchemy compiled cache
+    and the connection's asyncpg prepared statements (and type introspection) are warm.
+    """
+    # Local import: the handlers' helpers live in the API module
+    from src.api.numbering_v1 import procFullDataCoSpec, procLRNjur, getJurisdiction
+
+    ntn = normalize_tn(tns[0])
+    await procFullDataCoSpec(ntn, session)
+    await procLRNjur(ntn, session)
+    await getJurisdiction(ntn.npanxx, normalize_tn(tns[-1]).npanxx, session)
+    await check_user_access(userid=0, endpoint="get_lrn", session=session)
+
+# Async function to open the pool connections at once and warm each of them ------------------------------
+async def warm_pool(tns: list[str], connections: int):
+    async with AsyncExitStack() as stack:
+        # all checked out together, so the pool keeps `connections` open afterwards
+        conns = [await stack.enter_async_context(_NUMBERING_ASYNC_ENGINE.connect()) for _ in range(connections)]
+
+        async def warm(conn):
+            async with TimedAsyncSession(bind=conn) as session:
+                await prepare_hot_statements(session, tns)
+
+        await asyncio.gather(*(warm(conn) for conn in conns))
+
+# Async function to warm this worker before it reports healthy ------------------------------------------
+async def warmup():
+    """
+    Warmup stage of a worker:
+      1. opens WARMUP_POOL_CONNECTIONS pool connections at once and prepares the hot statements on each
+      2. builds the dynamic tn2lrnNPA model for every known NPA and compiles its lookup
+      3. loads the API keys and prefills the product rate cache
+    Failures are logged and do not block the worker; /health turns healthy when it ends.
+    """
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(_warmup_stages(), timeout=WARMUP_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Warmup stopped at stage {state['stage']}: {e!r}")
+    state["seconds"] = round(time.perf_counter() - started, 3)
+    state["warm"] = True
+    logger.info(f"Worker {os.getpid()} warm in {state['seconds']}s")
+
+async def _warmup_stages():
+    state["stage"] = "pool"
+    async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+        tns = await get_sample_tns(session)
+    await warm_pool(tns, WARMUP_POOL_CONNECTIONS)
+
+    state["stage"] = "models"
+    async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+        for npa in await get_known_npas(session):
+            model = create_dynamic_model("tn2lrn" + npa)
+            await session.scalar(select(model).where(model.tn == "0000000000"))
+
+    state["stage"] = "caches"
+    await load_api_keys()
+    async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+        for productid, endpoint, endpointid, rate, ratelimit, burst in await get_active_rates(session):
+            set_cached_rate(productid, endpoint, (endpointid, rate, ratelimit, burst))
+
+    state["stage"] = "done"
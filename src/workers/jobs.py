@@ -0,0 +1,251 @@
+import os
+import time
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import multiprocessing
+
+import redis.asyncio as aioredis
+
+from typing import Optional
+from src.configs.settings import get_settings, logging_config
+from src.configs import serving
+from src.databases.database_session import _NUMBERING_ASYNC_ENGINE, _NUMBERING_ASYNC_SESSIONMAKER
+from src.databases.redis_cache import LOCAL_REDIS_URL, add_endpoint_calls
+from src.logic import jobs
+from src.logic.numbering_v1 import normalize_tns
+from src.schemas.auth.users import UserEndpointSchema
+from src.utils.logger import billing_logger
+from src.utils.heavyhitters import sync_heavy_hitters
+from src.api.numbering_v1 import procBulk, FULL_DATA_COSPEC_FORMAT, FULL_DATA_FORMAT, NNMP_FORMAT, LRN_JURISDICTION_FORMAT
+
+logger = logging.getLogger(__name__)
+
+JOBS_PROCESSES = int(os.getenv("JOBS_PROCESSES", os.cpu_count() or 1))
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", 2))     # tasks in flight per process
+
+WORKERS_KEY = "jobs:workers"
+
+# Result CSV columns of the products that return a record (the others return one value)
+RESULT_FIELDS = {
+    "FullDataCoSpec": FULL_DATA_COSPEC_FORMAT.fields,
+    "FullData": FULL_DATA_FORMAT.fields,
+    "NNMP": NNMP_FORMAT.fields,
+    "LRNjurisdiction": LRN_JURISDICTION_FORMAT.fields,
+}
+
+_worker = f"{socket.gethostname()}:{os.getpid()}"
+
+def processing_key(worker: str) -> str:
+    return f"jobs:processing:{worker}"
+
+def alive_key(worker: str) -> str:
+    return f"jobs:alive:{worker}"
+
+# Function to get the header of a job's result CSV -------------------------------------------------------
+def result_header(product: str) -> list[str]:
+    header = ["input", "cn"] if product == "LRNjurisdiction" else ["input"]
+    return header + list(RESULT_FIELDS.get(product, (product,)))
+
+# Function to get the result CSV row of one TN -------------------------------------------------------------
+def result_row(product: str, tn: str, cn: Optional[str], retvar) -> list:
+    row = [tn, cn] if product == "LRNjurisdiction" else [tn]
+    fields = RESULT_FIELDS.get(product)
+    if fields is None:
+        return row + ["" if retvar is None else retvar]
+    if retvar is None:
+        return row + [""] * len(fields)
+    values = retvar.model_dump()
+    return row + [values[f] for f in fields]
+
+#-----------------------------------------------------------------------------------------------------
+# Tasks
+#-----------------------------------------------------------------------------------------------------
+# Async function to split a queued job into chunk tasks ----------------------------------------------------
+async def split_job(session, redis_client, job_id: str):
+    job = await jobs.claim_split(session, job_id)
+    if job is None:
+        return   # cancelled, or claimed by another worker
+    total, invalid, chunks = await asyncio.to_thread(jobs.split_input, job_id, job.product == "LRNjurisdiction")
+    if await jobs.start_job(session, job_id, total, invalid, chunks) is not None:
+        await jobs.enqueue(redis_client, *(jobs.chunk_task(job_id, n) for n in range(chunks)))
+    logger.info(f"Job {job_id}: {total} TNs in {chunks} chunks, {invalid} invalid rows skipped")
+
+# Async function to resolve one chunk of a job with the bulk engine and bill it -------------------------------
+async def resolve_chunk(session, redis_client, job_id: str, n: int):
+    job = await jobs.get_job(session, job_id)
+    if job is None or job.status != "running" or await jobs.chunk_done(session, job_id, n):
+        return   # cancelled or failed, or a requeued chunk that is already resolved
+    product, userinfo = job.product, UserEndpointSchema.model_validate_json(job.userinfo)
+    with_cn = product == "LRNjurisdiction"
+
+    items = await asyncio.to_thread(jobs.read_chunk, job_id, n)
+    tns = [tn for tn, _ in items]
+    cns = normalize_tns(cn for _, cn in items) if with_cn else None
+    _, retvars = await procBulk(product, "raw", normalize_tns(tns), cns, session)
+
+    rows = [result_row(product, tn, cn, retvar) for (tn, cn), retvar in zip(items, retvars)]
+    await asyncio.to_thread(jobs.write_part, job_id, n, result_header(product) if n == 0 else None, rows)
+
+    billed = [i for i, retvar in enumerate(retvars) if retvar is not None]
+    if not await jobs.claim_chunk(session, job_id, n, len(items), len(billed)):
+        return   # another worker recorded (and billed) it first
+    # billed before the chunk is committed: if the worker dies in between, the chunk is
+    # not recorded and is resolved and billed again by the retry, never left unbilled
+    if billed:
+        amount = float(userinfo.rate or 0) * float(userinfo.ratio or 0) * len(billed)
+        await add_endpoint_calls(redis_client, userinfo.uid, userinfo.endpointid, len(billed), amount)
+        await billing_logger.log_batch(userinfo, [tns[i] for i in billed], [retvars[i] for i in billed],
+                                       dns=[items[i][1] for i in billed] if with_cn else None)
+    await jobs.complete_chunk(session, job_id, len(items))
+
+# Async function to run a queued task --------------------------------------------------------------------
+async def run_task(redis_client, task: str):
+    """
+    A failed task is requeued after a backoff (chunks are idempotent, splits go back to
+    queued); the job fails only once the task has failed JOBS_MAX_ATTEMPTS times.
+    """
+    kind, job_id, *rest = task.split(":")
+    async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+        try:
+            if kind == "split":
+                await split_job(session, redis_client, job_id)
+            elif kind == "chunk":
+                await resolve_chunk(session, redis_client, job_id, int(rest[0]))
+        except Exception as e:
+            await session.rollback()
+            attempts = await jobs.task_failed(redis_client, task)
+            if attempts < jobs.JOBS_MAX_ATTEMPTS:
+                logger.warning(f"Job task {task} failed (attempt {attempts} of {jobs.JOBS_MAX_ATTEMPTS}), retrying: {e}")
+                if kind == "split":
+                    await jobs.requeue_split(session, job_id)
+                await asyncio.sleep(jobs.JOBS_RETRY_DELAY * 2 ** (attempts - 1))
+                await jobs.enqueue(redis_client, task)
+                return
+            logger.exception(f"Job task {task} failed after {attempts} attempts")
+            await jobs.fail_job(session, job_id, f"{type(e).__name__}: {e}")
+    await jobs.clear_attempts(redis_client, task)
+
+#-----------------------------------------------------------------------------------------------------
+# Worker loops
+#-----------------------------------------------------------------------------------------------------
+# Async function to take tasks off the queue (kept in this worker's processing list until done) --------------
+async def consume(redis_client):
+    processing = processing_key(_worker)
+    while True:
+        task = await redis_client.blmove(jobs.JOBS_QUEUE, processing, 5, src="RIGHT", dest="LEFT")
+        if task is None:
+            continue
+        try:
+            await run_task(redis_client, task)
+        finally:
+            await redis_client.lrem(processing, 1, task)
+
+# Async function to keep this worker registered as alive ---------------------------------------------------
+async def heartbeat(redis_client):
+    while True:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(alive_key(_worker), "1", ex=jobs.JOBS_STALE_SECS)
+        pipe.sadd(WORKERS_KEY, _worker)
+        await pipe.execute()
+        await asyncio.sleep(jobs.JOBS_STALE_SECS / 3)
+
+# Async function to requeue the tasks of dead workers and work lost with Redis --------------------------------
+async def recover(redis_client):
+    """
+    One worker at a time (global lock): the processing lists of workers whose heartbeat
+    expired go back to the head of the queue; when nothing is queued or in flight, the
+    unfinished work recorded in Postgres is requeued (Redis lost the queue).
+    """
+    while True:
+        await asyncio.sleep(jobs.JOBS_STALE_SECS)
+        lock_key = "lock:jobs_recover"
+        if not await redis_client.set(lock_key, "1", nx=True, ex=jobs.JOBS_STALE_SECS):
+            continue
+        try:
+            in_flight = 0
+            for worker in await redis_client.smembers(WORKERS_KEY):
+                if await redis_client.exists(alive_key(worker)):
+                    in_flight += await redis_client.llen(processing_key(worker))
+                    continue
+                moved = 0
+                while await redis_client.lmove(processing_key(worker), jobs.JOBS_QUEUE, "RIGHT", "RIGHT") is not None:
+                    moved += 1
+                await redis_client.srem(WORKERS_KEY, worker)
+                if moved:
+                    logger.warning(f"Requeued {moved} job tasks of dead worker {worker}")
+
+            if in_flight == 0 and await redis_client.llen(jobs.JOBS_QUEUE) == 0:
+                async with _NUMBERING_ASYNC_SESSIONMAKER() as session:
+                    tasks = await jobs.lost_tasks(session)
+                if tasks:
+                    logger.warning(f"Requeued {len(tasks)} job tasks missing from the queue")
+                    await jobs.enqueue(redis_client, *tasks)
+        except Exception:
+            logger.exception("Job recovery failed")
+        finally:
+            await redis_client.delete(lock_key)
+
+# Async function to run one worker process ----------------------------------------------------------------
+async def run(concurrency: int):
+    redis_client = aioredis.from_url(os.environ.get("REDIS_URL", LOCAL_REDIS_URL), encoding="utf-8", decode_responses=True)
+    billing_logger.rotate_handler_periodically()
+    logger.info(f"Job worker {_worker} started, {concurrency} tasks in flight")
+    try:
+        await asyncio.gather(heartbeat(redis_client), recover(redis_client), sync_heavy_hitters(redis_client),
+                             *(consume(redis_client) for _ in range(concurrency)))
+    finally:
+        await redis_client.aclose()
+        await _NUMBERING_ASYNC_ENGINE.dispose()
+
+def worker_process(concurrency: int):
+    logging_config(log_level=get_settings().log_level)
+    asyncio.run(run(concurrency))
+
+#-----------------------------------------------------------------------------------------------------
+def main(processes: int, concurrency: int):
+    """
+    Keeps `processes` worker processes running. Workers share nothing but the queue,
+    so throughput scales with processes and hosts up to what Postgres serves.
+    The processes split JOBS_CONNECTION_BUDGET (or, if unset, DB_CONNECTION_BUDGET).
+    """
+    logging_config(log_level=get_settings().log_level)
+    budget = serving.jobs_connection_budget()
+    processes = serving.cap_workers(processes, budget)
+    # spawned processes read their pool size from the environment
+    pool_size, max_overflow = serving.pool_limits(processes, budget)
+    os.environ.setdefault("DB_POOL_SIZE", str(pool_size))
+    os.environ.setdefault("DB_MAX_OVERFLOW", str(max_overflow))
+    ctx = multiprocessing.get_context("spawn")
+    workers: list = [None] * processes
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        while True:
+            for i, process in enumerate(workers):
+                if process is None or not process.is_alive():
+                    if process is not None:
+                        logger.warning(f"Job worker process {process.pid} exited with {process.exitcode}, restarting")
+                    workers[i] = ctx.Process(target=worker_process, args=(concurrency,), name=f"jobs-worker-{i}")
+                    workers[i].start()
+            time.sleep(5)
+    finally:
+        # in-flight tasks are requeued once their workers' heartbeats expire
+        for process in workers:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in workers:
+            if process is not None:
+                process.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the lookup job workers")
+    parser.add_argument("--processes", type=int, default=JOBS_PROCESSES, help="Worker processes (default: JOBS_PROCESSES, one per core)")
+    parser.add_argument("--concurrency", type=int, default=JOBS_CONCURRENCY, help="Tasks in flight per process")
+    args = parser.parse_args()
+    main(args.processes, args.concurrency)
@@ -0,0 +1,57 @@
+import pytest
+from httpx import AsyncClient
+from main import app
+from tests.conftest import BASE_URL
+
+# Test cases for Bulk API endpoint
+
+TNS = ["2163734606", "+12163734606", "12164101234"]
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_bulk_matches_single_authenticated(get_auth_headers,transport):
+    headers =  get_auth_headers
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        for product in ("LRN", "OCN", "SPID", "FullDataCoSpec", "NNMP"):
+            for type in ("json", "raw", "xml"):
+                resp = await client.post(f"/v1/bulk/?product={product}&type={type}", json=TNS, headers=headers)
+                assert resp.status_code == 200
+                singles = []
+                for tn in TNS:
+                    single = await client.get(f"/v1/{product}/", params={"tn": tn, "type": type}, headers=headers)
+                    singles.append(single.content)
+                if type == "json":
+                    assert resp.content == b"[" + b",".join(singles) + b"]"
+                elif type == "raw":
+                    assert resp.content == b"\n".join(singles)
+                else:
+                    assert resp.content == b"<Bulk>" + b"".join(singles) + b"</Bulk>"
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_bulk_csv_authenticated(get_auth_headers,transport):
+    headers =  get_auth_headers
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        body = "tn,cn\n2163734606,2164101234\n2164101234,2163734606\n"
+        resp = await client.post("/v1/bulk/?product=LRNjurisdiction&type=json", content=body,
+                                 headers={**headers, "Content-Type": "text/csv"})
+        assert resp.status_code == 200
+        assert len(resp.json()) == 2
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_bulk_invalid_params_authenticated(get_auth_headers,transport):
+    headers =  get_auth_headers
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.post("/v1/bulk/?product=LRN", json=["2163734606", "123456"], headers=headers)
+        assert resp.status_code == 422
+        assert resp.json()["detail"]["rows"] == [1]
+
+        resp = await client.post("/v1/bulk/?product=CNAM", json=TNS, headers=headers)
+        assert resp.status_code == 422
+
+        resp = await client.post("/v1/bulk/?product=LRN", json=[], headers=headers)
+        assert resp.status_code == 422
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_bulk_unauthenticated(transport):
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.post("/v1/bulk/?product=LRN", json=TNS)
+        assert resp.status_code == 401
@@ -0,0 +1,53 @@
+import os
+import re
+import sys
+import subprocess
+import pytest
+
+# Import-time profile of main.py per node role (python -X importtime); the raw
+# profiles go to pytest's tmp_path, or to IMPORTTIME_DIR when set (CI artifacts)
+
+IMPORTTIME_DIR = os.getenv("IMPORTTIME_DIR")
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+def profile_imports(app_name: str, directory) -> dict[str, int]:
+    env = dict(os.environ, APP_NAME=app_name)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main, sys; print(*sys.modules)"],
+                            env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    directory = IMPORTTIME_DIR or directory
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"importtime_{app_name}.txt"), "w") as f:
+        f.write(result.stderr)
+
+    # module -> cumulative import time (us)
+    modules = {}
+    for line in result.stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            modules[m.group(4)] = int(m.group(2))
+    # modules imported with importlib.import_module (the routers) are loaded but not profiled
+    for name in result.stdout.split():
+        modules.setdefault(name, 0)
+    return modules
+
+@pytest.mark.parametrize("app_name", ["API", "ADMIN", "ALL"])
+def test_import_time_lazy_modules(app_name, tmp_path):
+    modules = profile_imports(app_name, tmp_path)
+    assert "main" in modules
+    assert "requests" not in modules
+    assert not any(m.startswith("opentelemetry.instrumentation") for m in modules)
+    assert "prometheus_client.multiprocess" not in modules
+
+def test_import_time_api_node(tmp_path):
+    modules = profile_imports("API", tmp_path)
+    assert "src.api.numbering_v1" in modules
+    assert "src.api.ui" not in modules
+    assert "src.api.stats" not in modules
+
+def test_import_time_admin_node(tmp_path):
+    modules = profile_imports("ADMIN", tmp_path)
+    assert "src.api.ui" in modules
+    assert "src.api.numbering_v1" not in modules
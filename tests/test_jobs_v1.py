@@ -0,0 +1,50 @@
+import pytest
+from httpx import AsyncClient
+from main import app
+from tests.conftest import BASE_URL
+
+# Test cases for Jobs API endpoints
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_jobs_submit_authenticated(get_auth_headers,transport):
+    headers =  get_auth_headers
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.post("/v1/jobs/?product=LRN", content="tn\n2163734606\n2164101234\n",
+                                 headers={**headers, "Content-Type": "text/csv"})
+        assert resp.status_code == 202
+        job = resp.json()
+        assert job["product"] == "LRN"
+
+        resp = await client.get(f"/v1/jobs/{job['id']}", headers=headers)
+        assert resp.status_code == 200
+        assert resp.json()["id"] == job["id"]
+
+        resp = await client.get("/v1/jobs/", headers=headers)
+        assert resp.status_code == 200
+        assert job["id"] in [j["id"] for j in resp.json()]
+
+        resp = await client.delete(f"/v1/jobs/{job['id']}", headers=headers)
+        assert resp.status_code == 200
+        assert resp.json()["status"] in ("cancelled", "deleted", "failed")
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_jobs_invalid_params_authenticated(get_auth_headers,transport):
+    headers =  get_auth_headers
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.post("/v1/jobs/?product=CNAM", content="2163734606\n", headers=headers)
+        assert resp.status_code == 422
+
+        resp = await client.post("/v1/jobs/?product=LRN", content="", headers=headers)
+        assert resp.status_code == 422
+
+        resp = await client.get("/v1/jobs/0123456789abcdef", headers=headers)
+        assert resp.status_code == 404
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_jobs_unauthenticated(transport):
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.post("/v1/jobs/?product=LRN", content="2163734606\n")
+        assert resp.status_code == 401
+
+        resp = await client.get("/v1/jobs/")
+        assert resp.status_code == 401
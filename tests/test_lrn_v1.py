@@ -24,4 +24,44 @@ async def test_LRN_invalid_params_authenticated(get_auth_headers,transport):
     headers =  get_auth_headers
     async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
         resp = await client.get("/v1/LRN/?tn=123456", headers=headers)
-        assert resp.status_code == 422                
\ No newline at end of file
+        assert resp.status_code == 422                
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_LRN_response_types_authenticated(get_auth_headers,transport):
+    headers =  get_auth_headers
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.get("/v1/LRN/?tn=2163734606&type=xml", headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/xml")
+        assert resp.text.startswith("<LRN>")
+
+        resp = await client.get("/v1/LRN/?tn=2163734606&type=raw", headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+
+        resp = await client.get("/v1/LRN/?tn=2163734606&type=json", headers=headers)
+        assert resp.status_code == 200
+        assert "LRN" in resp.json()
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_LRN_unauthenticated(transport):
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.get("/v1/LRN/?tn=2163734606")
+        assert resp.status_code == 401
+
+        resp = await client.get("/v1/LRN/?tn=2163734606", headers={"Authorization": "Bearer invalid"})
+        assert resp.status_code == 401
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_LRN_invalid_api_key(transport):
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.get("/v1/LRN/?tn=2163734606", headers={"X-API-Key": "rk_invalid"})
+        assert resp.status_code == 401
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_LRN_deadline_result_status(get_auth_headers,transport):
+    headers = dict(get_auth_headers, **{"X-Deadline-Ms": "5000"})
+    async with AsyncClient(transport=transport, base_url=BASE_URL) as client:
+        resp = await client.get("/v1/LRN/?tn=2163734606", headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["X-Result-Status"] == "complete"